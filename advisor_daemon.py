@@ -0,0 +1,232 @@
+import sys
+import json
+import time
+import queue
+import socket
+import threading
+import socketserver
+import yaml
+import schedule
+
+from utils import logger, get_beijing_time
+from embedding_engine import start_encoder_warmup
+
+# ==========================================
+# 🟢 常驻顾问进程 (Advisor Daemon)
+# 一次性加载编码器 / FAISS 索引 / 行情面板 / LLM 连接池后常驻内存，进程内按配置的时间表执行
+# 新闻抓取 (抓完增量刷新向量索引)、行情刷新与全流程分析；另监听本地端口接受按需触发:
+#   python advisor_daemon.py                 启动常驻进程
+#   python advisor_daemon.py send analyze    触发一次分析 (追加 wait 阻塞到结束)
+#   python advisor_daemon.py send status     查看运行状态
+# ==========================================
+DEFAULT_DAEMON_CONFIG = {
+    "host": "127.0.0.1",
+    "port": 8765,
+    "timezone": "Asia/Shanghai",
+    "weekdays_only": True,
+    "analyze_times": ["08:00", "09:00", "12:00"],            # 与 daily_run.yml 的 cron 一致 (北京时间)
+    "price_times": ["11:00", "12:00", "13:00", "14:00"],     # 与 market_data_crawler.yml 一致
+    "news_interval_minutes": 60,                             # 与 news_data_crawler.yml 一致
+    "query_port": 8766,                                      # 本地查询 API (query_api)，0 表示不启动
+}
+JOBS = ("crawl", "prices", "analyze")
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday"]
+ALL_DAYS = WEEKDAYS + ["saturday", "sunday"]
+
+def load_config(path="config.yaml"):
+    with open(path, 'r', encoding='utf-8') as f:
+        return yaml.safe_load(f)
+
+def daemon_config(config):
+    cfg = dict(DEFAULT_DAEMON_CONFIG)
+    cfg.update(config.get('daemon') or {})
+    return cfg
+
+class AdvisorDaemon:
+    def __init__(self, cfg):
+        self.cfg = cfg
+        self.jobs = queue.Queue()
+        self.pending = {}          # 任务名 -> 排队中任务的完成事件 (同名任务排队时合并)
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.started_at = get_beijing_time().strftime("%Y-%m-%d %H:%M:%S")
+        self.running = None
+        self.last = {}             # 任务名 -> 最近一次执行结果
+        self.fetcher = None
+        self.analyst = None
+
+    # --- 常驻资源 ---
+    def warm_up(self):
+        """ 导入重依赖并加载常驻资源，只在进程启动时执行一次 """
+        start = time.time()
+        start_encoder_warmup()
+        import main as advisor
+        from data_fetcher import DataFetcher
+        from news_analyst import NewsAnalyst
+        self.advisor = advisor
+        self.fetcher = DataFetcher()
+        try:
+            self.analyst = NewsAnalyst()
+            self.analyst.init_rag_system()
+        except Exception as e:
+            logger.warning(f"⚠️ [Daemon] 分析师初始化失败，分析任务将按需重试: {e}")
+            self.analyst = None
+        for fund in advisor.load_config().get('funds', []):
+            try: self.fetcher.get_fund_history(fund['code'])
+            except Exception: pass
+        logger.info(f"🔥 [Daemon] 常驻资源就绪 (向量 {self.rag_size()} 条，行情 {self.fetcher.panel.loads} 只)，"
+                    f"耗时 {time.time() - start:.1f}s")
+
+    def rag_size(self):
+        if self.analyst is None or self.analyst.index is None:
+            return 0
+        return self.analyst.index.ntotal
+
+    # --- 任务 ---
+    def job_crawl(self):
+        from news_loader import fetch_and_save_news
+        added = fetch_and_save_news() or 0
+        encoded = 0
+        if added and self.analyst is not None:
+            if self.analyst.index is not None:
+                encoded = self.analyst.refresh_rag()   # 只编码新入库的新闻
+            else:
+                self.analyst.init_rag_system()
+                encoded = self.rag_size()
+        return {"news_added": added, "rag_size": self.rag_size(), "encoded": encoded}
+
+    def job_prices(self):
+        funds = self.advisor.load_config().get('funds', [])
+        return {"updated": self.fetcher.run(funds), "total": len(funds)}
+
+    def job_analyze(self):
+        if self.analyst is None:
+            from news_analyst import NewsAnalyst
+            try: self.analyst = NewsAnalyst()
+            except Exception as e: logger.warning(f"⚠️ [Daemon] 分析师初始化失败: {e}")
+        # 时间预算从本次任务开始计算，而非进程启动时刻
+        self.advisor.main(resident={"fetcher": self.fetcher, "analyst": self.analyst}, started=time.monotonic())
+        return {"rag_size": self.rag_size(), "panel_hits": self.fetcher.panel.hits, "panel_loads": self.fetcher.panel.loads}
+
+    def submit(self, name):
+        """ 排队一个任务，返回其完成事件；同名任务已在排队时直接复用 """
+        with self.lock:
+            if name in self.pending:
+                return self.pending[name]
+            done = threading.Event()
+            self.pending[name] = done
+        self.jobs.put(name)
+        logger.info(f"📨 [Daemon] 任务 {name} 已排队")
+        return done
+
+    def _worker(self):
+        # 所有任务在同一线程串行执行：抓取、刷新索引与分析之间不共享可变状态
+        while not self.stopping.is_set():
+            try:
+                name = self.jobs.get(timeout=1)
+            except queue.Empty:
+                continue
+            with self.lock:
+                done = self.pending.pop(name)
+                self.running = name
+            wall, cpu = time.time(), time.process_time()
+            record = {"started": get_beijing_time().strftime("%Y-%m-%d %H:%M:%S")}
+            try:
+                record["result"] = getattr(self, f"job_{name}")()
+                record["ok"] = True
+            except Exception as e:
+                logger.error(f"❌ [Daemon] 任务 {name} 失败: {e}", exc_info=True)
+                record["ok"] = False
+                record["error"] = str(e)
+            record["seconds"] = round(time.time() - wall, 1)
+            record["cpu_seconds"] = round(time.process_time() - cpu, 1)
+            logger.info(f"🏁 [Daemon] 任务 {name} 结束: 耗时 {record['seconds']}s, CPU {record['cpu_seconds']}s")
+            with self.lock:
+                self.last[name] = record
+                self.running = None
+            done.set()
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "started_at": self.started_at, "running": self.running,
+                "queued": list(self.pending), "last": dict(self.last),
+                "rag_size": self.rag_size(),
+                "next_run": str(schedule.next_run()) if schedule.get_jobs() else None,
+            }
+
+    # --- 调度 ---
+    def install_schedule(self):
+        tz = self.cfg["timezone"]
+        days = WEEKDAYS if self.cfg["weekdays_only"] else ALL_DAYS
+        for name, key in (("analyze", "analyze_times"), ("prices", "price_times")):
+            for at in self.cfg[key]:
+                for day in days:
+                    getattr(schedule.every(), day).at(at, tz).do(self.submit, name)
+        schedule.every(self.cfg["news_interval_minutes"]).minutes.do(self.submit, "crawl")
+
+    def serve(self):
+        self.warm_up()
+        self.install_schedule()
+        threading.Thread(target=self._worker, name="daemon-worker", daemon=True).start()
+
+        server = CommandServer((self.cfg["host"], self.cfg["port"]), CommandHandler)
+        server.advisor = self
+        threading.Thread(target=server.serve_forever, name="daemon-socket", daemon=True).start()
+        query_server = None
+        if self.cfg.get("query_port"):
+            from query_api import start_server
+            query_server, query_stop = start_server(self.cfg["host"], self.cfg["query_port"])
+            logger.info(f"🔎 [Daemon] 查询 API 监听 {self.cfg['host']}:{self.cfg['query_port']}")
+        logger.info(f"🛰️ [Daemon] 监听 {self.cfg['host']}:{self.cfg['port']}，下次定时任务 {schedule.next_run()}")
+        try:
+            while not self.stopping.is_set():
+                schedule.run_pending()
+                self.stopping.wait(1)
+        except KeyboardInterrupt:
+            self.stopping.set()
+        finally:
+            server.shutdown()
+            server.server_close()
+            if query_server is not None:
+                query_stop.set()
+                query_server.shutdown()
+            logger.info("👋 [Daemon] 已退出")
+
+class CommandServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+class CommandHandler(socketserver.StreamRequestHandler):
+    """ 单行文本协议: "<analyze|crawl|prices|status|stop> [wait]"，返回单行 JSON """
+    def handle(self):
+        advisor = self.server.advisor
+        parts = self.rfile.readline().decode('utf-8', errors='ignore').split()
+        command = parts[0] if parts else "status"
+        if command in JOBS:
+            done = advisor.submit(command)
+            if "wait" in parts[1:]:
+                done.wait()
+                reply = {"ok": True, "job": command, "record": advisor.last.get(command)}
+            else:
+                reply = {"ok": True, "job": command, "queued": True}
+        elif command == "status":
+            reply = dict(advisor.snapshot(), ok=True)
+        elif command == "stop":
+            advisor.stopping.set()
+            reply = {"ok": True, "stopping": True}
+        else:
+            reply = {"ok": False, "error": f"未知指令: {command}"}
+        self.wfile.write((json.dumps(reply, ensure_ascii=False, default=str) + "\n").encode('utf-8'))
+
+def send_command(command, host=DEFAULT_DAEMON_CONFIG["host"], port=DEFAULT_DAEMON_CONFIG["port"], timeout=None):
+    with socket.create_connection((host, port), timeout=timeout) as conn:
+        conn.sendall((command + "\n").encode('utf-8'))
+        return json.loads(conn.makefile('r', encoding='utf-8').readline())
+
+if __name__ == "__main__":
+    cfg = daemon_config(load_config())
+    if len(sys.argv) > 2 and sys.argv[1] == "send":
+        print(json.dumps(send_command(" ".join(sys.argv[2:]), cfg["host"], cfg["port"]), ensure_ascii=False, indent=2))
+    else:
+        AdvisorDaemon(cfg).serve()
@@ -18,6 +18,8 @@ except ImportError:
     print("❌ 请先安装依赖: pip install curl_cffi pandas pyyaml")
     sys.exit(1)
 
+from universe_screener import record_snapshot
+
 # ===================== 配置加载 =====================
 logging.basicConfig(
     level=logging.INFO,
@@ -207,6 +209,12 @@ class DataFetcher:
         if df is not None and not df.empty:
             self.spot_data_cache = df
             self.spot_data_date = today
+            # 🟢 全市场快照落盘，供 main.py 的全市场海选 (universe_screener) 使用
+            try:
+                saved = record_snapshot(df, today)
+                logger.info(f"💾 全市场快照已保存 ({saved} 只有效 ETF)")
+            except Exception as e:
+                logger.error(f"❌ 全市场快照保存失败: {e}")
             return True
         return False
 
@@ -327,6 +335,12 @@ if __name__ == "__main__":
     print("🚀 DataFetcher V23.5 (Settings Integrated)")
     print("=" * 60)
     
+    # --snapshot-only: 只抓全市场快照 (供海选)，不逐只更新 config.yaml 中标的的历史文件
+    if "--snapshot-only" in sys.argv:
+        ok = DataFetcher().init_spot_data()
+        print(f"🏁 全市场快照: {'完成' if ok else '失败'}")
+        sys.exit(0 if ok else 1)
+    
     funds = []
     if os.path.exists('config.yaml'):
         with open('config.yaml', 'r', encoding='utf-8') as f:
@@ -0,0 +1,85 @@
+import os
+import sys
+import json
+import glob
+import time
+import subprocess
+
+# ==========================================
+# 🟢 编码器后端基准测试
+# 每个后端在独立子进程中运行，分别统计加载耗时、编码吞吐与常驻内存 (RSS)
+# 用法: python bench_encoder.py [标题条数=2000] [后端=torch,onnx]
+# ==========================================
+
+def _rss_mb():
+    try:
+        with open("/proc/self/status", 'r') as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def load_titles(limit, data_dir="data_news"):
+    titles = []
+    for path in sorted(glob.glob(os.path.join(data_dir, "news_*.jsonl")), reverse=True):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    title = str(json.loads(line).get('title', '')).strip()
+                except Exception:
+                    continue
+                if len(title) >= 2:
+                    titles.append(title)
+        if len(titles) >= limit:
+            break
+    return titles[:limit]
+
+def run_worker(backend, limit):
+    from embedding_engine import load_encoder
+    titles = load_titles(limit)
+    rss_before = _rss_mb()
+    started = time.time()
+    encoder = load_encoder(backend)
+    load_sec = time.time() - started
+    encoder.encode(titles[:8], normalize_embeddings=True, show_progress_bar=False)
+
+    started = time.time()
+    encoder.encode(titles, normalize_embeddings=True, show_progress_bar=False)
+    encode_sec = time.time() - started
+    print(json.dumps({
+        "backend": backend,
+        "impl": type(encoder).__name__,
+        "n": len(titles),
+        "load_sec": round(load_sec, 2),
+        "encode_sec": round(encode_sec, 2),
+        "per_sec": round(len(titles) / encode_sec, 1) if encode_sec else 0,
+        "rss_mb": round(_rss_mb(), 1),
+        "rss_model_mb": round(_rss_mb() - rss_before, 1),
+    }))
+
+def main():
+    limit = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    backends = sys.argv[2].split(",") if len(sys.argv) > 2 else ["torch", "onnx"]
+    print(f"📏 编码器基准: {limit} 条新闻标题, 后端 {backends}")
+    for backend in backends:
+        proc = subprocess.run(
+            [sys.executable, __file__, "--worker", backend, str(limit)],
+            capture_output=True, text=True
+        )
+        lines = [l for l in proc.stdout.splitlines() if l.startswith("{")]
+        if proc.returncode != 0 or not lines:
+            print(f"❌ {backend}: 运行失败\n{proc.stderr[-2000:]}")
+            continue
+        r = json.loads(lines[-1])
+        print(f"  {r['backend']:<6} ({r['impl']}) 加载 {r['load_sec']}s | "
+              f"编码 {r['n']} 条 {r['encode_sec']}s ({r['per_sec']}/s) | "
+              f"RSS {r['rss_mb']}MB (模型 +{r['rss_model_mb']}MB)")
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--worker":
+        run_worker(sys.argv[2], int(sys.argv[3]))
+    else:
+        main()
@@ -0,0 +1,109 @@
+import os
+import sys
+import json
+import time
+import tempfile
+import threading
+import http.client
+
+import yaml
+
+from query_api import ResponseCache, start_server, build_snapshot, write_snapshot, SNAPSHOT_PATH, PORTFOLIO_PATH
+
+# ==========================================
+# 🟢 查询 API 压测
+# 进程内启动服务 (端口 0 随机分配)，多个 keep-alive 客户端线程轮询各端点，统计延迟分位数与吞吐；
+# 尚未生成过快照时按 config.yaml 的基金列表合成一份同等规模的快照
+# 用法: python bench_query_api.py [并发数=8] [每线程请求数=2000] [目标地址 host:port]
+# ==========================================
+TARGET_P99_MS = 10
+
+def synthetic_snapshot(path):
+    with open("config.yaml", 'r', encoding='utf-8') as f:
+        funds = yaml.safe_load(f).get('funds', [])
+    proposals = [{
+        "code": str(fund['code']), "name": fund['name'], "decision": "HOLD",
+        "tech": {"quant_score": 50, "rsi": 50, "price": 1.0, "macd": {"trend": "UP"}},
+        "ic_res": {"chairman_verdict": {"mode_selected": "D", "logic_weighting": "合成数据" * 20}},
+    } for fund in funds]
+    rag_hits = {fund['name']: {"news_ids": [f"id{i}" for i in range(10)], "hype": 30, "hits": 12} for fund in funds}
+    rag_contexts = {fund['name']: json.dumps({"Sector_Catalysts": ["合成新闻" * 10] * 10}, ensure_ascii=False) for fund in funds}
+    write_snapshot(build_snapshot("synthetic", proposals, [], rag_hits, rag_contexts), path)
+
+def client(host, port, paths, n, latencies, errors):
+    conn = http.client.HTTPConnection(host, port, timeout=5)
+    local = []
+    for i in range(n):
+        path = paths[i % len(paths)]
+        started = time.perf_counter()
+        try:
+            conn.request("GET", path)
+            resp = conn.getresponse()
+            resp.read()
+            if resp.status != 200:
+                errors.append(path)
+        except Exception:
+            errors.append(path)
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=5)
+            continue
+        local.append(time.perf_counter() - started)
+    conn.close()
+    latencies.extend(local)
+
+def percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))]
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    per_thread = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    target = sys.argv[3] if len(sys.argv) > 3 else None
+
+    server = None
+    if target:
+        host, port = target.rsplit(":", 1)
+        port = int(port)
+        cache = None
+    else:
+        snapshot_path = SNAPSHOT_PATH
+        if not os.path.exists(snapshot_path):
+            snapshot_path = os.path.join(tempfile.mkdtemp(), "query_snapshot.json")
+            synthetic_snapshot(snapshot_path)
+            print(f"ℹ️ 未找到 {SNAPSHOT_PATH}，使用合成快照")
+        cache = ResponseCache(snapshot_path, PORTFOLIO_PATH)
+        server, stop = start_server("127.0.0.1", 0, cache)
+        host, port = server.server_address
+
+    if cache is None:
+        conn = http.client.HTTPConnection(host, port, timeout=5)
+        conn.request("GET", "/funds")
+        codes = [f['code'] for f in json.loads(conn.getresponse().read())['funds']]
+        conn.close()
+    else:
+        codes = [route.split('/')[2] for route in cache.routes if route.count('/') == 2 and route.startswith('/fund/')]
+    paths = [f"/fund/{code}/{section}" for code in codes for section in ("technicals", "rag", "ic")] + ["/portfolio", "/funds"]
+
+    print(f"📏 查询 API 压测: {threads} 并发 × {per_thread} 请求，{len(paths)} 个端点")
+    latencies, errors = [], []
+    workers = [threading.Thread(target=client, args=(host, port, paths, per_thread, latencies, errors)) for _ in range(threads)]
+    started = time.perf_counter()
+    for w in workers: w.start()
+    for w in workers: w.join()
+    elapsed = time.perf_counter() - started
+
+    if server is not None:
+        stop.set()
+        server.shutdown()
+    if not latencies:
+        print("❌ 没有成功的请求")
+        sys.exit(1)
+
+    latencies.sort()
+    p50, p95, p99 = (percentile(latencies, q) * 1000 for q in (0.50, 0.95, 0.99))
+    print(f"  请求 {len(latencies)} 次 (失败 {len(errors)}) | 吞吐 {len(latencies) / elapsed:.0f} req/s")
+    print(f"  延迟 p50 {p50:.2f}ms | p95 {p95:.2f}ms | p99 {p99:.2f}ms | max {latencies[-1] * 1000:.2f}ms")
+    print(f"  {'✅' if p99 < TARGET_P99_MS else '❌'} p99 目标 < {TARGET_P99_MS}ms")
+    sys.exit(0 if p99 < TARGET_P99_MS and not errors else 1)
+
+if __name__ == "__main__":
+    main()
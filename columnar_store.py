@@ -0,0 +1,73 @@
+import os
+import numpy as np
+
+# ==========================================
+# 🟢 轻量列式表 (npz)
+# 每列一个定长 numpy 数组，整表以 npz 压缩存储，适合日频追加的小型时间序列
+# 写入走临时文件 + rename，中途崩溃不会留下半截文件
+# ==========================================
+
+class ColumnarTable:
+    """
+    schema: {列名: numpy dtype}，如 {"day": "U10", "code": "U12", "hype": np.int16}
+    """
+    def __init__(self, path, schema):
+        self.path = path
+        self.schema = {name: np.dtype(dtype) for name, dtype in schema.items()}
+        self.columns = {name: np.empty(0, dtype=dtype) for name, dtype in self.schema.items()}
+        if os.path.exists(path):
+            with np.load(path, allow_pickle=False) as data:
+                if set(self.schema) <= set(data.files):
+                    self.columns = {name: data[name].astype(dtype) for name, dtype in self.schema.items()}
+
+    def __len__(self):
+        return len(next(iter(self.columns.values()))) if self.columns else 0
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def _coerce(self, rows):
+        """ rows 为 {列名: 序列}，各列长度必须一致 """
+        batch = {name: np.asarray(rows[name], dtype=dtype) for name, dtype in self.schema.items()}
+        if len({len(col) for col in batch.values()}) > 1:
+            raise ValueError("列长度不一致")
+        return batch
+
+    def append(self, rows):
+        batch = self._coerce(rows)
+        self.columns = {name: np.concatenate([self.columns[name], batch[name]]) for name in self.schema}
+
+    def delete_where(self, name, value):
+        """ 删除某列等于 value 的行，返回删除条数 """
+        keep = self.columns[name] != value
+        removed = int(len(keep) - keep.sum())
+        if removed:
+            self.columns = {col: arr[keep] for col, arr in self.columns.items()}
+        return removed
+
+    def replace_where(self, name, value, rows):
+        """ 幂等写入：先删除 name == value 的旧行，再追加新行 """
+        self.delete_where(name, value)
+        self.append(rows)
+
+    def unique(self, name):
+        return np.unique(self.columns[name])
+
+    def select(self, name, value):
+        """ 返回 name == value 的子表 (dict 形式) """
+        mask = self.columns[name] == value
+        return {col: arr[mask] for col, arr in self.columns.items()}
+
+    def sort(self, *names):
+        """ 按给定列 (优先级从前到后) 排序 """
+        order = np.lexsort([self.columns[n] for n in reversed(names)])
+        self.columns = {col: arr[order] for col, arr in self.columns.items()}
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(f, **self.columns)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
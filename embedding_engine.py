@@ -0,0 +1,238 @@
+import os
+import json
+import time
+import threading
+from concurrent.futures import Future
+from utils import logger
+
+# ==========================================
+# 🟢 向量模型加载与后台预热
+# 进程启动即在后台线程加载 SentenceTransformer (含 torch 导入) 与 jieba 词典，
+# 与行情抓取等网络 I/O 并行；消费方首次需要编码器时才阻塞等待
+# ==========================================
+EMBED_MODEL_NAME = 'BAAI/bge-small-zh-v1.5'
+# 模型固定到本地缓存目录 (CI 通过 actions/cache 保留)，命中缓存时全程离线，不访问 Hugging Face Hub
+MODEL_CACHE_DIR = os.getenv("FUND_AI_MODEL_DIR", ".model_cache")
+# 预热时是否跑一次真实编码，提前完成算子初始化/图编译
+WARM_ENCODE = os.getenv("RAG_WARM_ENCODE", "1") != "0"
+
+# 编码后端: torch (SentenceTransformer 全精度) | onnx (onnxruntime int8 动态量化，仅 CPU)
+ENCODER_BACKEND = os.getenv("RAG_ENCODER_BACKEND", "torch").lower()
+# onnxruntime 算子内线程数，0 表示使用全部 CPU 核
+ONNX_THREADS = int(os.getenv("RAG_ONNX_THREADS", "0") or 0)
+ONNX_MODEL_DIR = os.path.join(MODEL_CACHE_DIR, "onnx", EMBED_MODEL_NAME.split("/")[-1] + "-int8")
+# int8 与 fp32 输出的最低余弦相似度，低于该值视为量化失真，回退 torch
+ONNX_PARITY_MIN_COSINE = 0.98
+PARITY_SAMPLES = [
+    "央行宣布下调存款准备金率0.5个百分点",
+    "半导体板块午后拉升，光刻机概念股集体走强",
+    "美联储维持利率不变，鲍威尔称通胀仍高于目标",
+    "沪深300ETF 成交额放大，北向资金净流入超百亿",
+    "新能源汽车销量同比增长，锂电池产业链迎来补库",
+]
+
+def is_model_cached(model_name=EMBED_MODEL_NAME, cache_dir=MODEL_CACHE_DIR):
+    """ 兼容 huggingface_hub 缓存布局 (models--org--name/snapshots) 与旧版 sentence-transformers 布局 (org_name) """
+    hub_dir = os.path.join(cache_dir, "models--" + model_name.replace("/", "--"), "snapshots")
+    legacy_dir = os.path.join(cache_dir, model_name.replace("/", "_"))
+    return (os.path.isdir(hub_dir) and bool(os.listdir(hub_dir))) or os.path.isdir(legacy_dir)
+
+def load_torch_encoder(model_name=EMBED_MODEL_NAME, cache_dir=MODEL_CACHE_DIR):
+    offline = is_model_cached(model_name, cache_dir)
+    if offline:
+        # 必须在 huggingface_hub 首次导入前设置
+        os.environ.setdefault("HF_HUB_OFFLINE", "1")
+        os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+    from sentence_transformers import SentenceTransformer
+    kwargs = {"cache_folder": cache_dir}
+    if offline:
+        kwargs["local_files_only"] = True
+    else:
+        logger.info(f"📥 [Encoder] 本地缓存 {cache_dir} 未命中，首次从 Hub 下载 {model_name}")
+    return SentenceTransformer(model_name, **kwargs)
+
+class OnnxEncoder:
+    """
+    onnxruntime int8 编码器，接口与 SentenceTransformer.encode 的常用子集一致
+    运行时只依赖 onnxruntime + tokenizers，不导入 torch
+    """
+    def __init__(self, model_dir=ONNX_MODEL_DIR, threads=ONNX_THREADS, max_length=512):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads or (os.cpu_count() or 1)
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(os.path.join(model_dir, "model.onnx"), options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        pad_id = self.tokenizer.token_to_id("[PAD]") or 0
+        self.tokenizer.enable_padding(pad_id=pad_id, pad_token="[PAD]")
+
+    def encode(self, texts, normalize_embeddings=True, show_progress_bar=False, batch_size=32):
+        import numpy as np
+        if isinstance(texts, str):
+            texts = [texts]
+        outputs = []
+        for i in range(0, len(texts), batch_size):
+            encodings = self.tokenizer.encode_batch(list(texts[i:i + batch_size]))
+            feeds = {
+                "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+                "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+                "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+            }
+            hidden = self.session.run(None, {k: v for k, v in feeds.items() if k in self.input_names})[0]
+            outputs.append(hidden[:, 0])  # bge 系列使用 [CLS] 池化
+        embeddings = np.concatenate(outputs).astype(np.float32) if outputs else np.zeros((0, 0), dtype=np.float32)
+        if normalize_embeddings and len(embeddings):
+            embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True).clip(min=1e-12)
+        return embeddings
+
+def export_onnx_int8(torch_encoder, out_dir=ONNX_MODEL_DIR):
+    """ 从已加载的 SentenceTransformer 导出 fp32 ONNX 并动态量化为 int8 """
+    import torch
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    os.makedirs(out_dir, exist_ok=True)
+    hf_model = torch_encoder[0].auto_model.eval()
+    hf_tokenizer = torch_encoder.tokenizer
+    sample = hf_tokenizer(PARITY_SAMPLES[:2], padding=True, return_tensors="pt")
+    input_names = [k for k in ("input_ids", "attention_mask", "token_type_ids") if k in sample]
+    dynamic_axes = {k: {0: "batch", 1: "seq"} for k in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "seq"}
+
+    fp32_path = os.path.join(out_dir, "model_fp32.onnx")
+    with torch.no_grad():
+        torch.onnx.export(
+            hf_model, tuple(sample[k] for k in input_names), fp32_path,
+            input_names=input_names, output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes, opset_version=14
+        )
+    quantize_dynamic(fp32_path, os.path.join(out_dir, "model.onnx"), weight_type=QuantType.QInt8)
+    os.remove(fp32_path)
+    hf_tokenizer.save_pretrained(out_dir)
+
+def check_parity(reference_encoder, candidate_encoder, texts=PARITY_SAMPLES):
+    """ 返回两个编码器在样本上的最小余弦相似度 """
+    import numpy as np
+    ref = reference_encoder.encode(texts, normalize_embeddings=True, show_progress_bar=False)
+    cand = candidate_encoder.encode(texts, normalize_embeddings=True, show_progress_bar=False)
+    return float(np.min(np.sum(ref * cand, axis=1)))
+
+def _read_parity(parity_path):
+    try:
+        with open(parity_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _write_parity(parity_path, passed, min_cosine=None, error=None):
+    os.makedirs(os.path.dirname(parity_path) or ".", exist_ok=True)
+    record = {"min_cosine": min_cosine, "threshold": ONNX_PARITY_MIN_COSINE, "passed": passed}
+    if error is not None:
+        record["error"] = f"{type(error).__name__}: {error}"[:500]
+    with open(parity_path, 'w', encoding='utf-8') as f:
+        json.dump(record, f, ensure_ascii=False)
+
+def load_onnx_encoder(model_dir=ONNX_MODEL_DIR):
+    """
+    已有通过一致性校验的 int8 模型时直接加载 (不触碰 torch)；同一阈值下已校验失败时直接用 torch 编码器；
+    否则加载 torch 模型导出量化、校验一致性，不达标则回退 torch 编码器
+    导出 / 量化 / 会话创建等失败 (缺依赖除外) 同样记为未通过并回退，之后的运行不再反复重试
+    """
+    parity_path = os.path.join(model_dir, "parity.json")
+    parity = _read_parity(parity_path)
+    if parity.get("passed") and os.path.exists(os.path.join(model_dir, "model.onnx")):
+        try:
+            return OnnxEncoder(model_dir)
+        except ImportError:
+            raise
+        except Exception as e:
+            logger.warning(f"⚠️ [Encoder] int8 模型加载失败 ({e})，记为未通过并回退 torch 后端")
+            _write_parity(parity_path, False, error=e)
+            return load_torch_encoder()
+    if parity.get("passed") is False and parity.get("threshold") == ONNX_PARITY_MIN_COSINE:
+        reason = parity.get("error") or f"最小余弦 {parity.get('min_cosine')}"
+        logger.info(f"ℹ️ [Encoder] int8 模型此前未通过一致性校验 ({reason})，直接使用 torch 后端")
+        return load_torch_encoder()
+
+    logger.info("🛠️ [Encoder] 首次启用 ONNX 后端，正在导出并量化 int8 模型...")
+    torch_encoder = load_torch_encoder()
+    try:
+        export_onnx_int8(torch_encoder, model_dir)
+        onnx_encoder = OnnxEncoder(model_dir)
+        min_cosine = check_parity(torch_encoder, onnx_encoder)
+    except ImportError:
+        raise
+    except Exception as e:
+        logger.warning(f"⚠️ [Encoder] int8 模型导出 / 量化失败 ({e})，记为未通过并回退 torch 后端")
+        _write_parity(parity_path, False, error=e)
+        return torch_encoder
+    passed = min_cosine >= ONNX_PARITY_MIN_COSINE
+    _write_parity(parity_path, passed, round(min_cosine, 5))
+
+    if not passed:
+        logger.warning(f"⚠️ [Encoder] int8 一致性校验未通过 (最小余弦 {min_cosine:.4f} < {ONNX_PARITY_MIN_COSINE})，回退 torch 后端")
+        return torch_encoder
+    logger.info(f"✅ [Encoder] int8 一致性校验通过 (最小余弦 {min_cosine:.4f})")
+    return onnx_encoder
+
+def load_encoder(backend=None):
+    backend = (backend or ENCODER_BACKEND).lower()
+    if backend == "onnx":
+        try:
+            return load_onnx_encoder()
+        except ImportError as e:
+            logger.warning(f"⚠️ [Encoder] 缺少 onnxruntime/tokenizers ({e}，见 requirements-onnx.txt)，回退 torch 后端")
+        except Exception as e:
+            # torch 模型本身加载失败等 ONNX 以外的问题: 不记入 parity.json，照常尝试 torch 后端
+            logger.warning(f"⚠️ [Encoder] ONNX 后端初始化失败 ({e})，回退 torch 后端")
+    return load_torch_encoder()
+
+class EncoderWarmup:
+    """ 编码器单例的后台预热器：start() 立即返回，get() 阻塞直到加载完成 """
+    def __init__(self, loader=load_encoder):
+        self.loader = loader
+        self._future = None
+        self._lock = threading.Lock()
+
+    def start(self, warm_encode=WARM_ENCODE):
+        with self._lock:
+            if self._future is None:
+                self._future = Future()
+                threading.Thread(target=self._run, args=(warm_encode,), name="encoder-warmup", daemon=True).start()
+            return self._future
+
+    def _run(self, warm_encode):
+        started = time.time()
+        try:
+            encoder = self.loader()
+            if warm_encode:
+                encoder.encode(["预热编码器"], normalize_embeddings=True, show_progress_bar=False)
+            try:
+                import jieba
+                jieba.setLogLevel(60)
+                jieba.initialize()
+            except ImportError:
+                pass
+            logger.info(f"🔥 [Encoder] 后台预热完成 ({type(encoder).__name__})，耗时 {time.time() - started:.1f}s")
+            self._future.set_result(encoder)
+        except Exception as e:
+            self._future.set_exception(e)
+
+    def get(self, timeout=None):
+        future = self.start()
+        if not future.done():
+            logger.info("⏳ [Encoder] 等待后台预热完成...")
+        return future.result(timeout)
+
+_warmup = EncoderWarmup()
+
+def start_encoder_warmup(warm_encode=WARM_ENCODE):
+    return _warmup.start(warm_encode)
+
+def get_encoder(timeout=None):
+    return _warmup.get(timeout)
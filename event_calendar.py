@@ -0,0 +1,220 @@
+import os
+import re
+import sys
+import json
+import glob
+import bisect
+import yaml
+from datetime import datetime, date, timedelta
+
+from news_index import generate_news_id, parse_news_epoch, _atomic_write, BEIJING_TZ
+
+# ==========================================
+# 🟢 事件日历 (Event Calendar)
+# 入库时从每条新闻中抽取带日期的事件 ("N天后"/明日/显式日期 + 会议名称)，
+# 按 EVENT_TIER_DEFINITIONS 定级、按配置中的板块关键词打标签后持久化；
+# 加载时构建 关键词 -> 按日期排序的事件 倒排索引，Phase 1 按基金二分查找最近事件
+# ==========================================
+CALENDAR_PATH = os.path.join("data_news", "event_calendar.json")
+MAX_HORIZON_DAYS = 90      # 超过该跨度的日期视为噪声
+KEEP_PAST_DAYS = 7         # 已过去的事件保留天数 (T+N 衰减期内仍有意义)
+REBUILD_DAYS = 30          # 日历文件丢失时回扫的日文件天数
+GLOBAL_KEY = "*"           # TIER_S 宏观事件对所有基金生效
+
+# 会议/事件名称 -> 级别 (按顺序匹配，先命中者为事件名称；级别与兜底关键词取高者)
+MEETING_TIERS = [
+    ("议息会议", "TIER_S"), ("FOMC", "TIER_S"), ("政治局会议", "TIER_S"),
+    ("中央经济工作会议", "TIER_S"), ("全国两会", "TIER_S"), ("两会", "TIER_S"),
+    ("五年规划", "TIER_S"), ("国常会", "TIER_S"), ("LPR", "TIER_S"),
+    ("非农", "TIER_A"), ("CPI", "TIER_A"), ("PMI", "TIER_A"), ("GDP", "TIER_A"),
+    ("财报", "TIER_A"), ("业绩", "TIER_A"), ("发布会", "TIER_A"), ("峰会", "TIER_A"),
+    ("大会", "TIER_A"), ("博览会", "TIER_A"), ("论坛", "TIER_A"),
+    ("调研", "TIER_B"), ("座谈会", "TIER_B"),
+]
+# 与 extract_event_info 一致的级别关键词，兜底定级
+S_KEYWORDS = ["议息", "五年规划", "中央", "重磅"]
+A_KEYWORDS = ["大会", "发布", "财报", "数据"]
+TIER_RANK = {"TIER_S": 3, "TIER_A": 2, "TIER_B": 1, "TIER_C": 0}
+
+_RELATIVE_DAYS = re.compile(r'(\d{1,2})\s*天后')
+_RELATIVE_WORDS = [("明日", 1), ("明天", 1), ("后天", 2)]
+_CN_DATE = re.compile(r'(?:(\d{4})年)?(\d{1,2})月(\d{1,2})日')
+_ISO_DATE = re.compile(r'(\d{4})-(\d{1,2})-(\d{1,2})')
+
+def load_sector_keywords(config_path="config.yaml"):
+    """ 汇总配置中所有基金的 sector_keyword 词表 """
+    try:
+        with open(config_path, 'r', encoding='utf-8') as f:
+            funds = yaml.safe_load(f).get('funds', [])
+    except Exception:
+        return []
+    keywords = set()
+    for fund in funds:
+        keywords.update(str(fund.get('sector_keyword', '')).split())
+    return sorted(keywords)
+
+def classify_tier(text):
+    """ 返回 (级别, 事件名称)；名称表命中低级别会议 ("座谈会") 时不压低关键词兜底 ("中央") 的级别 """
+    tier, name = next(((tier, name) for name, tier in MEETING_TIERS if name in text), ("TIER_C", None))
+    if any(k in text for k in S_KEYWORDS):
+        fallback = "TIER_S"
+    elif any(k in text for k in A_KEYWORDS):
+        fallback = "TIER_A"
+    else:
+        fallback = "TIER_C"
+    return max(tier, fallback, key=TIER_RANK.get), name
+
+def extract_event_dates(text, pub_date):
+    """ 抽取发布日之后 (不含) MAX_HORIZON_DAYS 内的所有事件日期 """
+    found = set()
+    for match in _RELATIVE_DAYS.finditer(text):
+        n = int(match.group(1))
+        if 0 < n <= MAX_HORIZON_DAYS:
+            found.add(pub_date + timedelta(days=n))
+    for word, n in _RELATIVE_WORDS:
+        if word in text:
+            found.add(pub_date + timedelta(days=n))
+    for pattern in (_CN_DATE, _ISO_DATE):
+        for match in pattern.finditer(text):
+            year, month, day = match.groups()
+            try:
+                d = date(int(year) if year else pub_date.year, int(month), int(day))
+            except ValueError:
+                continue
+            # 无年份且落在过去较远处的日期 (如 12 月新闻提到 "1月5日") 视为次年
+            if not year and d < pub_date - timedelta(days=30):
+                d = d.replace(year=d.year + 1)
+            if pub_date < d <= pub_date + timedelta(days=MAX_HORIZON_DAYS):
+                found.add(d)
+    return sorted(found)
+
+class EventCalendar:
+    """
+    持久化事件日历: events 为 {事件 id: 事件}，by_keyword 为内存中的倒排索引
+    by_keyword[kw] = (排序后的日期序数列表, 对应事件列表)
+    """
+    def __init__(self, path=CALENDAR_PATH, sector_keywords=None):
+        self.path = path
+        self.sector_keywords = sector_keywords if sector_keywords is not None else load_sector_keywords()
+        self.events = {}
+        self.dirty = False
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.events = json.load(f).get("events", {})
+            except Exception:
+                self.events = {}
+        self._build_index()
+
+    def __len__(self):
+        return len(self.events)
+
+    def _build_index(self):
+        buckets = {}
+        for event in self.events.values():
+            for kw in event["keywords"]:
+                buckets.setdefault(kw, []).append(event)
+        self.by_keyword = {}
+        for kw, events in buckets.items():
+            events.sort(key=lambda e: (e["date"], -TIER_RANK[e["tier"]]))
+            self.by_keyword[kw] = ([date.fromisoformat(e["date"]).toordinal() for e in events], events)
+
+    def add_items(self, items, day_str):
+        """ 从一批新闻中抽取事件，返回新增事件数 """
+        added = 0
+        for item in items:
+            title = str(item.get('title', '')).strip()
+            text = f"{title} {item.get('content') or item.get('digest') or ''}"
+            tier, name = classify_tier(text)
+            if tier == "TIER_C":
+                continue  # C 级事件在 IC 端直接 REJECT_C_TRACK，不入日历
+            epoch = parse_news_epoch(item.get('time', ''), day_str)
+            pub_date = datetime.fromtimestamp(epoch, BEIJING_TZ).date() if epoch else date.fromisoformat(day_str)
+            keywords = [kw for kw in self.sector_keywords if kw in text]
+            if tier == "TIER_S":
+                keywords.append(GLOBAL_KEY)
+            if not keywords:
+                continue
+            news_id = generate_news_id(item)
+            for event_date in extract_event_dates(text, pub_date):
+                event_id = f"{news_id}:{event_date.isoformat()}"
+                if event_id in self.events:
+                    continue
+                self.events[event_id] = {
+                    "date": event_date.isoformat(), "tier": tier, "name": name or "",
+                    "title": title, "pub_day": pub_date.isoformat(), "keywords": keywords,
+                }
+                added += 1
+        if added:
+            self.dirty = True
+            self._build_index()
+        return added
+
+    def sync_file(self, jsonl_path):
+        match = re.search(r'news_(\d{4}-\d{2}-\d{2})\.jsonl$', jsonl_path)
+        if not match: return 0
+        items = []
+        with open(jsonl_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip(): continue
+                try: items.append(json.loads(line))
+                except Exception: pass
+        return self.add_items(items, match.group(1))
+
+    def rebuild(self, data_dir="data_news", days=REBUILD_DAYS):
+        total = 0
+        for path in sorted(glob.glob(os.path.join(data_dir, "news_*.jsonl")))[-days:]:
+            total += self.sync_file(path)
+        return total
+
+    def prune(self, today=None):
+        cutoff = ((today or datetime.now(BEIJING_TZ).date()) - timedelta(days=KEEP_PAST_DAYS)).isoformat()
+        stale = [k for k, e in self.events.items() if e["date"] < cutoff]
+        for k in stale:
+            del self.events[k]
+        if stale:
+            self.dirty = True
+            self._build_index()
+        return len(stale)
+
+    def save(self):
+        if not self.dirty:
+            return
+        payload = {"updated": datetime.now(BEIJING_TZ).strftime("%Y-%m-%d %H:%M:%S"), "events": self.events}
+        _atomic_write(self.path, json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+        self.dirty = False
+
+    def next_event(self, sector_keyword, today=None):
+        """
+        基金关键词 (空格分隔) + 全局宏观键上各做一次二分，返回最近的未来事件 (同日取最高级别)
+        返回 event dict (附 days_to_event) 或 None
+        """
+        today_ord = (today or datetime.now(BEIJING_TZ).date()).toordinal()
+        best = None
+        for kw in str(sector_keyword).split() + [GLOBAL_KEY]:
+            entry = self.by_keyword.get(kw)
+            if not entry: continue
+            dates, events = entry
+            pos = bisect.bisect_left(dates, today_ord)
+            if pos == len(dates): continue
+            key = (dates[pos], -TIER_RANK[events[pos]["tier"]])
+            if best is None or key < best[0]:
+                best = (key, events[pos])
+        if best is None:
+            return None
+        return dict(best[1], days_to_event=best[0][0] - today_ord)
+
+    def lookup(self, sector_keyword, today=None):
+        """ 返回 (days_to_event, event_tier)，无事件返回 None """
+        event = self.next_event(sector_keyword, today)
+        if event is None:
+            return None
+        return event["days_to_event"], event["tier"]
+
+if __name__ == "__main__":
+    # 用法: python event_calendar.py [回扫天数]
+    calendar = EventCalendar()
+    added = calendar.rebuild(days=int(sys.argv[1]) if len(sys.argv) > 1 else REBUILD_DAYS)
+    calendar.prune()
+    calendar.save()
+    print(f"📅 事件日历重建完成: 新增 {added} 个事件，共 {len(calendar)} 个")
@@ -0,0 +1,112 @@
+import re
+import copy
+import numpy as np
+
+from utils import logger
+
+# ==========================================
+# 🟢 同质标的聚类 (Fund Clustering)
+# 滚动收益相关 (risk_engine 的按日相关矩阵) 与 sector_keyword 字符二元组重合度同时超过阈值的两只基金连边，
+# 重合度按 IDF 加权 (许多基金共有的 "避险资产" "高股息" 之类二元组权重低)，并先剔除来源 / 政策类标签，
+# 并查集合并为簇；Phase 1 每簇只由代表 (优先级最高者) 上会一次，其余成员沿用代表的 IC 结论，
+# 技术面与代表偏离过大的成员仍单独上会。只看相关或只看关键词都会误合并 (如白银与中概互联的短期共振)
+# ==========================================
+DEFAULT_CLUSTER_CONFIG = {
+    "enabled": True,
+    "corr_threshold": 0.93,      # 滚动收益相关下限
+    "keyword_jaccard": 0.15,     # sector_keyword 字符二元组 IDF 加权 Jaccard 下限
+    "filler_keywords": ["同花顺热门", "十五五规划"],   # 不代表主题的标签，不参与比较
+    "max_score_gap": 15,         # 成员与代表的技术分差超过该值时不共享结论
+}
+
+def cluster_config(config):
+    cfg = dict(DEFAULT_CLUSTER_CONFIG)
+    cfg.update(config.get('clustering') or {})
+    return cfg
+
+def keyword_grams(fund, filler=()):
+    """ 关键词切成字符二元组: 中文关键词写法各异 (芯片/芯片股/半导体芯片)，整词匹配几乎没有重合 """
+    grams = set()
+    for word in fund.get('sector_keyword', '').split():
+        if word in filler:
+            continue
+        word = re.sub(r'ETF', '', word, flags=re.I)
+        grams |= {word[k:k + 2] for k in range(len(word) - 1)} if len(word) > 1 else {word}
+    return grams
+
+def jaccard_matrix(gram_sets):
+    """
+    成员矩阵 (基金 × 二元组) 一次算出两两 IDF 加权 Jaccard: Σ交集 idf / Σ并集 idf
+    idf 取平滑形式 log((1+N)/(1+df)) + 1，只有两只基金时共有的二元组也不至于权重为 0
+    """
+    vocab = {g: i for i, g in enumerate(sorted(set().union(*gram_sets)))} if gram_sets else {}
+    member = np.zeros((len(gram_sets), len(vocab)), dtype=np.float32)
+    for i, grams in enumerate(gram_sets):
+        member[i, [vocab[g] for g in grams]] = 1.0
+    idf = np.log((1 + len(gram_sets)) / (1 + member.sum(axis=0))) + 1
+    inter = (member * idf) @ member.T
+    sizes = member @ idf
+    union = sizes[:, None] + sizes[None, :] - inter
+    return np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+class UnionFind:
+    def __init__(self, n):
+        self.parent = list(range(n))
+
+    def find(self, x):
+        while self.parent[x] != x:
+            self.parent[x] = self.parent[self.parent[x]]
+            x = self.parent[x]
+        return x
+
+    def union(self, a, b):
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            self.parent[rb] = ra
+
+def cluster_funds(funds, model, cfg):
+    """
+    funds: 按 Phase 1 优先级排好序的基金配置；model: risk_engine.RiskModel (提供相关矩阵)
+    返回簇列表 (每簇为 code 列表，首个为代表，只含两只及以上的簇)
+    """
+    codes = [str(f['code']) for f in funds if str(f['code']) in model.index]
+    if len(codes) < 2:
+        return []
+    by_code = {str(f['code']): f for f in funds}
+    idx = [model.index[c] for c in codes]
+    corr = model.corr[np.ix_(idx, idx)]
+    filler = set(cfg["filler_keywords"])
+    jac = jaccard_matrix([keyword_grams(by_code[c], filler) for c in codes])
+    linked = (corr >= cfg["corr_threshold"]) & (jac >= cfg["keyword_jaccard"])
+    np.fill_diagonal(linked, False)
+
+    uf = UnionFind(len(codes))
+    for a, b in zip(*np.nonzero(np.triu(linked))):
+        uf.union(a, b)
+    groups = {}
+    for i, code in enumerate(codes):   # codes 保持优先级顺序，组内首个即代表
+        groups.setdefault(uf.find(i), []).append(code)
+    return [g for g in groups.values() if len(g) > 1]
+
+def split_cluster(preps, max_score_gap):
+    """ preps: 同簇的 Phase 1 输入 (代表在前)；返回 (代表, 可共享结论的成员, 需单独上会的成员) """
+    leader, rest = preps[0], preps[1:]
+    score = leader['tech'].get('quant_score', 50)
+    shared = [p for p in rest if abs(p['tech'].get('quant_score', 50) - score) <= max_score_gap]
+    alone = [p for p in rest if abs(p['tech'].get('quant_score', 50) - score) > max_score_gap]
+    return leader, shared, alone
+
+def shared_ic_result(leader_proposal, member_prep):
+    """ 成员沿用代表的 IC 结论 (深拷贝，后续阶段会改写 verdict)，并注明出处 """
+    ic_res = copy.deepcopy(leader_proposal['ic_res'])
+    source = f"{leader_proposal['name']}({leader_proposal['code']})"
+    ic_res['shared_from'] = {"code": leader_proposal['code'], "name": leader_proposal['name']}
+    ic_res['mode_justification'] = f"[同簇共享 {source} 结论，本标的技术分 {member_prep['tech'].get('quant_score', '-')}] " \
+                                   + str(ic_res.get('mode_justification', ''))
+    return ic_res
+
+def log_clusters(clusters, names):
+    if clusters:
+        saved = sum(len(c) - 1 for c in clusters)
+        desc = " | ".join("/".join(names.get(code, code) for code in c) for c in clusters)
+        logger.info(f"🧩 [Phase 1] 同质标的 {len(clusters)} 簇，最多节省 {saved} 次 IC 调用: {desc}")
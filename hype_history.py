@@ -0,0 +1,206 @@
+import os
+import re
+import sys
+import json
+import glob
+import time
+import yaml
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from datetime import datetime, timedelta
+
+from columnar_store import ColumnarTable
+from news_index import parse_news_epoch, BEIJING_TZ
+from hype_scoring import top_k_similar, score_hits, is_duplicate_title, SEARCH_K
+
+# ==========================================
+# 🟢 板块情绪 (Hype Score) 历史序列
+# 每个交易日 × 时点 × 每只基金一行: 情绪分 / 去重后独立线索数 / 有效命中数
+# 时点 (cutoff) 为该日 HH:MM 之前的新闻、以 HH:MM 为评估时刻的打分，24:00 为全天终值；
+# 盘中运行的 Z 分数只与历史上同一时点的打分比较 (上午半天的新闻不会被拿去和全天终值比)
+# 只写入已结束的交易日: 回填任务以进程池并行扫描 data_news 日文件 (每个进程只加载一次编码器)，
+# 日常运行用已加载的编码器补齐最近缺失的日子 (通常只有前一日)，当日的盘中打分不入序列
+# ==========================================
+HISTORY_PATH = os.path.join("data_cache", "hype_history.npz")
+HISTORY_SCHEMA = {
+    "day": "U10",
+    "cutoff": "U5",
+    "code": "U12",
+    "hype": np.int16,
+    "clues": np.int16,
+    "hits": np.int16,
+}
+BACKFILL_KERNEL = os.getenv("RAG_DECAY_KERNEL", "exponential")
+DAY_END = "24:00"
+# 覆盖定时分析 (08:00 / 09:00 / 12:00) 与常驻进程的盘中轮询；早于首个时点的运行不计算 Z 分数
+CUTOFFS = tuple(f"{hour:02d}:00" for hour in range(8, 16)) + (DAY_END,)
+FINALIZE_MAX_DAYS = 30   # 日常运行最多补齐的天数 (覆盖 Z 分数窗口)，更早的缺口交给 python hype_history.py
+
+def open_history(path=HISTORY_PATH):
+    return ColumnarTable(path, HISTORY_SCHEMA)
+
+def load_funds(config_path="config.yaml"):
+    with open(config_path, 'r', encoding='utf-8') as f:
+        return yaml.safe_load(f).get('funds', [])
+
+def fund_queries(funds):
+    return [f"{fund.get('name', '')} {fund.get('sector_keyword', '')}" for fund in funds]
+
+def _read_day(path, day_str):
+    titles, epochs = [], []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip(): continue
+            try:
+                item = json.loads(line)
+            except Exception:
+                continue
+            title = str(item.get('title', '')).strip()
+            if len(title) < 2: continue
+            titles.append(title)
+            epochs.append(parse_news_epoch(item.get('time', ''), day_str) or 0)
+    return titles, np.asarray(epochs, dtype=np.int64)
+
+def cutoff_epoch(day_str, cutoff):
+    hour, minute = map(int, cutoff.split(":"))
+    start = datetime.strptime(day_str, "%Y-%m-%d").replace(tzinfo=BEIJING_TZ)
+    return (start + timedelta(hours=hour, minutes=minute)).timestamp()
+
+def cutoff_for(now):
+    """ now (北京时间) 之前最近的盘中时点；早于首个时点返回 None """
+    passed = [c for c in CUTOFFS[:-1] if c <= now.strftime("%H:%M")]
+    return passed[-1] if passed else None
+
+def score_cutoff(query_embs, news_embs, titles, epochs, day_str, cutoff, kernel=BACKFILL_KERNEL):
+    """
+    只取当日 cutoff 之前 (时间已知) 的新闻，以 cutoff 为评估时刻计算所有基金的 (hype, clues, hits)；
+    回填与盘中实时打分共用，保证 Z 分数两边口径一致
+    """
+    n_funds = len(query_embs)
+    end = cutoff_epoch(day_str, cutoff)
+    epochs = np.asarray(epochs, dtype=np.int64)
+    keep = np.flatnonzero((epochs >= cutoff_epoch(day_str, "00:00")) & (epochs < end)) if len(epochs) else epochs
+    if not len(keep):
+        zeros = np.zeros(n_funds, dtype=np.int64)
+        return zeros, zeros, zeros
+    D, I = top_k_similar(query_embs, np.asarray(news_embs)[keep], SEARCH_K)
+    scored = score_hits(D, I, epochs[keep], end, kernel)
+
+    clues = np.zeros(n_funds, dtype=np.int64)
+    for row in range(n_funds):
+        accepted = []
+        for idx in I[row][scored['mask'][row]]:
+            title = titles[keep[idx]]
+            if not is_duplicate_title(title, accepted):
+                accepted.append(title)
+        clues[row] = len(accepted)
+    return scored['hype'], clues, scored['counts']
+
+def score_day(encoder, path, query_embs, kernel=BACKFILL_KERNEL):
+    """ 对一个已结束的日文件按各时点计算所有基金的打分，返回 (day, {cutoff: (hype, clues, hits)}) """
+    day_str = re.search(r'news_(\d{4}-\d{2}-\d{2})\.jsonl$', path).group(1)
+    titles, epochs = _read_day(path, day_str)
+    news_embs = encoder.encode(titles, normalize_embeddings=True, show_progress_bar=False) if titles else []
+    return day_str, {cutoff: score_cutoff(query_embs, news_embs, titles, epochs, day_str, cutoff, kernel)
+                     for cutoff in CUTOFFS}
+
+# --- 进程池工作函数 ---
+_worker = {}
+
+def _init_worker(threads, queries):
+    # 每个子进程只分到 threads 个算子线程，避免 N 进程 × 全核线程的超额订阅
+    os.environ["RAG_ONNX_THREADS"] = str(threads)
+    from embedding_engine import load_encoder
+    encoder = load_encoder()
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    _worker["encoder"] = encoder
+    _worker["query_embs"] = encoder.encode(queries, normalize_embeddings=True, show_progress_bar=False)
+
+def _score_day_worker(path):
+    return score_day(_worker["encoder"], path, _worker["query_embs"])
+
+def _today():
+    return datetime.now(BEIJING_TZ).strftime("%Y-%m-%d")
+
+def _pending_days(table, data_dir, before, rebuild=False):
+    """ before 之前 (已结束) 且历史表中缺失的日文件 """
+    done = set() if rebuild else set(table.unique("day").tolist())
+    pending = []
+    for day_path in sorted(glob.glob(os.path.join(data_dir, "news_*.jsonl"))):
+        match = re.search(r'news_(\d{4}-\d{2}-\d{2})\.jsonl$', day_path)
+        if match and match.group(1) < before and match.group(1) not in done:
+            pending.append(day_path)
+    return pending
+
+def _write_day(table, codes, day_str, results):
+    n = len(codes)
+    table.replace_where("day", day_str, {
+        "day": [day_str] * n * len(results),
+        "cutoff": [cutoff for cutoff in results for _ in range(n)],
+        "code": codes * len(results),
+        "hype": np.concatenate([r[0] for r in results.values()]),
+        "clues": np.concatenate([r[1] for r in results.values()]),
+        "hits": np.concatenate([r[2] for r in results.values()]),
+    })
+
+def backfill(config_path="config.yaml", data_dir="data_news", workers=None, rebuild=False, path=HISTORY_PATH, before=None):
+    """ 补齐历史表中缺失的已结束日期 (rebuild=True 时全部重算)，返回新写入的天数 """
+    funds = load_funds(config_path)
+    codes = [str(fund.get('code')) for fund in funds]
+    table = open_history(path)
+    pending = _pending_days(table, data_dir, before or _today(), rebuild)
+    if not pending:
+        return 0
+
+    workers = workers or min(4, os.cpu_count() or 1)
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    # spawn: 避免 fork 继承父进程中已初始化的 torch 线程池
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"),
+                             initializer=_init_worker, initargs=(threads, fund_queries(funds))) as executor:
+        for day_str, results in executor.map(_score_day_worker, pending):
+            _write_day(table, codes, day_str, results)
+            print(f"   📅 {day_str}: 平均情绪分 {float(np.mean(results[DAY_END][0])):.1f}")
+
+    table.sort("day", "cutoff", "code")
+    table.save()
+    return len(pending)
+
+def finalize_days(encoder, funds, data_dir="data_news", path=HISTORY_PATH, before=None):
+    """ 日常运行: 用已加载的编码器补齐最近缺失的已结束日期 (当日不写)，返回新写入的天数 """
+    table = open_history(path)
+    pending = _pending_days(table, data_dir, before or _today())[-FINALIZE_MAX_DAYS:]
+    if not pending:
+        return 0
+    codes = [str(fund.get('code')) for fund in funds]
+    query_embs = encoder.encode(fund_queries(funds), normalize_embeddings=True, show_progress_bar=False)
+    for day_path in pending:
+        day_str, results = score_day(encoder, day_path, query_embs)
+        _write_day(table, codes, day_str, results)
+    table.sort("day", "cutoff", "code")
+    table.save()
+    return len(pending)
+
+def hype_zscore(table, code, value, cutoff, window=20, before=None):
+    """
+    同一时点 (cutoff) 的情绪分相对该基金近 window 日历史 (before 之前的交易日) 的 Z 分数，
+    value 须按 score_cutoff 的同一口径计算；历史不足 5 天返回 None
+    """
+    rows = table.select("code", str(code))
+    history = rows["hype"][(rows["cutoff"] == cutoff) & ((rows["day"] < before) if before else True)]
+    history = history[-window:].astype(np.float64)
+    if len(history) < 5:
+        return None
+    std = history.std()
+    return round(float((value - history.mean()) / std), 2) if std > 0 else 0.0
+
+if __name__ == "__main__":
+    # 用法: python hype_history.py [进程数] [--rebuild]
+    args = [a for a in sys.argv[1:] if a != "--rebuild"]
+    start = time.time()
+    days = backfill(workers=int(args[0]) if args else None, rebuild="--rebuild" in sys.argv)
+    print(f"📈 情绪历史回填完成: 新增 {days} 天，耗时 {time.time() - start:.1f}s")
@@ -0,0 +1,103 @@
+import re
+import difflib
+import numpy as np
+
+from prompts_config import EVENT_TIER_DEFINITIONS
+
+# ==========================================
+# 🟢 情绪共振 (Hype Score) 向量化计算
+# 新闻时间在建索引时一次性归一化为 epoch 数组，
+# 相似度矩阵 (基金 × 命中) 上的阈值过滤、时间衰减与累加全部为数组运算
+# ==========================================
+SIM_THRESHOLD = 0.40
+SEARCH_K = 50
+HYPE_SCALE = 6
+EXP_DECAY_RATE = 0.05       # 指数衰减: exp(-0.05 * 小时)
+UNKNOWN_TIME_WEIGHT = 0.8   # 新闻时间缺失时的兜底权重
+
+_OFFSET_PATTERN = re.compile(r'^T([+-])(\d+)$')
+
+def _post_event_points(tier):
+    """
+    从 EVENT_TIER_DEFINITIONS 的 decay_params 中取事件发生后 (T-0, T+N) 的节点，
+    返回按小时升序的 (hours, weights) 数组；新闻发布时刻视作 T-0
+    """
+    points = []
+    for key, weight in EVENT_TIER_DEFINITIONS[tier].get("decay_params", {}).items():
+        match = _OFFSET_PATTERN.match(key)
+        if not match: continue
+        sign, days = match.group(1), int(match.group(2))
+        if sign == '-' and days != 0: continue
+        points.append((days * 24.0, float(weight)))
+    points.sort()
+    return np.array([p[0] for p in points]), np.array([p[1] for p in points])
+
+_STEP_HOURS, _STEP_WEIGHTS = _post_event_points("TIER_S")
+_LINEAR_HOURS, _LINEAR_WEIGHTS = _post_event_points("TIER_A")
+
+def _exponential(hours):
+    return np.exp(-EXP_DECAY_RATE * hours)
+
+def _step(hours):
+    # TIER_S 阶梯: T-0 满权重, T+1 减半, T+2 起归零
+    return _STEP_WEIGHTS[np.searchsorted(_STEP_HOURS, hours, side='right') - 1]
+
+def _linear(hours):
+    # TIER_A 线性: T-0 的 1.0 线性衰减至 T+3 的 0.3，窗口外归零
+    return np.interp(hours, _LINEAR_HOURS, _LINEAR_WEIGHTS, right=0.0)
+
+DECAY_KERNELS = {
+    "exponential": _exponential,
+    "step": _step,
+    "linear": _linear,
+}
+
+def decay_weights(news_epochs, now_epoch, kernel="exponential"):
+    """ 逐元素计算时间衰减权重，news_epochs 可为任意形状，<=0 视为时间未知 """
+    news_epochs = np.asarray(news_epochs, dtype=np.float64)
+    hours = np.maximum(0.0, (now_epoch - news_epochs) / 3600.0)
+    weights = DECAY_KERNELS.get(kernel, _exponential)(hours)
+    return np.where(news_epochs > 0, weights, UNKNOWN_TIME_WEIGHT)
+
+def top_k_similar(query_embs, news_embs, k=SEARCH_K):
+    """
+    归一化向量的内积 Top-K (与 faiss.IndexFlatIP.search 输出约定一致)
+    返回 (D, I)，均为 (查询数, k)，按相似度降序
+    """
+    sims = np.asarray(query_embs, dtype=np.float32) @ np.asarray(news_embs, dtype=np.float32).T
+    k = min(k, sims.shape[1])
+    if k == 0:
+        return np.zeros((len(sims), 0), dtype=np.float32), np.zeros((len(sims), 0), dtype=np.int64)
+    I = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+    D = np.take_along_axis(sims, I, axis=1)
+    order = np.argsort(-D, axis=1)
+    return np.take_along_axis(D, order, axis=1), np.take_along_axis(I, order, axis=1)
+
+def score_hits(D, I, news_epochs, now_epoch, kernel="exponential", threshold=SIM_THRESHOLD):
+    """
+    对 (基金 × 命中) 的检索结果批量打分
+    返回 dict:
+      mask     (F, K) bool   通过相关度阈值的命中
+      weights  (F, K) float  时间衰减权重
+      hype     (F,)   int    归一化情绪分 0-100
+      counts   (F,)   int    有效命中数 (含重复报道)
+    """
+    D = np.asarray(D, dtype=np.float64)
+    I = np.asarray(I)
+    mask = (I >= 0) & (D >= threshold)
+    epochs = np.asarray(news_epochs)[np.clip(I, 0, None)]
+    weights = decay_weights(epochs, now_epoch, kernel)
+    accum = np.where(mask, D * weights, 0.0).sum(axis=1)
+    hype = np.minimum(100, (accum * HYPE_SCALE).astype(np.int64))
+    return {"mask": mask, "weights": weights, "hype": hype, "counts": mask.sum(axis=1)}
+
+def is_duplicate_title(title, accepted_titles):
+    """ 线索去重：与已接纳标题互为子串，或字符相似度 > 80% """
+    for seen_title in accepted_titles:
+        # 规则 1：子串包含关系 (如："特发信息涨停" 与 "光纤概念特发信息涨停")
+        if title in seen_title or seen_title in title:
+            return True
+        # 规则 2：语义高相似度匹配
+        if difflib.SequenceMatcher(None, title, seen_title).quick_ratio() > 0.8:
+            return True
+    return False
@@ -0,0 +1,99 @@
+import os
+import json
+import hashlib
+import threading
+
+from news_index import _atomic_write
+
+# ==========================================
+# 🟢 IC 输入指纹 (Input Fingerprint)
+# 对每只基金的技术面因子做分桶量化后哈希，连同其 RAG 独立线索 (新闻簇) id 集合，
+# 与同日上一次运行的记录比对：输入未发生实质变化时直接复用上次的 IC 结论，不再调用 LLM
+# ==========================================
+FINGERPRINT_PATH = os.path.join("data_cache", "ic_fingerprints.json")
+DEFAULT_MAX_NEW_CLUSTERS = 1   # 新增线索数超过该值即视为新闻面变化
+
+def _bucket(value, step):
+    try:
+        return int(float(value) // step)
+    except (TypeError, ValueError):
+        return None
+
+def quantize_tech(tech, macro=None, event=None):
+    """ 技术面 + 宏观 + 事件输入的分桶表示 (桶宽决定"实质变化"的灵敏度) """
+    macd = tech.get('macd', {})
+    risk_reward = tech.get('risk_reward', {})
+    key = {
+        "score": _bucket(tech.get('quant_score', 0), 5),
+        "rsi": _bucket(tech.get('rsi', 50), 5),
+        "gain": _bucket(tech.get('recent_gain', 0), 1.0),
+        "vol": tech.get('volatility_status'),
+        "macd": macd.get('trend'),
+        "div": macd.get('divergence'),
+        "ma": tech.get('ma_alignment'),
+        "volume": tech.get('volume_analysis', {}).get('status'),
+        "rr": _bucket(risk_reward.get('ratio', 0), 0.5),
+    }
+    if macro is not None:
+        key["flow"] = _bucket(macro.get('net_flow', 0), 50)
+        if macro.get('market_regime'):
+            key["regime"] = macro['market_regime'].get('level')
+    if event is not None:
+        key["event"] = list(event)
+    return key
+
+def hash_key(key):
+    return hashlib.md5(json.dumps(key, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+class FingerprintStore:
+    """ {基金代码: {day, tech_hash, news_ids, ic_res}}，只保留当日记录 """
+    def __init__(self, day_str, path=FINGERPRINT_PATH, max_new_clusters=DEFAULT_MAX_NEW_CLUSTERS):
+        self.day_str = day_str
+        self.path = path
+        self.max_new_clusters = max_new_clusters
+        self.lock = threading.Lock()
+        self.records = {}
+        self.reused = 0
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                self.records = {code: r for code, r in data.items() if r.get('day') == day_str}
+            except Exception:
+                self.records = {}
+
+    def lookup(self, code, tech_key, news_ids):
+        """
+        输入未实质变化时返回上次的 ic_res，否则返回 None
+        news_ids 为 None (无 RAG 线索可比) 时一律重新分析
+        """
+        if news_ids is None:
+            return None
+        with self.lock:
+            record = self.records.get(str(code))
+        if not record or record['tech_hash'] != hash_key(tech_key):
+            return None
+        new_clusters = set(news_ids) - set(record['news_ids'])
+        if len(new_clusters) > self.max_new_clusters:
+            return None
+        with self.lock:
+            self.reused += 1
+        return json.loads(json.dumps(record['ic_res']))
+
+    def record(self, code, tech_key, news_ids, ic_res):
+        if news_ids is None or not ic_res:
+            return
+        with self.lock:
+            self.records[str(code)] = {
+                "day": self.day_str,
+                "tech_hash": hash_key(tech_key),
+                "tech_key": tech_key,
+                "news_ids": sorted(news_ids),
+                "ic_res": ic_res,
+            }
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self.lock:
+            data = json.dumps(self.records, ensure_ascii=False, separators=(',', ':'))
+        _atomic_write(self.path, data.encode('utf-8'))
@@ -1,6 +1,6 @@
 import yaml
+import numpy as np
 import os
-import threading
 import time
 import random
 import json
@@ -11,16 +11,32 @@ from data_fetcher import DataFetcher
 from news_analyst import NewsAnalyst
 from technical_analyzer import TechnicalAnalyzer
 from valuation_engine import ValuationEngine
-from portfolio_tracker import PortfolioTracker
+from portfolio_accounts import open_accounts
 from market_scanner import MarketScanner
 from utils import send_email, logger, LOG_FILENAME, get_beijing_time
+from embedding_engine import start_encoder_warmup
+from hype_history import finalize_days
+from input_fingerprint import FingerprintStore, quantize_tech, DEFAULT_MAX_NEW_CLUSTERS
+from phase_scheduler import TimeBudget, phase1_priority
+from run_checkpoint import RunCheckpoint
+from task_graph import TaskGraph, Stream
+from query_api import build_snapshot, write_snapshot
+from portfolio_analytics import analyze_portfolio
+from risk_engine import get_risk_model, risk_config
+from fund_clustering import cluster_config, cluster_funds, split_cluster, shared_ic_result, log_clusters
+from universe_screener import screen_universe
+from market_regime import regime_config, realized_vol, update_regime
+from sector_flow import flow_leaders, flow_session, record_flows, market_trend
 
 # 导入 UI 渲染器
 from ui_renderer import render_html_report_v19
 
 # --- 全局配置 ---
 TEST_MODE = False
-tracker_lock = threading.Lock()
+RUN_STARTED = time.monotonic()   # 全局时间预算的起点
+PHASE1_GRACE_SEC = 30            # Phase 1 截止后等待在途调用收尾的宽限
+DEFAULT_RISK_BATCH_SIZE = 4      # Phase 2 每批审议的提案数
+RISK_BATCH_WAIT_SEC = 90         # 未攒满一批时，首个提案最多等待的秒数
 
 def load_config():
     try:
@@ -30,80 +46,65 @@ def load_config():
         logger.error(f"配置文件读取失败: {e}")
         return {"funds": [], "global": {"base_invest_amount": 1000, "max_daily_invest": 5000}}
 
-def calculate_position_v19(tech, mode, final_decision, val_mult, val_desc, base_amt, max_daily, pos, strategy_type, fund_name):
+BUY_REASONS = {'A': "🚀 A轨:趋势跟随", 'B': "🛡️ B轨:超跌反转", 'C': "⚡ C轨:事件驱动"}
+TACTICAL_MULT = {'A': 1.5, 'B': 1.0, 'C': 1.2}
+
+def calculate_positions_v19(techs, modes, final_decisions, val_mults, val_descs, base_amt, max_daily, positions):
     """
-    V19.6.5 绝对服从型资金计算算法 (根治神经割裂)
+    V19.6.5 绝对服从型资金计算算法 (根治神经割裂) —— 全部提案一次向量化计算
     彻底抛弃纯依靠技术面打分的买卖映射，严格按 A/B/C/D 轨和风控决议执行！
+    返回 (金额, 标签, 是否卖出, 卖出市值) 四个列表，与输入逐一对应
     """
-    base_score = tech.get('quant_score', 50)
-    
-    tactical_mult = 0
-    reasons = []
-    is_sell = False
-    label = "观望"
-    
+    score = np.array([t.get('quant_score', 50) for t in techs], dtype=float)
+    price = np.array([t.get('price', 0) for t in techs], dtype=float)
+    shares = np.array([pos['shares'] for pos in positions], dtype=float)
+    mode = np.array(modes, dtype=object)
+    decision = np.array(final_decisions, dtype=object)
+    val_mult = np.array(val_mults, dtype=float)
+    held = shares > 0
+
     # 1. 核心修复：严格遵循投委会指令决定大方向，禁止技术分越权
-    if final_decision == "EXECUTE":
-        # 批准进攻 (A/B/C轨)
-        if mode == 'A': 
-            tactical_mult = 1.5; reasons.append("🚀 A轨:趋势跟随")
-        elif mode == 'B': 
-            tactical_mult = 1.0; reasons.append("🛡️ B轨:超跌反转")
-        elif mode == 'C': 
-            tactical_mult = 1.2; reasons.append("⚡ C轨:事件驱动")
-        else:
-            tactical_mult = 1.0; reasons.append("✅ 投委会批准")
-            
-    elif final_decision == "REJECT":
-        # 风控否决
-        tactical_mult = -1.0 if pos['shares'] > 0 else 0.0
-        reasons.append("❌ 风控一票否决")
-        
-    else: # HOLD, HOLD_CASH, 或 D轨
-        # D轨防守时间，绝不主动买入。若技术面破位(分数<30)且持有仓位，则减仓。
-        if base_score < 30 and pos['shares'] > 0:
-            tactical_mult = -1.0; reasons.append("🗑️ D轨:技术破位止损")
-        else:
-            tactical_mult = 0.0; reasons.append("☕ D轨:强制防守观望")
+    execute = decision == "EXECUTE"
+    reject = decision == "REJECT"
+    stop_loss = ~execute & ~reject & (score < 30) & held   # D轨防守时间，技术面破位且持有仓位则减仓
+    conds = [execute & (mode == m) for m in TACTICAL_MULT] + [execute, reject, stop_loss]
+    tactical_mult = np.select(conds, list(TACTICAL_MULT.values()) + [1.0, np.where(held, -1.0, 0.0), -1.0], 0.0)
+    reason = np.select(conds, list(BUY_REASONS.values()) + ["✅ 投委会批准", "❌ 风控一票否决", "🗑️ D轨:技术破位止损"],
+                       "☕ D轨:强制防守观望")
 
     # 2. 估值战略修正 (防追高，防割地板)
-    if tactical_mult > 0: # 准备买入时
-        if val_mult <= 0.5: 
-            tactical_mult = 0; reasons.append("⚠️ 极度高估(禁止买入)")
-        elif val_mult > 1.2: 
-            tactical_mult *= min(val_mult, 1.5); reasons.append("💰 低估放大仓位")
-    elif tactical_mult < 0: # 准备卖出时
-        if val_mult > 1.2: 
-            tactical_mult = 0; reasons.append("🔒 极度低估(拒绝割肉)")
-            label = "低估锁仓"
+    overpriced = (tactical_mult > 0) & (val_mult <= 0.5)
+    cheap_buy = (tactical_mult > 0) & (val_mult > 1.2)
+    locked = (tactical_mult < 0) & (val_mult > 1.2)
+    tactical_mult = np.where(cheap_buy, tactical_mult * np.minimum(val_mult, 1.5), tactical_mult)
+    tactical_mult[overpriced | locked] = 0.0
+    val_reason = np.select([overpriced, cheap_buy, locked], ["⚠️ 极度高估(禁止买入)", "💰 低估放大仓位", "🔒 极度低估(拒绝割肉)"], "")
 
     # 4. 计算最终金额
-    final_amt = 0; sell_val = 0
-    if tactical_mult > 0:
-        final_amt = max(0, min(int(base_amt * tactical_mult), int(max_daily)))
-        label = "买入"
-    elif tactical_mult < 0:
-        is_sell = True
-        sell_val = pos['shares'] * tech.get('price', 0) * min(abs(tactical_mult), 1.0)
-        label = "卖出"
-
-    if final_decision in ["HOLD_CASH", "HOLD", "REJECT"] and pos['shares'] == 0: 
-        label = "空仓"
-
-    tech['quant_reasons'] = reasons
-    tech['valuation_desc'] = val_desc
-    return final_amt, label, is_sell, sell_val
-
-def process_phase1_proposal(fund, fetcher, tracker, val_engine, analyst, market_context):
+    buy, is_sell = tactical_mult > 0, tactical_mult < 0
+    final_amt = np.where(buy, np.maximum(0, np.minimum((base_amt * tactical_mult).astype(int), int(max_daily))), 0)
+    sell_val = np.where(is_sell, shares * price * np.minimum(np.abs(tactical_mult), 1.0), 0.0)
+    idle = np.isin(decision, ["HOLD_CASH", "HOLD", "REJECT"]) & (shares == 0)
+    label = np.select([idle, buy, is_sell, locked], ["空仓", "买入", "卖出", "低估锁仓"], "观望")
+
+    for tech, r, v, desc in zip(techs, reason, val_reason, val_descs):
+        tech['quant_reasons'] = [str(r), str(v)] if v else [str(r)]
+        tech['valuation_desc'] = desc
+    return final_amt.tolist(), label.tolist(), is_sell.tolist(), sell_val.tolist()
+
+def rule_based_ic(tech, reason="AI 离线，基于规则运行"):
+    decision = "HOLD" if tech['quant_score'] < 70 else "PROPOSE_EXECUTE"
+    return {
+        "chairman_verdict": {"mode_selected": "D" if decision=="HOLD" else "A"},
+        "mode_justification": reason,
+        "debate_transcript": {}
+    }
+
+def prepare_phase1_inputs(fund, fetcher, val_engine):
     """
-    [Phase 1] 战术层提案收集
+    [Phase 1 准备] 读取本地行情缓存并计算技术指标与估值 (纯本地计算，不涉及 LLM)
     """
-    # 增加一点随机延时，防止多线程同时发起请求时撞倒 API 并发限制
-    time.sleep(random.uniform(1.0, 3.0))
-    
     fund_name = fund['name']; fund_code = fund['code']
-    logger.info(f"🔍 [IC初审] 分析标的: {fund_name} ({fund_code})")
-
     try:
         data = fetcher.get_fund_history(fund_code)
         if data is None or data.empty: 
@@ -115,141 +116,438 @@ def process_phase1_proposal(fund, fetcher, tracker, val_engine, analyst, market_
         if not tech: return None
         
         val_mult, val_desc = val_engine.get_valuation_status(fund_code, data)
-        
-        if analyst:
-            macro_payload = {"net_flow": market_context.get('net_flow', 0), "leader_status": "UNKNOWN"}
-            # 🟢 [核心穿透点] 把基金关键词向下透传给 RAG 引擎
-            ic_res = analyst.analyze_fund_tactical_v6(
-                fund_name, tech, macro_payload, market_context.get('news_summary', ''), 
-                {"fuse_level": 0}, fund.get('strategy_type', 'core'), fund.get('sector_keyword', '')
-            )
-        else:
-            ic_res = None
+        return {"fund": fund, "tech": tech, "val_mult": val_mult, "val_desc": val_desc}
+    except Exception as e:
+        logger.error(f"IC Prepare Error {fund_name}: {e}", exc_info=True)
+        return None
 
-        if not ic_res:
-            decision = "HOLD" if tech['quant_score'] < 70 else "PROPOSE_EXECUTE"
-            ic_res = {
-                "chairman_verdict": {"mode_selected": "D" if decision=="HOLD" else "A"},
-                "mode_justification": "AI 离线，基于规则运行",
-                "debate_transcript": {}
-            }
+def build_proposal(prep, ic_res, fallback=False):
+    fund = prep['fund']
+    verdict = ic_res.get('chairman_verdict', {})
+    mode = verdict.get('mode_selected', 'D')
+    violation_check = ic_res.get('constraint_violation_check', {})
+    
+    if violation_check.get('violated') == 'TRUE':
+        decision = "REJECT"
+        logic_weighting = f"⚠️系统拦截: {violation_check.get('violation_details')}"
+    elif mode in ['A', 'B', 'C']:
+        decision = "PROPOSE_EXECUTE"
+        logic_weighting = ic_res.get('mode_justification', f'确信度 {verdict.get("confidence", "-")}')
+    else:
+        decision = "HOLD"
+        logic_weighting = "进入D轨(防御/垃圾时间)或无明确进攻信号"
 
-        verdict = ic_res.get('chairman_verdict', {})
-        mode = verdict.get('mode_selected', 'D')
-        violation_check = ic_res.get('constraint_violation_check', {})
-        
-        if violation_check.get('violated') == 'TRUE':
-            decision = "REJECT"
-            logic_weighting = f"⚠️系统拦截: {violation_check.get('violation_details')}"
-        elif mode in ['A', 'B', 'C']:
-            decision = "PROPOSE_EXECUTE"
-            logic_weighting = ic_res.get('mode_justification', f'确信度 {verdict.get("confidence", "-")}')
-        else:
-            decision = "HOLD"
-            logic_weighting = "进入D轨(防御/垃圾时间)或无明确进攻信号"
+    verdict['logic_weighting'] = logic_weighting
+    
+    proposal = {
+        "name": fund['name'], "code": fund['code'],
+        "tech": prep['tech'], "val_mult": prep['val_mult'], "val_desc": prep['val_desc'],
+        "ic_res": ic_res, 
+        "decision": decision, 
+        "fund_obj": fund,
+        "fallback": fallback   # 规则兜底的提案，断点续跑时重新上会
+    }
+    
+    logger.info(f"   -> IC初审: {decision} | 模式:{mode} | 逻辑:{logic_weighting[:20]}...")
+    return proposal
 
-        verdict['logic_weighting'] = logic_weighting
-        
-        proposal = {
-            "name": fund_name, "code": fund_code,
-            "tech": tech, "val_mult": val_mult, "val_desc": val_desc,
-            "ic_res": ic_res, 
-            "decision": decision, 
-            "fund_obj": fund
-        }
-        
-        logger.info(f"   -> IC初审: {decision} | 模式:{mode} | 逻辑:{logic_weighting[:20]}...")
-        return proposal
+def process_phase1_proposal(prep, analyst, market_context, fingerprints=None, budget=None):
+    """
+    [Phase 1] 战术层提案收集
+    """
+    fund = prep['fund']; tech = prep['tech']
+    fund_name = fund['name']; fund_code = fund['code']
+    logger.info(f"🔍 [IC初审] 分析标的: {fund_name} ({fund_code})")
+
+    try:
+        ic_res = None
+        if analyst:
+            macro_payload = {"net_flow": market_context.get('net_flow', 0), "leader_status": "UNKNOWN",
+                             "market_regime": market_context.get('market_regime')}
+            # 🟢 输入指纹：技术面分桶 + RAG 线索集合均未实质变化时，复用同日上一次的 IC 结论
+            if fingerprints is not None:
+                event = analyst.event_calendar.lookup(fund.get('sector_keyword', '')) if analyst.event_calendar else None
+                tech_key = quantize_tech(tech, macro_payload, event)
+                rag_hit = analyst.rag_hits.get(fund_name)
+                news_ids = rag_hit['news_ids'] if rag_hit else None
+                ic_res = fingerprints.lookup(fund_code, tech_key, news_ids)
+                if ic_res:
+                    logger.info(f"   ♻️ [{fund_name}] 输入指纹未变化，复用本日上次 IC 结论")
+            if not ic_res:
+                # 🟢 每次调用领取截止时间；预算耗尽则不再发起请求，直接规则兜底
+                deadline = budget.call_deadline() if budget else None
+                if budget and deadline is None:
+                    budget.mark_degraded(fund_name)
+                    logger.warning(f"   ⏱️ [{fund_name}] Phase 1 时间预算耗尽，改走规则兜底")
+                    return build_proposal(prep, rule_based_ic(tech, "⏱️ 时间预算耗尽，基于规则运行"), fallback=True)
+
+                # 增加一点随机延时，防止多线程同时发起请求时撞倒 API 并发限制
+                time.sleep(random.uniform(1.0, 3.0))
+                # 🟢 [核心穿透点] 把基金关键词向下透传给 RAG 引擎
+                ic_res = analyst.analyze_fund_tactical_v6(
+                    fund_name, tech, macro_payload, market_context.get('news_summary', ''), 
+                    {"fuse_level": 0}, fund.get('strategy_type', 'core'), fund.get('sector_keyword', ''),
+                    deadline=deadline
+                )
+                if fingerprints is not None:
+                    fingerprints.record(fund_code, tech_key, news_ids, ic_res)
+                if not ic_res and deadline is not None and time.monotonic() >= deadline:
+                    budget.mark_degraded(fund_name)
+                    return build_proposal(prep, rule_based_ic(tech, "⏱️ IC 调用超过截止时间，基于规则运行"), fallback=True)
+
+        if not ic_res:
+            return build_proposal(prep, rule_based_ic(tech), fallback=True)
+        return build_proposal(prep, ic_res)
 
     except Exception as e:
         logger.error(f"IC Process Error {fund_name}: {e}", exc_info=True)
         return None
 
-def main():
-    config = load_config()
-    fetcher, tracker, val_engine = DataFetcher(), PortfolioTracker(), ValuationEngine()
-    scanner = MarketScanner()
-    
-    tracker.confirm_trades()
-    
-    try: analyst = NewsAnalyst()
-    except: analyst = None
+def process_phase1_unit(unit, analyst, market_context, fingerprints=None, budget=None):
+    """
+    [Phase 1] 一组同质标的 (首个为代表)：代表上会一次，成员沿用其 IC 结论 + 各自的技术面；
+    代表未拿到真实结论 (规则兜底) 时成员逐个单独上会
+    """
+    leader = process_phase1_proposal(unit[0], analyst, market_context, fingerprints, budget)
+    members = unit[1:]
+    if not members:
+        return [leader] if leader else []
+    if leader is None or leader.get('fallback'):
+        followers = [process_phase1_proposal(p, analyst, market_context, fingerprints, budget) for p in members]
+    else:
+        followers = [build_proposal(p, shared_ic_result(leader, p)) for p in members]
+    return [p for p in [leader] + followers if p]
 
-    logger.info("🚀 启动 v20.5 全息认知对抗系统 (GraphRAG + Agentic Model)...")
+def group_phase1_preps(ctx, preps):
+    """ 按同质聚类把已排好优先级的 preps 分组；未聚类或聚类不可用时每组一个标的 """
+    cfg = cluster_config(ctx['config'])
+    model = load_risk_model(ctx) if cfg["enabled"] and len(preps) > 1 else None
+    if model is None:
+        return [[p] for p in preps]
+    by_code = {str(p['fund']['code']): p for p in preps}
+    clusters = cluster_funds([p['fund'] for p in preps], model, cfg)
+    log_clusters(clusters, {code: p['fund']['name'] for code, p in by_code.items()})
+    leader_of, followers = {}, set()
+    for cluster in clusters:
+        leader, shared, _ = split_cluster([by_code[c] for c in cluster], cfg["max_score_gap"])
+        leader_of[str(leader['fund']['code'])] = [leader] + shared
+        followers.update(str(p['fund']['code']) for p in shared)
+    # 分组保持代表的优先级位置；技术面偏离大、需单独上会的成员保留自己的位置
+    return [leader_of.get(code, [p]) for code, p in by_code.items() if code not in followers]
+
+def candidate_from_proposal(p):
+    verdict = p['ic_res'].get('chairman_verdict', {})
+    return {
+        "code": p['code'],
+        "name": p['name'],
+        "mode": verdict.get('mode_selected', 'UNKNOWN'),
+        "reason": verdict.get('logic_weighting', '无'),
+        "key_assumption": verdict.get('key_assumption', ''),
+        "tech_score": p['tech']['quant_score']
+    }
+
+# ===================================================
+# 分阶段流水线：每个阶段 run_* 返回可序列化的产出并落盘检查点，restore_* 从检查点还原
+# ===================================================
+def run_fetch(ctx):
+    # 🟢 [关键修复 1] 在 Phase 1 多线程并发前，预先在单一线程中拉取并缓存所有数据
+    # 彻底杜绝 curl_cffi 在多线程环境下的竞争冲突，解决“个别板块随机报错”的问题
+    # 行情抓取与 RAG 构建、资金流检测并行，fetcher 的 session 只在本阶段使用
+    logger.info("📥 [Pre-Phase] 预加载所有 ETF 行情数据...")
+    ctx['fetcher'].run(ctx['funds'])
+    return {"codes": [f['code'] for f in ctx['funds']]}
+
+def restore_fetch(ctx, out):
+    pass
+
+def run_flow(ctx):
+    net_flow_val, sector_flow_val, sector_snapshot = 0, 0, {}
+    if ctx['analyst']:
+        # 与行情抓取并行：使用独立的 DataFetcher (独立 session)，不与 fetch 阶段共享连接
+        flow_fetcher = DataFetcher()
+        try:
+            net_flow_val = flow_fetcher.get_market_net_flow()
+        finally:
+            flow_fetcher._close_session()
+        vitality = ctx['scanner'].get_market_vitality()
+        sector_flow_val = vitality.get('net_flow', 0)
+        sector_snapshot = vitality.get('snapshot') or {}
+        logger.info(f"🌍 市场状态: 资金流 {net_flow_val} 亿 (行业板块汇总 {sector_flow_val} 亿)")
+    ctx['net_flow'], ctx['sector_flow'], ctx['sector_snapshot'] = net_flow_val, sector_flow_val, sector_snapshot
+    return {"net_flow": net_flow_val, "sector_flow": sector_flow_val, "sector_snapshot": sector_snapshot}
+
+def restore_flow(ctx, out):
+    ctx['net_flow'], ctx['sector_flow'] = out['net_flow'], out.get('sector_flow', 0)
+    ctx['sector_snapshot'] = out.get('sector_snapshot') or {}
+
+def record_sector_flows(ctx, session):
+    """ 板块资金流快照按所属的已收盘交易日落盘 (盘中 session 为 None，不写)，返回全市场滚动累计 (截至最近收盘日) """
+    snapshot = ctx.get('sector_snapshot') or {}
+    if session and snapshot.get('sectors') and not TEST_MODE:
+        try:
+            record_flows(session, snapshot['sectors'], snapshot['flows'])
+        except Exception as e:
+            logger.warning(f"⚠️ 板块资金流历史写入失败: {e}")
+    try:
+        trend = market_trend()
+    except Exception as e:
+        logger.warning(f"⚠️ 板块资金流序列读取失败: {e}")
+        return {}
+    if trend:
+        logger.info(f"💰 全市场主力 3/5/20日累计 {trend['flow_3d']}/{trend['flow_5d']}/{trend['flow_20d']}亿 (截至 {trend['as_of']} 收盘)")
+    return trend
+
+def run_regime(ctx):
+    """
+    市场水位：资金流 (0 视为抓取失败，退回行业板块汇总) + 宽基代理波动率，每次运行判定一次；
+    资金流快照按所属的已收盘交易日落盘 (需要行情阶段更新过的代理行情作交易日历)，盘中快照不入日频序列
+    """
+    cfg = regime_config(ctx['config'])
+    flow = ctx['net_flow'] or ctx['sector_flow'] or float('nan')
+    hist = ctx['fetcher'].get_fund_history(cfg["vol_proxy"])
+    volatility = realized_vol(hist['close'].to_numpy(), cfg["vol_window"]) if 'close' in hist.columns else float('nan')
+    now = get_beijing_time()
+    session = flow_session(now, [d.strftime("%Y-%m-%d") for d in hist.index] if len(hist) else [])
+    ctx['flow_trend'] = record_sector_flows(ctx, session)
+    ctx['market_regime'] = update_regime(now.strftime("%Y-%m-%d"), flow, volatility, cfg, session=session)
+    return {"market_regime": ctx['market_regime'], "flow_trend": ctx['flow_trend']}
+
+def restore_regime(ctx, out):
+    ctx['market_regime'] = out.get('market_regime')
+    ctx['flow_trend'] = out.get('flow_trend') or {}
 
-    market_context = {"news_summary": "无新闻", "net_flow": 0}
+def run_rag(ctx):
+    analyst, funds = ctx['analyst'], ctx['funds']
+    news_summary = "无新闻"
     all_news_seen = []
     
     if analyst:
-        logger.info("📡 正在触发全量图谱化构建与资金流检测...")
-        news_text = analyst.get_market_context()
-        net_flow_val = fetcher.get_market_net_flow()
-        
-        market_context = {
-            "news_summary": news_text,
-            "net_flow": net_flow_val
-        }
-        all_news_seen = [line.strip() for line in news_text.split('\n') if line.strip().startswith('[')]
-        logger.info(f"🌍 市场状态: 资金流 {market_context['net_flow']} 亿")
+        logger.info("📡 正在触发全量图谱化构建...")
+        news_summary = analyst.get_market_context()
+        all_news_seen = [line.strip() for line in news_summary.split('\n') if line.strip().startswith('[')]
+        # 情绪历史只收已结束的交易日 (通常补齐前一日)，当日盘中打分不入序列；先于检索补齐，Z 分数才有前一日可比
+        if analyst.encoder is not None and not TEST_MODE:
+            try:
+                days = finalize_days(analyst.encoder, funds, before=get_beijing_time().strftime("%Y-%m-%d"))
+                if days:
+                    logger.info(f"📈 情绪历史补齐 {days} 个已结束交易日")
+            except Exception as e:
+                logger.warning(f"⚠️ 情绪历史写入失败: {e}")
+        # 🟢 所有基金的语义检索与情绪打分一次性矩阵化完成，Phase 1 各线程直接取缓存
+        analyst.prime_fund_rag_contexts(funds)
 
-    funds = config.get('funds', [])
-    if TEST_MODE and funds: 
-        logger.info("🚧 测试模式：仅处理前2个标的")
-        funds = funds[:2]
+    ctx['news_summary'] = news_summary
+    ctx['all_news_seen'] = all_news_seen
+    return {
+        "news_summary": news_summary, "all_news_seen": all_news_seen,
+        "rag_hits": analyst.rag_hits if analyst else {},
+        "rag_contexts": [[name, kw, text] for (name, kw), text in analyst.rag_contexts.items()] if analyst else [],
+    }
 
-    # 🟢 [关键修复 1] 在多线程并发前，预先在主线程中拉取并缓存所有数据
-    # 彻底杜绝 curl_cffi 在多线程环境下的竞争冲突，解决“个别板块随机报错”的问题
-    logger.info("📥 [Pre-Phase] 预加载所有 ETF 行情数据...")
-    fetcher.run(funds)
+def restore_rag(ctx, out):
+    ctx['news_summary'] = out['news_summary']
+    ctx['all_news_seen'] = out['all_news_seen']
+    # 向量索引不随检查点保存，检索结果本身还原到分析师缓存，供查询快照导出
+    if ctx['analyst']:
+        ctx['analyst'].rag_hits = out.get('rag_hits', {})
+        ctx['analyst'].rag_contexts = {(name, kw): text for name, kw, text in out.get('rag_contexts', [])}
 
-    # ===================================================
-    # Phase 1: IC 战术投委会海选 (Proposal Collection)
-    # ===================================================
+def run_phase1(ctx):
+    """
+    [Phase 1] IC 战术投委会海选 (Proposal Collection)
+    每完成一只基金即落盘检查点并推入提案流，Phase 2 边收边审；
+    续跑时已拿到 LLM 结论的基金直接载入，只对其余基金上会
+    """
+    analyst, funds, ckpt, budget = ctx['analyst'], ctx['funds'], ctx['ckpt'], ctx['budget']
     logger.info("⚔️ [Phase 1] 启动 IC 战术投委会海选 (多线程并发处理)...")
     proposals = []
-    candidates_for_veto = [] 
+    market_context = {"news_summary": ctx['news_summary'], "net_flow": ctx['net_flow'],
+                      "market_regime": ctx.get('market_regime')}
+
+    done = {code: p for code, p in ckpt.load_items("phase1").items() if not p.get('fallback')}
+    if done:
+        logger.info(f"⏭️ [Checkpoint] 载入 {len(done)} 个已完成的 IC 提案，跳过重复调用")
+        proposals.extend(done.values())
+        for p in done.values():
+            ctx['proposal_stream'].put(p)
     
     # [修改点] 开启多线程处理
     MAX_WORKERS = 5 # 默认 5 个并发，兼顾速度与防止 API 触发 429 限流
+
+    global_cfg = ctx['config'].get('global', {})
+    fingerprints = None
+    if analyst and global_cfg.get('incremental_ic', True) and not TEST_MODE:
+        fingerprints = FingerprintStore(
+            get_beijing_time().strftime("%Y-%m-%d"),
+            max_new_clusters=global_cfg.get('incremental_max_new_clusters', DEFAULT_MAX_NEW_CLUSTERS)
+        )
     
-    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        # 将所有的 fund 提交给线程池
-        future_to_fund = {
-            executor.submit(process_phase1_proposal, fund, fetcher, tracker, val_engine, analyst, market_context): fund
-            for fund in funds
-        }
-        
-        # 收集执行结果
-        for future in concurrent.futures.as_completed(future_to_fund):
-            fund = future_to_fund[future]
+    # 🟢 截止时间调度：先本地算好全部技术指标，再按 持仓 > 技术分/情绪分 的优先级排队上会
+    todo = [fund for fund in funds if str(fund['code']) not in done]
+    preps = [p for p in (prepare_phase1_inputs(fund, ctx['fetcher'], ctx['val_engine']) for fund in todo) if p]
+    held_codes = set().union(*(account.held_codes() for account in ctx['accounts']))
+    preps.sort(key=lambda p: phase1_priority(p, held_codes, analyst.rag_hits if analyst else {}))
+    logger.info(f"📋 [Phase 1] {len(preps)} 个标的已排队 (持仓优先 {sum(str(p['fund']['code']) in held_codes for p in preps)} 个)，"
+                f"剩余预算 {budget.remaining(budget.phase1_deadline) / 60:.1f} 分钟")
+
+    def collect(p):
+        proposals.append(p)
+        ckpt.save_item("phase1", str(p['code']), p)
+        ctx['proposal_stream'].put(p)
+
+    # 🟢 同质标的聚类：每簇只由代表上会，成员共享结论
+    units = group_phase1_preps(ctx, preps)
+
+    # 线程池按提交顺序取任务，字典插入顺序即优先级顺序
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS)
+    future_to_unit = {
+        executor.submit(process_phase1_unit, unit, analyst, market_context, fingerprints, budget): unit
+        for unit in units
+    }
+    finished = set()
+    try:
+        # 收集执行结果 (单次调用已受截止时间约束，这里再兜一层总等待上限)
+        wait_sec = max(0, budget.remaining(budget.phase1_deadline)) + PHASE1_GRACE_SEC
+        for future in concurrent.futures.as_completed(future_to_unit, timeout=wait_sec):
+            finished.add(future)
+            fund = future_to_unit[future][0]['fund']
             try:
-                p = future.result()
-                if p:
-                    proposals.append(p)
-                    if 'EXECUTE' in p['decision'] and 'PROPOSE' in p['decision']:
-                        verdict = p['ic_res'].get('chairman_verdict', {})
-                        candidates_for_veto.append({
-                            "code": p['code'],
-                            "name": p['name'],
-                            "mode": verdict.get('mode_selected', 'UNKNOWN'),
-                            "reason": verdict.get('logic_weighting', '无'),
-                            "key_assumption": verdict.get('key_assumption', ''),
-                            "tech_score": p['tech']['quant_score']
-                        })
+                for p in future.result(): collect(p)
             except Exception as e:
                 logger.error(f"处理标的 {fund.get('name', 'Unknown')} 时发生多线程异常: {e}")
+    except concurrent.futures.TimeoutError:
+        for future, unit in future_to_unit.items():
+            if future in finished: continue
+            if future.done() and not future.cancelled():
+                try:
+                    for p in future.result(): collect(p)
+                    continue
+                except Exception:
+                    pass
+            future.cancel()
+            for prep in unit:
+                budget.mark_degraded(prep['fund']['name'])
+                collect(build_proposal(prep, rule_based_ic(prep['tech'], "⏱️ 时间预算耗尽，基于规则运行"), fallback=True))
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
 
-    # ===================================================
-    # Phase 2: 风控委员会终审 (Risk Committee Veto)
-    # ===================================================
-    logger.info(f"⚖️ [Phase 2] 启动风控委员会终审 (待审提案: {len(candidates_for_veto)}个)...")
+    if budget.degraded:
+        logger.warning(f"⏱️ [Phase 1] 时间预算耗尽，{len(budget.degraded)} 个标的降级为规则决策: {budget.degraded}")
+
+    shared = sum(1 for p in proposals if p['ic_res'].get('shared_from'))
+    if shared:
+        logger.info(f"🧩 [Phase 1] {shared} 个标的沿用同簇代表的 IC 结论")
+    if fingerprints is not None:
+        logger.info(f"♻️ [Phase 1] 输入指纹命中 {fingerprints.reused}/{len(todo)}，其余标的重新上会")
+        try: fingerprints.save()
+        except Exception as e: logger.warning(f"⚠️ 输入指纹保存失败: {e}")
+
+    ctx['proposals'] = proposals
+    return {"count": len(proposals), "degraded": budget.degraded}
+
+def restore_phase1(ctx, out):
+    ctx['proposals'] = list(ctx['ckpt'].load_items("phase1").values())
+    for p in ctx['proposals']:
+        ctx['proposal_stream'].put(p)
+
+def is_risk_candidate(p):
+    return 'EXECUTE' in p['decision'] and 'PROPOSE' in p['decision']
+
+def merge_risk_reports(batches):
+    """
+    合并各批次的风控回执: 逐标的结果拼接 (只采信本批标的，防止模型对参考标的重复裁决)，
+    组合层面结论以最后一批 (已看到全部已批准标的) 为准
+    """
+    if not batches:
+        return None
+    merged = dict(batches[-1]['raw'])
+    merged['stress_test_results'] = [
+        item for b in batches for item in b['raw'].get('stress_test_results', [])
+        if str(item.get('code')) in b['codes']
+    ]
+    merged['batch_count'] = len(batches)
+    return merged
+
+def load_risk_model(ctx):
+    """ 全标的风险模型 (按日缓存，Phase 1 聚类与 Phase 2 风控共用)；失败时返回 None """
+    try:
+        return get_risk_model(get_beijing_time().strftime("%Y-%m-%d"), [str(f['code']) for f in ctx['funds']],
+                              ctx['fetcher'].get_fund_history, ctx['fetcher'].price_stamps, risk_config(ctx['config']))
+    except Exception as e:
+        logger.warning(f"⚠️ [Risk] 风险模型构建失败: {e}")
+        return None
+
+def build_risk_model(ctx):
+    """ 组合风险模型：以主账户持仓为准，供风控委员会与 CIO 引用；失败时返回 None """
+    try:
+        cfg = risk_config(ctx['config'])
+        model = load_risk_model(ctx)
+        if model is None:
+            return None, None
+        positions = {code: pos.get('shares', 0) for code, pos in ctx['tracker'].portfolio.items()}
+        names = {str(f['code']): f['name'] for f in ctx['funds']}
+        texts = {str(f['code']): f"{f['name']} {f.get('sector_keyword', '')}" for f in ctx['funds']}
+        summary = model.portfolio_risk(positions, cfg, texts, names)
+        logger.info(f"📐 [Risk] 持仓市值 {summary['market_value']:.0f} | "
+                    f"VaR {summary.get('var_pct', {})} | 因子集中度 {summary.get('factor_concentration', '-')}")
+
+        def candidates(codes):
+            return model.candidate_risk(codes, positions, ctx['accounts'][0].base_invest_amount, cfg, names)
+        return summary, candidates
+    except Exception as e:
+        logger.warning(f"⚠️ [Risk] 风险模型计算失败: {e}")
+        return None, None
+
+def run_phase2(ctx):
+    """
+    [Phase 2] 风控委员会终审 (Risk Committee Veto)
+    消费 Phase 1 的提案流，PROPOSE_EXECUTE 提案攒满一批即上会，无需等待最慢的基金；
+    每批附带此前已批准的标的与风险引擎的实测数据 (VaR / 情景冲击 / 相关性)，每批结果单独落盘检查点
+    """
+    analyst, ckpt = ctx['analyst'], ctx['ckpt']
+    batch_size = ctx['config'].get('global', {}).get('risk_batch_size', DEFAULT_RISK_BATCH_SIZE)
+    logger.info(f"⚖️ [Phase 2] 风控委员会就位，按批审议 PROPOSE_EXECUTE 提案 (每批 {batch_size} 个)...")
+
+    batches = [b for _, b in sorted(ckpt.load_items("phase2").items())]
+    reviewed_codes = {str(code) for b in batches for code in b['codes']}
+    if batches:
+        logger.info(f"⏭️ [Checkpoint] 载入 {len(batches)} 批已完成的风控审议 ({len(reviewed_codes)} 个标的)")
+    approved_context = []
+    candidate_count = len(reviewed_codes)
+    portfolio_risk, candidate_risk = build_risk_model(ctx)
+
+    def collect_approved(batch, raw):
+        approved = {str(item.get('code')) for item in raw.get('stress_test_results', [])
+                    if item.get('veto_decision', 'VETO') in ['APPROVE', 'DEMOTE']}
+        approved &= {str(c['code']) for c in batch}
+        approved_context.extend(c for c in batch if str(c['code']) in approved)
+
+    for b in batches:
+        collect_approved(b['candidates'], b['raw'])
+
+    keep = lambda p: is_risk_candidate(p) and str(p['code']) not in reviewed_codes
+    for chunk in ctx['proposal_stream'].batches(batch_size, RISK_BATCH_WAIT_SEC, keep=keep):
+        candidate_count += len(chunk)
+        if not chunk or not analyst:
+            continue
+        candidates = [candidate_from_proposal(p) for p in chunk]
+        logger.info(f"⚖️ [Phase 2] 第 {len(batches) + 1} 批上会: {[c['name'] for c in candidates]}")
+        risk_context = None
+        if portfolio_risk is not None:
+            risk_context = {"portfolio": portfolio_risk, "candidates": candidate_risk([c['code'] for c in candidates])}
+        raw = analyst.run_risk_committee_veto(candidates, deadline=ctx['budget'].run_deadline,
+                                              approved_context=list(approved_context), risk_context=risk_context,
+                                              regime=ctx.get('market_regime'))
+        record = {"codes": [str(c['code']) for c in candidates], "candidates": candidates, "raw": raw}
+        ckpt.save_item("phase2", f"batch_{len(batches):03d}", record)
+        batches.append(record)
+        collect_approved(candidates, raw)
     
     risk_report = {"approved_list": [], "rejected_log": [], "risk_summary": "无提案提交"}
+    risk_report_raw = merge_risk_reports(batches)
     approved_codes = []
     
-    if candidates_for_veto and analyst:
-        risk_report_raw = analyst.run_risk_committee_veto(candidates_for_veto)
-        
+    if risk_report_raw:
         for item in risk_report_raw.get('stress_test_results', []):
             code = item.get('code')
             decision = item.get('veto_decision', 'VETO')
@@ -261,16 +559,36 @@ def main():
             else:
                 risk_report['rejected_log'].append({"code": code, "reason": f"[{decision}] {reason}"})
                 
-        logger.info(f"✅ 风控批准/降级: {len(approved_codes)} 个 | ❌ 风控驳回: {len(risk_report['rejected_log'])} 个")
-    elif not candidates_for_veto:
+        logger.info(f"✅ 风控批准/降级: {len(approved_codes)} 个 | ❌ 风控驳回: {len(risk_report['rejected_log'])} 个 "
+                    f"(共 {candidate_count} 个提案，{len(batches)} 批)")
+    elif not candidate_count:
         logger.info("👀 本轮无激进提案，跳过风控终审。")
 
-    # ===================================================
-    # Phase 3: 最终执行与报告生成 (Execution)
-    # ===================================================
+    out = {"risk_report": risk_report, "risk_report_raw": risk_report_raw, "approved_codes": approved_codes,
+           "portfolio_risk": portfolio_risk}
+    restore_phase2(ctx, out)
+    return out
+
+def restore_phase2(ctx, out):
+    ctx['risk_report'] = out['risk_report']
+    ctx['risk_report_raw'] = out['risk_report_raw']
+    ctx['approved_codes'] = out['approved_codes']
+    ctx['portfolio_risk'] = out.get('portfolio_risk')
+
+def run_phase3(ctx):
+    """
+    [Phase 3] 最终执行与报告生成 (Execution)
+    风控终审与辩论纪要全部账户共用；各账户对全部提案一次向量化计算仓位，
+    当日指令经 apply_batch 整体校验并以一条账本日志原子提交；
+    本阶段中途崩溃时续跑会回到 portfolio_bases 快照
+    """
+    return execute_phase3(ctx)
+
+def execute_phase3(ctx):
     logger.info("📝 [Phase 3] 生成最终执行指令...")
     
-    final_results = []
+    proposals = ctx['proposals']
+    decisions, modes, verdicts = [], [], []
     
     for p in proposals:
         code = p['code']
@@ -281,14 +599,14 @@ def main():
         final_decision = raw_decision
         
         if 'PROPOSE_EXECUTE' in raw_decision:
-            if code in approved_codes:
+            if code in ctx['approved_codes']:
                 final_decision = 'EXECUTE' 
-                for item in risk_report.get('approved_list', []):
+                for item in ctx['risk_report'].get('approved_list', []):
                     if item.get('code') == code:
                         verdict['logic_weighting'] += f" [✅风控终审: {item.get('reason')}]"
             else:
                 final_decision = 'REJECT'  
-                for item in risk_report.get('rejected_log', []):
+                for item in ctx['risk_report'].get('rejected_log', []):
                     if item.get('code') == code:
                         verdict['logic_weighting'] += f" [❌风控驳回: {item.get('reason')}]"
         
@@ -297,19 +615,13 @@ def main():
         elif final_decision == "REJECT": calc_decision = "REJECT"
         elif final_decision == "HOLD_CASH": calc_decision = "HOLD_CASH"
 
-        mode = verdict.get('mode_selected', 'D')
-        
-        amt, lbl, is_sell, s_val = calculate_position_v19(
-            p['tech'], mode, calc_decision, p['val_mult'], p['val_desc'],
-            config['global']['base_invest_amount'], config['global']['max_daily_invest'],
-            tracker.get_position(code), p['fund_obj'].get('strategy_type'), p['name']
-        )
-        
-        with tracker_lock:
-            tracker.record_signal(code, lbl)
-            if amt > 0: tracker.add_trade(code, p['name'], amt, p['tech']['price'])
-            elif is_sell: tracker.add_trade(code, p['name'], s_val, p['tech']['price'], True)
-            
+        decisions.append(calc_decision)
+        modes.append(verdict.get('mode_selected', 'D'))
+        verdicts.append(verdict)
+
+    shared_results = []
+    for p, verdict, mode in zip(proposals, verdicts, modes):
+        code = p['code']
         debate_str = ""
         trans = p['ic_res'].get('debate_transcript', {})
         if isinstance(trans, dict):
@@ -340,33 +652,96 @@ def main():
             },
             "execution_notes": debate_str[:800],
             "cro_risk_audit": {
-                "fundamental_check": "Risk Checked" if code in approved_codes else "See Reject Log"
+                "fundamental_check": "Risk Checked" if code in ctx['approved_codes'] else "See Reject Log"
             }
         }
 
-        final_results.append({
+        shared_results.append({
             "name": p['name'], "code": code,
-            "decision": lbl, "amount": amt, "is_sell": is_sell,
-            "tech": p['tech'],
             "ai_full": ai_full_adapted
         })
 
+    # --- 仓位与记账按账户展开 (纯本地计算) ---
+    account_results, out = {}, {"final_results": {}, "portfolios": {}, "trades": {}}
+    for account in ctx['accounts']:
+        results, diff = execute_account(account, proposals, decisions, modes, shared_results, ctx.get('market_regime'))
+        account_results[account.name] = results
+        out['final_results'][account.name] = results
+        out['portfolios'][account.name] = account.tracker.portfolio
+        out['trades'][account.name] = diff['trades']   # 本阶段成交随检查点保存，续跑还原账本时一并保留
+
+    ctx['account_results'] = account_results
+    ctx['final_results'] = account_results[ctx['accounts'][0].name]
+    return out
+
+def execute_account(account, proposals, decisions, modes, shared_results, regime=None):
+    """
+    单个账户: 全部提案一次算出仓位，当日指令整体原子记账，返回 (报告条目, 记账摘要)
+    regime: 市场水位，其可用轨道与账户偏好取交集，单笔金额按水位的单标的上限缩放
+    """
+    techs = [dict(p['tech']) for p in proposals]   # 仓位理由因账户而异，技术指标按账户浅拷贝
+    scale = regime['position_scale'] if regime else 1.0
+    amts, labels, sells, sell_vals = calculate_positions_v19(
+        techs, modes, account.gate_decisions(decisions, modes, regime['allowed_modes'] if regime else None),
+        [p['val_mult'] for p in proposals], [p['val_desc'] for p in proposals],
+        account.base_invest_amount * scale, account.max_daily_invest * scale,
+        [account.tracker.get_position(p['code']) for p in proposals]
+    )
+    orders = []
+    for p, amt, lbl, is_sell, s_val in zip(proposals, amts, labels, sells, sell_vals):
+        account.tracker.record_signal(p['code'], lbl)
+        if p['tech']['price'] <= 0: continue
+        if amt > 0: orders.append({"code": p['code'], "name": p['name'], "amount": amt, "price": p['tech']['price']})
+        elif is_sell: orders.append({"code": p['code'], "name": p['name'], "amount": s_val, "price": p['tech']['price'], "is_sell": True})
+    diff = account.tracker.apply_batch(orders)
+
+    final_results = [
+        dict(shared, decision=lbl, amount=amt, is_sell=is_sell, tech=tech)
+        for shared, tech, amt, lbl, is_sell in zip(shared_results, techs, amts, labels, sells)
+    ]
     # ===================================================
     # [新增排序] 按模式 A/B/C/D 依次下排，符合阅读习惯
     # ===================================================
     final_results.sort(key=lambda x: x['ai_full']['strategy_meta'].get('mode', 'D'))
+    return final_results, diff
+
+def restore_phase3(ctx, out):
+    # 交易已在上次运行中记账：直接还原各账户账本快照，不重复下单
+    ctx['account_results'] = out['final_results']
+    for account in ctx['accounts']:
+        account.tracker.replace_portfolio(out['portfolios'][account.name], out['trades'].get(account.name))
+    ctx['final_results'] = out['final_results'][ctx['accounts'][0].name]
+
+def sector_flow_leaders():
+    """ 行业资金流 5 日累计的流入 / 流出前列 (读取落盘序列的最近收盘日)，失败时返回空 """
+    try:
+        return flow_leaders()
+    except Exception as e:
+        logger.warning(f"⚠️ 板块资金流序列读取失败: {e}")
+        return {}
 
+def portfolio_autopsy(ctx):
+    """ 成交明细 × 行情面板 的绩效分析，失败时返回 None (不影响 CIO 定调) """
+    try:
+        return analyze_portfolio(ctx['tracker'].trades(), ctx['fetcher'].get_fund_history)
+    except Exception as e:
+        logger.warning(f"⚠️ 持仓绩效分析失败: {e}")
+        return None
+
+def run_cio(ctx):
     cio_html = ""
-    if analyst:
+    if ctx['analyst']:
         logger.info("🧠 正在生成 CIO 战略定调 (基于微观拓扑投影与强迫推理)...")
         try:
             # --- [核心重构] CIO 数据挟持与强制 Prompt 注入 ---
-            total_funds = len(final_results)
+            total_funds = len(ctx['final_results'])
             mode_counts = {'A': 0, 'B': 0, 'C': 0, 'D': 0}
             tech_scores = []
             portfolio_status = []
+            analytics = portfolio_autopsy(ctx)
+            fund_stats = analytics['funds'] if analytics else {}
             
-            for res in final_results:
+            for res in ctx['final_results']:
                 mode = res.get('ai_full', {}).get('strategy_meta', {}).get('mode', 'D')
                 if mode in mode_counts:
                     mode_counts[mode] += 1
@@ -374,7 +749,7 @@ def main():
                 tech_scores.append(tech_score)
                 
                 # 提取当前持仓的真实体检数据
-                pos = tracker.get_position(res['code'])
+                pos = ctx['tracker'].get_position(res['code'])
                 if pos['shares'] > 0:
                     portfolio_status.append({
                         "code": res['code'],
@@ -384,6 +759,13 @@ def main():
                         "held_days": pos['held_days'],
                         "recent_5d_gain": res.get('tech', {}).get('recent_gain', 0)
                     })
+                    stats = fund_stats.get(str(res['code']))
+                    if stats:
+                        portfolio_status[-1].update({
+                            "avg_cost": stats['avg_cost'], "market_value": stats['market_value'],
+                            "weight": stats['weight'], "unrealized_pnl": stats['unrealized_pnl'],
+                            "unrealized_pct": stats['unrealized_pct'], "realized_pnl": stats['realized_pnl'],
+                        })
 
             avg_tech_score = sum(tech_scores) / max(1, len(tech_scores))
             
@@ -396,14 +778,19 @@ def main():
                     "average_quant_score": round(avg_tech_score, 2),
                     "market_temperature_warning": "D轨极度拥挤，流动性枯竭(防守为主)" if mode_counts.get('D', 0) > total_funds * 0.6 else ("A轨过热，防范拥挤踩踏" if mode_counts.get('A', 0) > total_funds * 0.5 else "结构性分化博弈")
                 },
+                "sector_fund_flow": {"market_rolling": ctx.get('flow_trend') or {}, **sector_flow_leaders()},
                 "live_portfolio_autopsy": portfolio_status,
-                "risk_committee_vetoes": risk_report_raw if 'risk_report_raw' in locals() else risk_report
+                "portfolio_performance": analytics['summary'] if analytics else {},
+                "portfolio_risk": ctx.get('portfolio_risk') or {},
+                "risk_committee_vetoes": ctx.get('risk_report_raw') or ctx['risk_report']
             }
             
             # 将包装好的强指令与微观数据直接塞入大模型，代替原本干瘪的 risk_report
-            raw_cio = analyst.generate_cio_strategy(
+            raw_cio = ctx['analyst'].generate_cio_strategy(
                 datetime.now().strftime("%Y-%m-%d"), 
-                cio_injected_payload
+                cio_injected_payload,
+                deadline=ctx['budget'].run_deadline,
+                regime=ctx.get('market_regime')
             )
             # --- 重构结束 ---
 
@@ -418,12 +805,163 @@ def main():
             logger.error(f"CIO 战略生成请求异常: {e}")
             cio_html = "{}"
         
-    html = render_html_report_v19(all_news_seen, final_results, cio_html, "") 
-    
+    ctx['cio_html'] = cio_html
+    return {"cio_html": cio_html}
+
+def restore_cio(ctx, out):
+    ctx['cio_html'] = out['cio_html']
+
+def export_query_snapshot(ctx):
+    """ 导出本次运行的逐基金结果，供 query_api 本地查询 (不影响发信) """
+    analyst = ctx['analyst']
+    rag_hits = analyst.rag_hits if analyst else {}
+    rag_contexts = {name: text for (name, _), text in analyst.rag_contexts.items()} if analyst else {}
+    try:
+        write_snapshot(build_snapshot(get_beijing_time().strftime("%Y-%m-%d %H:%M:%S"),
+                                      ctx['proposals'], ctx['final_results'], rag_hits, rag_contexts))
+    except Exception as e:
+        logger.warning(f"⚠️ 查询快照导出失败: {e}")
+
+def run_render(ctx):
+    if not TEST_MODE:
+        export_query_snapshot(ctx)
     subject_prefix = "🚧 [测试] " if TEST_MODE else "🕊️ "
     # 还原邮件名称
-    send_email(f"{subject_prefix}鹊知风 v26.03.31 全息图谱报告", html)
+    subject = f"{subject_prefix}鹊知风 v26.03.31 全息图谱报告"
+    multi = len(ctx['accounts']) > 1
+    sent = ctx['ckpt'].load_items("render")   # 按账户记录已发送，续跑不重复发信
+    for account in ctx['accounts']:
+        if account.name in sent:
+            continue
+        html = render_html_report_v19(ctx['all_news_seen'], ctx['account_results'][account.name], ctx['cio_html'], "")
+        account_subject = f"{subject} · {account.title}" if multi else subject
+        send_email(account_subject, html, receiver=account.email_to())
+        sent[account.name] = {"subject": account_subject, "sent_at": get_beijing_time().strftime("%Y-%m-%d %H:%M:%S")}
+        ctx['ckpt'].save_item("render", account.name, sent[account.name])
     
     logger.info("✅ 运行结束，邮件已发送。")
+    return {"subject": subject, "accounts": sent, "sent_at": get_beijing_time().strftime("%Y-%m-%d %H:%M:%S")}
+
+def restore_render(ctx, out):
+    logger.info(f"✅ 本次运行已于 {out.get('sent_at')} 完成并发信，无需重复执行。")
+
+# (阶段名, 执行, 还原, 依赖)：行情刷新 / 资金流 / RAG 构建互不依赖，并发执行；
+# Phase 2 与 Phase 1 同时启动，通过提案流边收边审
+PIPELINE = [
+    ("fetch", run_fetch, restore_fetch, ()),
+    ("flow", run_flow, restore_flow, ()),
+    ("regime", run_regime, restore_regime, ("fetch", "flow")),
+    ("rag", run_rag, restore_rag, ()),
+    ("phase1", run_phase1, restore_phase1, ("fetch", "regime", "rag")),
+    ("phase2", run_phase2, restore_phase2, ("fetch", "regime", "rag")),
+    ("phase3", run_phase3, restore_phase3, ("phase1", "phase2")),
+    ("cio", run_cio, restore_cio, ("phase3",)),
+    ("render", run_render, restore_render, ("cio",)),
+]
+# 行情缓存与向量索引只存在于进程/本地磁盘，Phase 1 未完成时这两个免费阶段需重新执行
+LOCAL_STAGES = {"fetch", "rag"}
+# 流式依赖：上游未完成时，下游即使已落盘也可能漏审了上游新产出的数据
+STREAMED_FROM = {"phase2": "phase1"}
+
+def stage_reusable(ckpt, name):
+    if not ckpt.is_done(name):
+        return False
+    if name in LOCAL_STAGES:
+        return ckpt.is_done("phase1")
+    upstream = STREAMED_FROM.get(name)
+    return upstream is None or ckpt.is_done(upstream)
+
+def stage_node(ctx, name, run, restore, reusable):
+    def node():
+        if reusable:
+            logger.info(f"⏭️ [Checkpoint] 阶段 {name} 已完成，载入检查点")
+            restore(ctx, ctx['ckpt'].load(name, {}))
+        else:
+            ctx['ckpt'].complete(name, run(ctx))
+    if name != "phase1":
+        return node
+
+    def producer():
+        # 提案流必须关闭，否则 Phase 2 会一直等待；Phase 1 失败时中止流，避免 Phase 2 以不完整的提案落盘
+        try:
+            node()
+        except Exception as e:
+            ctx['proposal_stream'].close(error=e)
+            raise
+        ctx['proposal_stream'].close()
+    return producer
+
+def dynamic_watchlist(config, funds, accounts, ckpt):
+    """ 全市场海选出的动态观察名单；续跑沿用本次运行开始时的名单，保证各阶段标的一致 """
+    watchlist = ckpt.load("dynamic_watchlist")
+    if watchlist is None:
+        held = {}
+        for account in accounts:
+            held.update({code: account.tracker.portfolio[code].get('name', code) for code in account.held_codes()})
+        try:
+            watchlist = screen_universe(config, funds, held, today=get_beijing_time().strftime("%Y-%m-%d"))
+        except Exception as e:
+            logger.warning(f"⚠️ [Screener] 全市场海选失败，仅分析固定标的: {e}")
+            watchlist = []
+        ckpt.save("dynamic_watchlist", watchlist)
+    return watchlist
+
+def main(resident=None, started=None):
+    """
+    resident: 常驻进程 (advisor_daemon) 传入的 {'fetcher', 'analyst'}，复用已加载的行情面板、向量索引与连接池；
+    started: 本次运行时间预算的起点 (time.monotonic())，默认取进程启动时刻
+    """
+    resident = resident or {}
+    # 🟢 进程启动即后台预热向量模型，与下方的行情抓取并行
+    start_encoder_warmup()
+    config = load_config()
+    fetcher = resident.get('fetcher') or DataFetcher()
+    accounts, val_engine = open_accounts(config), ValuationEngine()
+    scanner = MarketScanner()
+    
+    # 🟢 断点续跑：接续同日未完成的运行时，账本回到该次运行开始时的快照 (持仓天数已确认过)
+    ckpt = RunCheckpoint.open(get_beijing_time())
+    base_portfolios = ckpt.load("portfolio_bases")
+    if base_portfolios is not None:
+        for account in accounts:
+            if account.name in base_portfolios:
+                account.tracker.replace_portfolio(base_portfolios[account.name])
+        logger.info(f"🔁 [Checkpoint] 接续运行 {ckpt.name} (已完成阶段: {ckpt.last_stage() or '无'})")
+    else:
+        for account in accounts:
+            account.tracker.confirm_trades()
+            account.tracker.compact()   # 上次运行遗留的成交先并入明细，续跑回到该快照时不会丢失
+        ckpt.save("portfolio_bases", {account.name: account.tracker.portfolio for account in accounts})
+        logger.info(f"🆕 [Checkpoint] 新建运行 {ckpt.name}")
+    
+    analyst = resident.get('analyst')
+    if analyst is None:
+        try: analyst = NewsAnalyst()
+        except: analyst = None
+
+    logger.info("🚀 启动 v20.5 全息认知对抗系统 (GraphRAG + Agentic Model)...")
+
+    funds = config.get('funds', [])
+    if TEST_MODE and funds: 
+        logger.info("🚧 测试模式：仅处理前2个标的")
+        funds = funds[:2]
+    else:
+        funds = funds + dynamic_watchlist(config, funds, accounts, ckpt)
+
+    ctx = {
+        "config": config, "funds": funds, "fetcher": fetcher,
+        "accounts": accounts, "tracker": accounts[0].tracker,   # tracker: 主账户 (CIO 体检、查询快照)
+        "val_engine": val_engine, "scanner": scanner, "analyst": analyst, "ckpt": ckpt,
+        "budget": TimeBudget.from_config(config.get('global', {}), started if started is not None else RUN_STARTED),
+        "proposal_stream": Stream(),
+    }
+    # 可复用阶段在启动前一次性判定，避免运行中途落盘的检查点影响判定
+    graph = TaskGraph()
+    for name, run, restore, deps in PIPELINE:
+        graph.add(name, stage_node(ctx, name, run, restore, stage_reusable(ckpt, name)), deps)
+    graph.run()
+    # 运行结束时把账本日志压缩回 portfolio.json，提交到仓库的快照保持最新
+    for account in accounts:
+        account.tracker.compact()
 
 if __name__ == "__main__": main()
@@ -0,0 +1,132 @@
+import os
+import numpy as np
+
+from utils import logger
+from columnar_store import ColumnarTable
+from prompts_config import CIO_PRE_FILTER
+
+# ==========================================
+# 🟢 市场水位引擎 (Market Regime)
+# 主力净流入 (get_market_net_flow，失败时退回行业板块汇总 get_market_vitality) 是接口的 "今日" 快照，
+# 按所属的已收盘交易日落盘 (sector_flow.flow_session: 开盘前为上一交易日终值，收盘后为当日终值，同日重跑幂等覆盖)，
+# 盘中半场数据不入序列，N 日累计因此是完整交易日之和；连同宽基代理的已实现波动率按 CIO_PRE_FILTER 的阈值算出水位:
+#   HIGH:   波动率 > 30 或 N 日净流出 > 500 亿
+#   MEDIUM: 其余情况 (波动率 20-30、小幅净流出或数据不足)
+#   LOW:    波动率 < 20 且 N 日净流入
+# 可用轨道与仓位上限直接取 track_availability，由代码执行，不再让大模型猜测
+# 地缘指数 / 信用利差 / 两融余额暂无本地数据源，不参与判定
+# ==========================================
+REGIME_PATH = os.path.join("data_cache", "market_regime.npz")
+REGIME_SCHEMA = {
+    "session": "U10",            # 资金流所属的已收盘交易日 (旧版按运行日期混存盘中快照的文件载入时视为空表)
+    "net_flow": np.float64,      # 该交易日全天主力净流入 (亿)
+    "volatility": np.float64,    # 代理标的年化已实现波动率 (%)
+    "level": "U6",
+}
+BASELINE_LEVEL = "MEDIUM"   # 未接入水位引擎时各 prompt 沿用的默认水位，仓位缩放以此为基准
+
+DEFAULT_REGIME_CONFIG = {
+    "vol_proxy": "510300",       # 波动率代理 (沪深300ETF)
+    "vol_window": 20,
+    "flow_days": 5,
+    "vol_high": 30.0,
+    "vol_medium": 20.0,
+    "outflow_high": 500.0,       # N 日净流出 (亿)
+    "keep_days": 250,
+}
+
+def regime_config(config):
+    cfg = dict(DEFAULT_REGIME_CONFIG)
+    cfg.update(config.get('regime') or {})
+    return cfg
+
+def realized_vol(closes, window):
+    """ 最近 window 个交易日对数收益的年化波动率 (%)，数据不足返回 NaN """
+    closes = np.asarray(closes, dtype=float)
+    closes = closes[closes > 0]
+    if len(closes) <= window:
+        return float('nan')
+    returns = np.diff(np.log(closes[-window - 1:]))
+    return float(returns.std(ddof=1) * np.sqrt(252) * 100)
+
+def classify(volatility, flow_nd, cfg):
+    """ 返回 (水位, 判定依据) """
+    vol_ok, flow_ok = not np.isnan(volatility), not np.isnan(flow_nd)
+    if (vol_ok and volatility > cfg["vol_high"]) or (flow_ok and flow_nd < -cfg["outflow_high"]):
+        level = "HIGH"
+    elif vol_ok and flow_ok and volatility < cfg["vol_medium"] and flow_nd > 0:
+        level = "LOW"
+    else:
+        level = "MEDIUM"
+    vol_desc = f"波动率 {volatility:.1f}%" if vol_ok else "波动率缺失"
+    flow_desc = f"{cfg['flow_days']}日主力净流入 {flow_nd:+.0f}亿" if flow_ok else "资金流缺失"
+    return level, f"{vol_desc}，{flow_desc}"
+
+def _percent(value):
+    return float(str(value).rstrip('%')) / 100
+
+def track_limits(level):
+    """ track_availability 中该水位的轨道与仓位约束，附数值化的仓位缩放 (相对默认水位) """
+    tracks = CIO_PRE_FILTER["track_availability"]
+    limits = dict(tracks[level])
+    limits["position_scale"] = round(_percent(limits["max_position_per_etf"]) / _percent(tracks[BASELINE_LEVEL]["max_position_per_etf"]), 4)
+    return limits
+
+def update_regime(day, net_flow, volatility, cfg, session=None, path=REGIME_PATH):
+    """
+    判定水位，返回可序列化的 regime dict (进入运行检查点，续跑不重算)
+    session 为本次资金流快照所属的已收盘交易日 (盘中为 None)：有效时追加 / 覆盖该交易日的行并计入 N 日累计；
+    盘中运行只用已落盘的完整交易日，快照本身仅作展示
+    """
+    table = ColumnarTable(path, REGIME_SCHEMA)
+    record = session is not None and not np.isnan(net_flow)   # 抓取失败时不覆盖已有终值
+    history = table.columns
+    if record:
+        prior = history["session"] < session
+        flows = np.r_[history["net_flow"][prior][-(cfg["flow_days"] - 1):] if cfg["flow_days"] > 1 else [], net_flow]
+        as_of = session
+    else:
+        flows = history["net_flow"][-cfg["flow_days"]:]
+        as_of = str(history["session"][-1]) if len(flows) else None
+    valid = ~np.isnan(flows)
+    flow_nd = float(flows[valid].sum()) if valid.any() else float('nan')
+    level, rationale = classify(volatility, flow_nd, cfg)
+    if as_of:
+        rationale += f" (资金流截至 {as_of} 收盘)"
+
+    if record:
+        table.replace_where("session", session, {"session": [session], "net_flow": [net_flow], "volatility": [volatility], "level": [level]})
+        sessions = table.unique("session")
+        for stale in sessions[:-cfg["keep_days"]] if len(sessions) > cfg["keep_days"] else []:
+            table.delete_where("session", stale)
+        table.sort("session")
+        table.save()
+
+    limits = track_limits(level)
+    regime = {
+        "date": day, "level": level, "rationale": rationale,
+        "net_flow": None if np.isnan(net_flow) else round(float(net_flow), 2),   # 本次抓到的快照 (盘中为半场数据)
+        "net_flow_nd": None if np.isnan(flow_nd) else round(flow_nd, 2), "flow_days": int(valid.sum()), "flow_as_of": as_of,
+        "volatility": None if np.isnan(volatility) else round(volatility, 2),
+        **limits,
+    }
+    logger.info(f"🌡️ [Regime] 市场水位 {level} ({rationale}) → 可用轨道 {limits['allowed_modes']}，"
+                f"单标的上限 {limits['max_position_per_etf']}")
+    return regime
+
+def prompt_fields(regime=None):
+    """ 各 prompt 的水位占位符；未接入水位引擎时沿用默认水位 """
+    if regime is None:
+        level, rationale = BASELINE_LEVEL, "水位引擎未运行，按默认水位处理"
+        limits = track_limits(level)
+    else:
+        level, rationale, limits = regime["level"], regime["rationale"], regime
+    return {
+        "market_risk_level": level,
+        "risk_level_rationale": rationale,
+        "allowed_modes": str(list(limits["allowed_modes"])),
+        "forbidden_modes": str(list(limits["forbidden_modes"])),
+        "max_position": limits["max_position_per_etf"],
+        "cash_ratio": limits["cash_ratio_min"],
+        "total_position_max": limits["total_position_max"],
+    }
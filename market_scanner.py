@@ -3,6 +3,7 @@ import pandas as pd
 import re
 from datetime import datetime
 from utils import logger, retry
+from sector_flow import parse_flow_values
 
 class MarketScanner:
     """
@@ -33,37 +34,18 @@ class MarketScanner:
 
     def _parse_flow_value(self, val):
         """
-        [工具] 解析带单位的资金数值
+        [工具] 解析带单位的资金数值 (parse_flow_values 的单值形式)
         例如: '-15.5亿' -> -15.5; '3000万' -> 0.3; '2.5万' -> 0.00025
         统一返回单位: 亿元 (float)
         """
-        try:
-            # 如果已经是数字，假设单位是元，转为亿元
-            if isinstance(val, (int, float)):
-                return float(val) / 100000000 
-            
-            s = str(val).strip()
-            unit = 1.0 # 默认单位为亿
-            
-            if '亿' in s:
-                unit = 1.0
-                s = s.replace('亿', '')
-            elif '万' in s:
-                unit = 0.0001
-                s = s.replace('万', '')
-            else:
-                # 纯数字字符串，默认为元，转为亿
-                unit = 0.00000001
-            
-            return float(s) * unit
-        except:
-            return 0.0
+        return float(parse_flow_values([val])[0])
 
     @retry(retries=2, delay=2)
     def get_market_vitality(self):
         """
         [v19.2] 获取全市场生命力指标 (资金流向)
         替代方案：汇总所有行业板块的“今日主力净流入”
+        各板块快照随结果返回 (sectors / flows)，由水位阶段按所属交易日落盘 (sector_flow.flow_session)
         """
         try:
             # 1. 获取东方财富行业资金流向 (实时/盘后)
@@ -78,6 +60,7 @@ class MarketScanner:
             # 自动寻找包含 "净流入" 和 "主力" 的列名
             total_flow = 0.0
             target_col = None
+            snapshot = {}
             
             for col in sector_flow_df.columns:
                 # 排除 "占比" 列，只找金额列
@@ -86,9 +69,11 @@ class MarketScanner:
                     break
             
             if target_col:
-                # 累加所有板块的净流入
-                for val in sector_flow_df[target_col]:
-                    total_flow += self._parse_flow_value(val)
+                # 整列解析单位后累加所有板块的净流入
+                flows = parse_flow_values(sector_flow_df[target_col])
+                total_flow = float(flows.sum())
+                name_col = "名称" if "名称" in sector_flow_df.columns else sector_flow_df.columns[1]
+                snapshot = {"sectors": sector_flow_df[name_col].astype(str).tolist(), "flows": [round(float(v), 4) for v in flows]}
             else:
                 logger.warning(f"未找到资金流列名: {sector_flow_df.columns}")
 
@@ -102,7 +87,8 @@ class MarketScanner:
             
             return {
                 "net_flow": round(total_flow, 2), # 单位：亿元
-                "market_mood": mood
+                "market_mood": mood,
+                "snapshot": snapshot,
             }
 
         except Exception as e:
@@ -4,7 +4,6 @@ import os
 import re
 import time
 import logging
-import difflib  # 🟢 [新增] 用于 RAG 提取结果的高精度去重
 from datetime import datetime, timedelta
 from utils import logger, retry, get_beijing_time
 
@@ -16,23 +15,44 @@ logging.getLogger("huggingface_hub").setLevel(logging.WARNING)
 logging.getLogger("filelock").setLevel(logging.WARNING)
 
 # 🟢 [RAG 与 NLP 依赖接入]
+# sentence_transformers (含 torch) 导入耗时，交由 embedding_engine 在后台线程加载，这里只探测是否安装
 try:
+    import importlib.util
     import faiss
     import numpy as np
-    from sentence_transformers import SentenceTransformer
     import jieba
     import jieba.analyse
     import pytz
-    HAS_RAG_DEPS = True
+    HAS_RAG_DEPS = importlib.util.find_spec("sentence_transformers") is not None
 except ImportError:
     HAS_RAG_DEPS = False
 
+from news_query import NewsQuery
+from news_archive import NewsArchive, ARCHIVE_PATH
+from news_entities import EntityCache
+from embedding_engine import get_encoder
+from news_index import generate_news_id
+from event_calendar import EventCalendar
+from phase_scheduler import DeadlineExceeded
+
+# 🟢 新闻回溯窗口 (小时)，0 表示仅当日 (北京时间 0 点起)
+NEWS_LOOKBACK_HOURS = int(os.getenv("NEWS_LOOKBACK_HOURS", "0") or 0)
+# 🟢 Hype Score 时间衰减核: exponential | step (TIER_S 阶梯) | linear (TIER_A 线性)
+RAG_DECAY_KERNEL = os.getenv("RAG_DECAY_KERNEL", "exponential")
+# 🟢 LLM 连接池大小 (不小于 Phase 1 并发数 + 风控批次)
+LLM_POOL_SIZE = 8
+
+if HAS_RAG_DEPS:
+    from hype_scoring import score_hits, is_duplicate_title, SEARCH_K, DECAY_KERNELS
+    from hype_history import open_history, hype_zscore, cutoff_for, score_cutoff
+
 from prompts_config import (
     TACTICAL_IC_PROMPT, 
     STRATEGIC_CIO_REPORT_PROMPT, 
     RISK_CONTROL_VETO_PROMPT, 
     EVENT_TIER_DEFINITIONS
 )
+from market_regime import prompt_fields as regime_prompt_fields
 
 class NewsAnalyst:
     """
@@ -50,6 +70,11 @@ class NewsAnalyst:
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
+        # 🟢 复用 HTTP 连接池：同一进程内的多次 LLM 调用 (Phase 1 并发 / 常驻进程多轮运行) 免去重复握手
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=2, pool_maxsize=LLM_POOL_SIZE)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
         
         # 🟢 RAG 核心组件初始化
         self.has_rag = HAS_RAG_DEPS
@@ -57,147 +82,225 @@ class NewsAnalyst:
         self.index = None
         self.news_data = []
         self.macro_news = []
+        self.embeddings = None
+        self.news_epochs = None
+        self._vectors = {}       # news_id -> 标题向量，增量刷新时复用
+        self.decay_kernel = RAG_DECAY_KERNEL
+        self.rag_contexts = {}   # (fund_name, sector_keyword) -> RAG 情报 JSON 串
+        self.rag_hits = {}       # fund_name -> {'news_ids', 'hype', 'decayed_weight'}
+        self.news_query = NewsQuery()
+        self.archive = None
+        if os.path.exists(ARCHIVE_PATH):
+            try: self.archive = NewsArchive(ARCHIVE_PATH, readonly=True)
+            except Exception as e: logger.warning(f"⚠️ 新闻检索库打开失败: {e}")
+        
+        # 🟢 事件日历在新闻入库时已抽取，这里只加载倒排索引
+        try: self.event_calendar = EventCalendar()
+        except Exception as e:
+            logger.warning(f"⚠️ 事件日历加载失败: {e}")
+            self.event_calendar = None
         
         self._has_logged_rag_sample = False
 
+    @property
+    def active_decay_kernel(self):
+        """ 实际用于衰减打分的核 (配置了未知的核时退回 exponential)，打分与 IC prompt 共用 """
+        return self.decay_kernel if self.has_rag and self.decay_kernel in DECAY_KERNELS else "exponential"
+
+    def _query_news(self, filters=None):
+        """ 按回溯窗口从时间索引流式读取新闻 (默认仅当日，最新在前) """
+        if NEWS_LOOKBACK_HOURS > 0:
+            return self.news_query.query_hours(NEWS_LOOKBACK_HOURS, filters=filters)
+        return self.news_query.query(filters=filters)
+
     def init_rag_system(self):
-        """ 🟢 核心提效：构建基于本地新闻的向量知识库与实体图谱 """
+        """ 🟢 核心提效：构建基于本地新闻的向量知识库与实体图谱 (已构建过则转为增量刷新) """
         if not self.has_rag:
             logger.warning("⚠️ 缺少 RAG 依赖 (faiss-cpu, sentence-transformers, jieba)，自动降级为传统文本拼接模式。")
             return
 
         if self.index is not None:
-            return # 已经初始化过
+            self.refresh_rag()
+            return
 
-        logger.info("🧠 [RAG] 正在加载 BGE 向量模型与 NLP 实体抽取引擎...")
+        logger.info("🧠 [RAG] 正在获取 BGE 向量模型与 NLP 实体抽取引擎...")
         try:
-            self.encoder = SentenceTransformer('BAAI/bge-small-zh-v1.5')
+            self.encoder = get_encoder()
         except Exception as e:
             logger.error(f"向量模型加载失败，关闭 RAG 功能: {e}")
             self.has_rag = False
             return
-
-        today_str = get_beijing_time().strftime("%Y-%m-%d")
-        possible_paths = [f"data_news/news_{today_str}.jsonl", f"news_{today_str}.jsonl"]
-        
-        target_file = None
-        for p in possible_paths:
-            if os.path.exists(p):
-                target_file = p
-                break
-        
-        if not target_file: 
-            logger.warning(f"⚠️ [RAG] 未找到今日新闻文件，跳过图谱构建。")
-            return
-
-        texts_to_encode = []
+        self.refresh_rag()
+
+    def refresh_rag(self):
+        """
+        按回溯窗口重新汇总新闻：已编码过的新闻按 id 复用向量，只编码新入库的部分，滑出窗口的新闻随之剔除；
+        常驻进程 (advisor_daemon) 每轮抓取后调用，单次运行时等价于全量构建。返回新编码的条数
+        """
+        if not self.has_rag or self.encoder is None:
+            return 0
+
+        news_data = []
+        macro_news = []
+        news_epochs = []
+        entity_caches = {}
         try:
-            with open(target_file, 'r', encoding='utf-8') as f:
-                for line in f:
-                    if not line.strip(): continue
-                    try:
-                        item = json.loads(line)
-                        title = str(item.get('title', '')).strip()
-                        content = str(item.get('content') or item.get('digest') or "").strip()
-                        if not title or len(title) < 2: continue
-                        
-                        raw_time = str(item.get('time', ''))
-                        full_text = f"{title}。{content}"
-                        
-                        # 🟢 NER：基于 TF-IDF 提取核心标签，提纯信息熵
-                        entities = jieba.analyse.extract_tags(full_text, topK=3)
-                        
-                        news_obj = {
-                            "time": raw_time,
-                            "title": title,
-                            "content": content[:200],
-                            "entities": entities
-                        }
-                        self.news_data.append(news_obj)
-                        texts_to_encode.append(title)
+            for item in self._query_news(filters={'min_title_len': 2}):
+                try:
+                    title = str(item.get('title', '')).strip()
+                    content = str(item.get('content') or item.get('digest') or "").strip()
+                    
+                    raw_time = str(item.get('time', ''))
+                    
+                    # 🟢 NER：实体在入库时已抽取并按新闻 id 缓存，仅缓存缺失时现场跑 TF-IDF
+                    day = item.get('day')
+                    if day not in entity_caches:
+                        entity_caches[day] = EntityCache(self.news_query.day_path(day))
+                    entities = entity_caches[day].get(item)
+                    
+                    news_obj = {
+                        "id": generate_news_id(item),
+                        "time": raw_time,
+                        "title": title,
+                        "content": content[:200],
+                        "entities": entities
+                    }
+                    news_data.append(news_obj)
+                    news_epochs.append(item.get('ts') or 0)
+                    
+                    # 全局宏观新闻分流 (TIER_S 预判)
+                    macro_kws = ["央行", "降息", "降准", "美联储", "重磅", "政治局", "国务院", "外汇局", "发改委"]
+                    if any(k in title for k in macro_kws):
+                        macro_news.append(news_obj)
                         
-                        # 全局宏观新闻分流 (TIER_S 预判)
-                        macro_kws = ["央行", "降息", "降准", "美联储", "重磅", "政治局", "国务院", "外汇局", "发改委"]
-                        if any(k in title for k in macro_kws):
-                            self.macro_news.append(news_obj)
-                            
-                    except Exception: pass
+                except Exception: pass
         except Exception as e:
             logger.error(f"[RAG] 读取新闻库报错: {e}")
 
-        if texts_to_encode:
-            logger.info(f"🧬 [RAG] 正在清洗并向量化 {len(texts_to_encode)} 条全市场新闻...")
-            try:
-                embeddings = self.encoder.encode(texts_to_encode, normalize_embeddings=True, show_progress_bar=False)
-                self.index = faiss.IndexFlatIP(embeddings.shape[1]) # 内积计算余弦相似度
-                self.index.add(embeddings)
-                logger.info("✅ [RAG] 全息向量图谱构建完成！")
-            except Exception as e:
-                logger.error(f"[RAG] 构建 FAISS 索引失败: {e}")
-                self.has_rag = False
-
-    def get_fund_rag_context(self, fund_name, sector_keyword):
-        """ 🟢 NLP to Alpha: 为单个基金执行精确语义检索，并计算情绪共振指数 """
+        for cache in entity_caches.values():
+            try: cache.save()
+            except Exception as e: logger.warning(f"[RAG] 实体缓存保存失败: {e}")
+
+        # 本轮汇总的结果整体替换：各基金的检索缓存随之失效
+        self.rag_contexts = {}
+        self.rag_hits = {}
+        self.news_data = news_data
+        self.macro_news = macro_news
+
+        if not news_data:
+            logger.warning(f"⚠️ [RAG] 回溯窗口内无新闻，跳过图谱构建。")
+            self.index = None
+            self.embeddings = None
+            self.news_epochs = None
+            self._vectors = {}
+            return 0
+
+        fresh = [obj for obj in news_data if obj['id'] not in self._vectors]
+        logger.info(f"🧬 [RAG] 正在清洗并向量化 {len(fresh)} 条新闻 (复用已编码 {len(news_data) - len(fresh)} 条)...")
+        try:
+            if fresh:
+                vectors = self.encoder.encode([obj['title'] for obj in fresh], normalize_embeddings=True, show_progress_bar=False)
+                for obj, vec in zip(fresh, vectors):
+                    self._vectors[obj['id']] = vec
+            embeddings = np.ascontiguousarray(np.vstack([self._vectors[obj['id']] for obj in news_data]), dtype=np.float32)
+            live_ids = {obj['id'] for obj in news_data}
+            self._vectors = {k: v for k, v in self._vectors.items() if k in live_ids}
+
+            index = faiss.IndexFlatIP(embeddings.shape[1]) # 内积计算余弦相似度
+            index.add(embeddings)
+            self.index = index
+            self.embeddings = embeddings
+            # 时间在查询层已归一化为 epoch，这里只落成数组，衰减计算不再逐条解析字符串
+            self.news_epochs = np.asarray(news_epochs, dtype=np.int64)
+            logger.info("✅ [RAG] 全息向量图谱构建完成！")
+        except Exception as e:
+            logger.error(f"[RAG] 构建 FAISS 索引失败: {e}")
+            self.has_rag = False
+            return 0
+
+        # 事件日历由抓取任务在入库时更新，随索引一同重新加载
+        try: self.event_calendar = EventCalendar()
+        except Exception as e: logger.warning(f"⚠️ 事件日历加载失败: {e}")
+        return len(fresh)
+
+    def prime_fund_rag_contexts(self, funds):
+        """
+        🟢 NLP to Alpha: 所有基金一次性批量编码 + 批量检索，
+        在 (基金 × 命中) 相似度矩阵上向量化计算时间衰减与情绪共振指数，结果按基金缓存
+        """
         if not self.has_rag or self.index is None or self.index.ntotal == 0:
-            return "无 RAG 增强数据"
+            return
+        pending = []
+        for fund in funds:
+            key = (fund.get('name', ''), fund.get('sector_keyword', ''))
+            if key not in self.rag_contexts and key not in pending:
+                pending.append(key)
+        if not pending:
+            return
 
         # 融合基金名称与配置表中的板块特征，实现精确狙击
-        query = f"{fund_name} {sector_keyword}"
-        q_emb = self.encoder.encode([query], normalize_embeddings=True, show_progress_bar=False)
-        
+        queries = [f"{name} {keyword}" for name, keyword in pending]
+        q_embs = self.encoder.encode(queries, normalize_embeddings=True, show_progress_bar=False)
+
         # 扫描底层扩容到 50 条
-        search_k = min(50, self.index.ntotal)
-        D, I = self.index.search(q_emb, k=search_k)
+        D, I = self.index.search(q_embs, k=min(SEARCH_K, self.index.ntotal))
+        scored = score_hits(D, I, self.news_epochs, get_beijing_time().timestamp(), self.active_decay_kernel)
 
+        # 🟢 情绪分相对该基金近 20 个交易日同一时点的 Z 分数 (情绪历史表)，判断热度是否异常；
+        # 比较值按历史表的口径重算 (当日时点前的新闻、以时点为评估时刻)，不用上面按当前时刻衰减的盘中分
+        codes = {fund.get('name', ''): fund.get('code') for fund in funds}
+        now = get_beijing_time()
+        today, cutoff = now.strftime("%Y-%m-%d"), cutoff_for(now)
+        history, cutoff_hype = None, None
+        if cutoff:
+            try:
+                history = open_history()
+                cutoff_hype, _, _ = score_cutoff(q_embs, self.embeddings, [n['title'] for n in self.news_data],
+                                                 self.news_epochs, today, cutoff, self.active_decay_kernel)
+            except Exception as e:
+                logger.warning(f"情绪历史读取失败: {e}")
+                history = None
+
+        for row, (fund_name, sector_keyword) in enumerate(pending):
+            hype = int(scored['hype'][row])
+            code = codes.get(fund_name)
+            hype_z = hype_zscore(history, code, int(cutoff_hype[row]), cutoff, before=today) \
+                if history is not None and code else None
+            self.rag_contexts[(fund_name, sector_keyword)] = self._build_rag_context(
+                fund_name, D[row], I[row], scored['mask'][row], scored['weights'][row],
+                hype, int(scored['counts'][row]), hype_z
+            )
+
+    def _build_rag_context(self, fund_name, sims, idxs, mask, weights, hype_index, valid_news_count, hype_z=None):
+        """ 单只基金的去重与文本组装 (打分已在矩阵上完成) """
         sector_catalysts = []
         accepted_titles = [] # 🟢 [新增] 用于存储已接纳的新闻标题，辅助去重
-        hype_score_accumulator = 0.0
-        valid_news_count = 0
-        now = get_beijing_time()
+        accepted_ids = []
+        accepted_weights = []
 
-        for idx, sim in zip(I[0], D[0]):
-            if idx == -1 or sim < 0.40: continue # 过滤低相关度噪声
+        for idx, sim, ok, decay_weight in zip(idxs, sims, mask, weights):
+            if not ok: continue # 过滤低相关度噪声
             news = self.news_data[idx]
 
-            # 时间衰减权重计算
-            try:
-                t_str = news['time']
-                if len(t_str) == 19:
-                    news_time = datetime.strptime(t_str, "%Y-%m-%d %H:%M:%S").replace(tzinfo=pytz.timezone('Asia/Shanghai'))
-                else:
-                    news_time = datetime.strptime(t_str, "%Y-%m-%d %H:%M").replace(tzinfo=pytz.timezone('Asia/Shanghai'))
-                hours_diff = (now - news_time).total_seconds() / 3600.0
-                decay_weight = np.exp(-0.05 * max(0, hours_diff))
-            except:
-                decay_weight = 0.8
-
-            # 🟢 [核心剥离] 所有通过 0.4 阈值的新闻，全部计入热度分（说明媒体在疯狂复读，热度高）
-            hype_score_accumulator += (sim * decay_weight)
-            valid_news_count += 1
-
             # 🟢 [核心去重] 拦截废话：如果内容高度相似，不计入给 AI 的文本中
             news_title = news['title']
-            is_duplicate = False
-            for seen_title in accepted_titles:
-                # 规则 1：子串包含关系 (如："特发信息涨停" 与 "光纤概念特发信息涨停")
-                if news_title in seen_title or seen_title in news_title:
-                    is_duplicate = True
-                    break
-                # 规则 2：语义高相似度匹配 (只要字符相似度 > 80% 则判定为重复)
-                if difflib.SequenceMatcher(None, news_title, seen_title).quick_ratio() > 0.8:
-                    is_duplicate = True
-                    break
-            
-            if is_duplicate:
+            if is_duplicate_title(news_title, accepted_titles):
                 continue # 发现重复，直接跳过文字拼装阶段
 
             # 记录唯一标题，并将情报加入 AI 投喂列表
             accepted_titles.append(news_title)
+            accepted_ids.append(news['id'])
+            accepted_weights.append(float(decay_weight))
             entry = f"[{news['time']}] {news['title']} (相关度:{sim:.2f}, 衰减权重:{decay_weight:.2f}) - 核心实体: {news['entities']}"
             sector_catalysts.append(entry)
 
-        # 归一化 Hype Score (0-100)
-        hype_index = min(100, int(hype_score_accumulator * 6))
+        self.rag_hits[fund_name] = {
+            "news_ids": accepted_ids,
+            "hype": hype_index,
+            "hype_z": hype_z,
+            "hits": valid_news_count,
+            "decayed_weight": round(sum(accepted_weights) / len(accepted_weights), 2) if accepted_weights else 0.8
+        }
         macro_str = "\n".join([f"[{m['time']}] {m['title']}" for m in self.macro_news[:3]])
 
         # 组装全息面板
@@ -206,9 +309,12 @@ class NewsAnalyst:
             "Sector_Catalysts": sector_catalysts if sector_catalysts else ["今日无高度相关板块催化剂"],
             "Quantitative_Resonance": {
                 "Hype_Score": hype_index,
+                "Hype_ZScore_20d": hype_z if hype_z is not None else "历史不足",   # 相对近 20 个交易日同一时点，|Z|>2 为情绪异常
                 "Total_Related_News_Scanned": valid_news_count,       # 底层发现的新闻数量（包含重复发酵）
                 "Unique_Clues_Extracted": len(sector_catalysts),      # 去重后提取的精华独立线索数
                 "System_Advice": f"底层侦测到 {valid_news_count} 次相关报道，去重后提炼出 {len(sector_catalysts)} 条独立线索。情绪分为 {hype_index}。"
+                                 + (f" 情绪分显著{'高于' if hype_z > 0 else '低于'}近 20 日常态 (Z={hype_z})，警惕情绪{'过热' if hype_z > 0 else '冰点'}。"
+                                    if hype_z is not None and abs(hype_z) >= 2 else "")
             }
         }
         
@@ -222,6 +328,35 @@ class NewsAnalyst:
         
         return rag_result_str
 
+    def get_fund_rag_context(self, fund_name, sector_keyword):
+        """ 优先命中 prime_fund_rag_contexts 的批量结果，未预热的基金单独走一次同样的矩阵流程 """
+        if not self.has_rag or self.index is None or self.index.ntotal == 0:
+            return "无 RAG 增强数据"
+        key = (fund_name, sector_keyword)
+        if key not in self.rag_contexts:
+            self.prime_fund_rag_contexts([{"name": fund_name, "sector_keyword": sector_keyword}])
+        return self.rag_contexts.get(key, "无 RAG 增强数据")
+
+    def lexical_search(self, query, hours=None, limit=10):
+        """ 🟢 BM25 词法检索 (SQLite FTS5)，毫秒级，可作为向量检索的廉价预筛/混合召回伙伴 """
+        if self.archive is None:
+            return []
+        hours = hours or NEWS_LOOKBACK_HOURS or 24
+        try:
+            return self.archive.search_recent(query, hours=hours, limit=limit)
+        except Exception as e:
+            logger.warning(f"词法检索失败: {e}")
+            return []
+
+    def get_fund_lexical_context(self, fund_name, sector_keyword, limit=15):
+        """ 无向量 RAG 时的降级方案：按基金关键词 BM25 召回，替代整段新闻截断投喂 """
+        hits = self.lexical_search(f"{fund_name} {sector_keyword}", limit=limit)
+        if not hits:
+            return None
+        lines = [f"[{h['time']}] {h['title']} (BM25:{h['score']:.1f})" for h in hits]
+        logger.info(f"🔎 [{fund_name}] 词法检索命中 {len(hits)} 条")
+        return "\n".join(lines)
+
     def extract_event_info(self, news_text):
         days_to_event = "NULL"
         event_tier = "TIER_C"
@@ -242,57 +377,34 @@ class NewsAnalyst:
 
     def _legacy_get_market_context(self, max_length=35000): 
         """ 保留极其稳健的本地新闻读取逻辑 """
-        today_str = get_beijing_time().strftime("%Y-%m-%d")
-        possible_paths = [f"data_news/news_{today_str}.jsonl", f"news_{today_str}.jsonl"]
-        
-        target_file = None
-        for p in possible_paths:
-            if os.path.exists(p):
-                target_file = p
-                break
-        
-        if not target_file: 
-            logger.warning(f"⚠️ 未找到今日新闻文件，尝试路径: {possible_paths}")
-            return "今日暂无重大新闻。"
-
-        news_candidates = []
+        # 🟢 时间索引已按时间倒序流式输出，超出字数预算即停止读取，无需全量解析再排序
+        final_list = []
+        current_len = 0
         try:
-            with open(target_file, 'r', encoding='utf-8') as f:
-                for line in f:
-                    if not line.strip(): continue
-                    try:
-                        item = json.loads(line)
-                        title = str(item.get('title', '')).strip()
-                        if not title or len(title) < 2: continue
-                        
-                        content = str(item.get('content') or item.get('digest') or "").strip()
-                        source = str(item.get('source', 'Local')).strip()
-                        
-                        raw_time = str(item.get('time', ''))
-                        time_str = raw_time[:16] if len(raw_time) >= 16 else raw_time
-                        
-                        entry = f"[{time_str}] [{source}] {title}"
-                        if len(content) > 10 and content != title:
-                            entry += f"\n   (摘要: {content[:200]}...)"
-                        
-                        news_candidates.append((raw_time, entry))
-                    except: pass
+            for item in self._query_news(filters={'min_title_len': 2}):
+                try:
+                    title = str(item.get('title', '')).strip()
+                    content = str(item.get('content') or item.get('digest') or "").strip()
+                    source = str(item.get('source', 'Local')).strip()
+                    
+                    raw_time = str(item.get('time', ''))
+                    time_str = raw_time[:16] if len(raw_time) >= 16 else raw_time
+                    
+                    entry = f"[{time_str}] [{source}] {title}"
+                    if len(content) > 10 and content != title:
+                        entry += f"\n   (摘要: {content[:200]}...)"
+                except: continue
+
+                if current_len + len(entry) < max_length:
+                    final_list.append(entry)
+                    current_len += len(entry) + 1 
+                else:
+                    break
         except Exception as e:
             logger.error(f"读取新闻文件出错: {e}")
 
-        if not news_candidates: 
+        if not final_list: 
             return "今日暂无重大新闻。"
-        
-        news_candidates.sort(key=lambda x: x[0], reverse=True)
-        
-        final_list = []
-        current_len = 0
-        for _, entry in news_candidates:
-            if current_len + len(entry) < max_length:
-                final_list.append(entry)
-                current_len += len(entry) + 1 
-            else:
-                break
                 
         result_text = "\n".join(final_list)
         logger.info(f"📰 成功加载新闻 {len(final_list)} 条，总字数: {len(result_text)}")
@@ -315,30 +427,42 @@ class NewsAnalyst:
             return "{}"
         except: return "{}"
 
-    def _safe_post_stream(self, payload, timeout=600):
+    def _safe_post_stream(self, payload, timeout=600, deadline=None):
+        """ deadline 为 time.monotonic() 截止时刻：读超时收紧到剩余时间，流式接收中逾期即中断 """
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise DeadlineExceeded("调用时间预算已耗尽")
+            timeout = min(timeout, remaining)
+
         payload['stream'] = True
         full_content = ""
         
-        resp = requests.post(f"{self.base_url}/chat/completions", headers=self.headers, json=payload, stream=True, timeout=timeout)
+        resp = self.session.post(f"{self.base_url}/chat/completions", headers=self.headers, json=payload, stream=True, timeout=timeout)
         
-        if resp.status_code != 200:
-            raise Exception(f"HTTP Error {resp.status_code}: {resp.text}")
-            
-        for line in resp.iter_lines():
-            if line:
-                line_str = line.decode('utf-8').strip()
-                if line_str.startswith("data: "):
-                    data_str = line_str[6:]
-                    if data_str == "[DONE]": 
-                        break
-                    try:
-                        chunk = json.loads(data_str, strict=False)
-                        if "choices" in chunk and len(chunk["choices"]) > 0:
-                            delta = chunk["choices"][0].get("delta", {})
-                            if "content" in delta and delta["content"]:
-                                full_content += delta["content"]
-                    except json.JSONDecodeError:
-                        continue
+        try:
+            if resp.status_code != 200:
+                raise Exception(f"HTTP Error {resp.status_code}: {resp.text}")
+                
+            for line in resp.iter_lines():
+                if deadline is not None and time.monotonic() > deadline:
+                    raise DeadlineExceeded(f"流式响应超过截止时间 (已接收 {len(full_content)} 字)")
+                if line:
+                    line_str = line.decode('utf-8').strip()
+                    if line_str.startswith("data: "):
+                        data_str = line_str[6:]
+                        if data_str == "[DONE]": 
+                            break
+                        try:
+                            chunk = json.loads(data_str, strict=False)
+                            if "choices" in chunk and len(chunk["choices"]) > 0:
+                                delta = chunk["choices"][0].get("delta", {})
+                                if "content" in delta and delta["content"]:
+                                    full_content += delta["content"]
+                        except json.JSONDecodeError:
+                            continue
+        finally:
+            resp.close()
                         
         if not full_content:
             raise Exception("API 返回流为空")
@@ -346,9 +470,10 @@ class NewsAnalyst:
         return full_content
 
     @retry(retries=1, delay=2)
-    def analyze_fund_tactical_v6(self, fund_name, tech, macro_data, news_text, risk, strategy_type="core", sector_keyword=""):
+    def analyze_fund_tactical_v6(self, fund_name, tech, macro_data, news_text, risk, strategy_type="core", sector_keyword="", deadline=None):
         trend_score = tech.get('quant_score', 0)
-        days_to_event, event_tier = self.extract_event_info(news_text)
+        event = self.event_calendar.lookup(sector_keyword) if self.event_calendar else None
+        days_to_event, event_tier = event if event else self.extract_event_info(news_text)
 
         risk_reward = tech.get('risk_reward', {})
         upside_space = risk_reward.get('upside_space_pct', 0.0)
@@ -359,16 +484,11 @@ class NewsAnalyst:
         if self.has_rag and self.index is not None:
             final_news_content = self.get_fund_rag_context(fund_name, sector_keyword)
         else:
-            final_news_content = str(news_text)[:8000]
+            final_news_content = self.get_fund_lexical_context(fund_name, sector_keyword) or str(news_text)[:8000]
 
         try:
             prompt = TACTICAL_IC_PROMPT.format(
-                market_risk_level="MEDIUM", 
-                allowed_modes="['A', 'B', 'C']",
-                forbidden_modes="[]",
-                max_position="15%",
-                cash_ratio="30%",
-                total_position_max="70%",
+                **regime_prompt_fields(macro_data.get('market_regime')),
                 fund_name=fund_name, 
                 fund_code=tech.get('code', 'N/A'),
                 trend_score=trend_score, 
@@ -387,8 +507,8 @@ class NewsAnalyst:
                 sector_breadth=tech.get('sector_breadth', 50),
                 days_to_event=days_to_event,
                 event_tier=event_tier,
-                decayed_weight=0.8,
-                decay_func="exponential",
+                decayed_weight=self.rag_hits.get(fund_name, {}).get('decayed_weight', 0.8),
+                decay_func=self.active_decay_kernel if self.index is not None else "exponential",
                 news_content=final_news_content,
                 fundamental_risk="立案调查, 财务造假, 退市风险"
             )
@@ -405,7 +525,7 @@ class NewsAnalyst:
         }
         
         try:
-            raw_text = self._safe_post_stream(payload, timeout=600)
+            raw_text = self._safe_post_stream(payload, timeout=600, deadline=deadline)
             result = json.loads(self._clean_json(raw_text), strict=False)
             result['days_to_event'] = days_to_event
             return result
@@ -414,13 +534,24 @@ class NewsAnalyst:
             return None
 
     @retry(retries=2, delay=5)
-    def run_risk_committee_veto(self, candidates):
+    def run_risk_committee_veto(self, candidates, deadline=None, approved_context=None, risk_context=None, regime=None):
+        """
+        approved_context: 分批审议时此前批次已批准的标的，只作为测试5 (因子集中度) 的参考，不重复裁决
+        risk_context: risk_engine 算出的组合 VaR / 情景冲击 / 相关性与候选增量风险，测试4、5 以此为准
+        regime: market_regime 算出的市场水位 (缺省按默认水位)
+        """
         if not candidates: return {"approved_list": [], "rejected_log": [], "risk_summary": "无提案提交"}
         candidates_str = json.dumps(candidates, indent=2, ensure_ascii=False)
+        if approved_context:
+            candidates_str += ("\n\n【本轮已批准标的 (仅供测试5因子集中度参考，无需重复裁决，不得出现在 stress_test_results 中)】\n"
+                               + json.dumps(approved_context, indent=2, ensure_ascii=False))
+        if risk_context:
+            candidates_str += ("\n\n【量化风险引擎实测数据 (测试4尾部风险、测试5因子集中度必须引用以下数值，不得自行估算)】\n"
+                               + json.dumps(risk_context, indent=2, ensure_ascii=False))
         
         try:
             prompt = RISK_CONTROL_VETO_PROMPT.format(
-                market_risk_level="MEDIUM",
+                market_risk_level=regime_prompt_fields(regime)["market_risk_level"],
                 candidate_count=len(candidates),
                 emergency_override_status="NONE",
                 candidates_context=candidates_str,
@@ -438,43 +569,35 @@ class NewsAnalyst:
         }
         
         try:
-            raw_text = self._safe_post_stream(payload, timeout=600)
+            raw_text = self._safe_post_stream(payload, timeout=600, deadline=deadline)
             return json.loads(self._clean_json(raw_text), strict=False)
         except Exception as e:
             logger.error(f"Risk Veto Failed: {e}")
             return {"approved_list": [], "rejected_log": [{"code": "ALL", "reason": "风控服务超时"}], "risk_summary": "System Error"}
 
     @retry(retries=2, delay=5)
-    def generate_cio_strategy(self, current_date, risk_report_json):
+    def generate_cio_strategy(self, current_date, risk_report_json, deadline=None, regime=None):
         try:
             prompt = STRATEGIC_CIO_REPORT_PROMPT.format(
                 current_date=current_date,
-                market_risk_level="MEDIUM",
-                risk_level_rationale="多因子综合评估（资金流动、波动率中性）",
-                allowed_modes="['A', 'B', 'C']",
-                cash_ratio="30%",
-                max_position="15%",
+                **regime_prompt_fields(regime),
                 risk_committee_json=json.dumps(risk_report_json, indent=2, ensure_ascii=False)
             )
         except Exception as e:
             logger.error(f"CIO Prompt构造失败: {e}", exc_info=True)
             return "<p>战略研判生成失败，系统降级运行。</p>"
 
-        return self._call_r1_text(prompt)
+        return self._call_r1_text(prompt, deadline)
 
     @retry(retries=1, delay=2)
     def analyze_fund_v5(self, fund_name, tech, macro_data, news_text, risk, strategy_type="core", sector_keyword=""):
         return self.analyze_fund_tactical_v6(fund_name, tech, macro_data, news_text, risk, strategy_type, sector_keyword)
 
     @retry(retries=2, delay=5)
-    def review_report(self, report_text, macro_str):
+    def review_report(self, report_text, macro_str, regime=None):
         prompt = STRATEGIC_CIO_REPORT_PROMPT.format(
             current_date=datetime.now().strftime("%Y-%m-%d"), 
-            market_risk_level="MEDIUM",
-            risk_level_rationale="例行兜底分析",
-            allowed_modes="['A', 'B', 'C']",
-            cash_ratio="30%",
-            max_position="15%",
+            **regime_prompt_fields(regime),
             risk_committee_json=json.dumps({"summary": report_text}, ensure_ascii=False)
         )
         return self._call_r1_text(prompt)
@@ -483,7 +606,7 @@ class NewsAnalyst:
     def advisor_review(self, report_text, macro_str):
         return ""
 
-    def _call_r1_text(self, prompt):
+    def _call_r1_text(self, prompt, deadline=None):
         payload = {
             "model": self.model_strategic, 
             "messages": [{"role": "user", "content": prompt}], 
@@ -491,7 +614,7 @@ class NewsAnalyst:
             "temperature": 0.3
         }
         try:
-            raw_text = self._safe_post_stream(payload, timeout=600)
+            raw_text = self._safe_post_stream(payload, timeout=600, deadline=deadline)
             clean_str = self._clean_json(raw_text)
             try:
                 parsed = json.loads(clean_str, strict=False)
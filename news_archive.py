@@ -0,0 +1,166 @@
+import os
+import re
+import sys
+import json
+import glob
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+from news_index import generate_news_id, parse_news_epoch, BEIJING_TZ
+
+try:
+    import jieba
+    jieba.setLogLevel(60)
+    HAS_JIEBA = True
+except ImportError:
+    HAS_JIEBA = False
+
+# ==========================================
+# 🟢 新闻全文检索库 (SQLite FTS5 + jieba 分词)
+# news 表存原文与时间/来源，news_fts 为无内容 (contentless) 倒排索引，
+# 写入的是 jieba 搜索模式分词后以空格拼接的文本，检索按 BM25 排序
+# ==========================================
+ARCHIVE_PATH = os.path.join("data_news", "news_archive.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS news (
+    rowid   INTEGER PRIMARY KEY,
+    id      TEXT UNIQUE NOT NULL,
+    ts      INTEGER NOT NULL,
+    day     TEXT NOT NULL,
+    source  TEXT,
+    time    TEXT,
+    title   TEXT,
+    content TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_news_ts ON news(ts);
+CREATE INDEX IF NOT EXISTS idx_news_source_ts ON news(source, ts);
+CREATE VIRTUAL TABLE IF NOT EXISTS news_fts USING fts5(title, content, content='', tokenize='unicode61');
+"""
+
+_FALLBACK_TOKEN = re.compile(r'[A-Za-z0-9]+|[\u4e00-\u9fa5]')
+
+def tokenize(text):
+    """ 分词后以空格拼接，交给 FTS5 unicode61 按空格/标点切分；无 jieba 时退化为单字切分 """
+    text = str(text or '')
+    if HAS_JIEBA:
+        tokens = [t.strip() for t in jieba.cut_for_search(text)]
+        tokens = [t for t in tokens if t and _FALLBACK_TOKEN.search(t)]
+    else:
+        tokens = _FALLBACK_TOKEN.findall(text)
+    return " ".join(tokens)
+
+def _match_expression(query):
+    tokens = list(dict.fromkeys(tokenize(query).split()))
+    if HAS_JIEBA:
+        # 单字 (的/了/股) 区分度极低，有多字词时丢弃
+        longer = [t for t in tokens if len(t) > 1]
+        tokens = longer or tokens
+    return " OR ".join('"' + t.replace('"', '""') + '"' for t in tokens)
+
+class NewsArchive:
+    """
+    嵌入式新闻档案库：news_loader 入库时同步写入，NewsAnalyst 用作 BM25 词法检索
+    """
+    def __init__(self, path=ARCHIVE_PATH, readonly=False):
+        self.path = path
+        self.lock = threading.Lock()
+        if readonly:
+            self.conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self.conn = sqlite3.connect(path, check_same_thread=False)
+            self.conn.executescript(SCHEMA)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def count(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM news").fetchone()[0]
+
+    def add_items(self, items, day_str, sources=None):
+        """ 批量写入 (按 id 幂等)，返回新增条数 """
+        sources = sources or [None] * len(items)
+        added = 0
+        with self.lock:
+            cur = self.conn.cursor()
+            for item, source in zip(items, sources):
+                title = str(item.get('title', '')).strip()
+                content = str(item.get('content') or item.get('digest') or '').strip()
+                ts = parse_news_epoch(item.get('time', ''), day_str) or 0
+                cur.execute(
+                    "INSERT OR IGNORE INTO news(id, ts, day, source, time, title, content) VALUES (?,?,?,?,?,?,?)",
+                    (generate_news_id(item), ts, day_str, source or item.get('source'), item.get('time', ''), title, content)
+                )
+                if cur.rowcount == 1:
+                    cur.execute(
+                        "INSERT INTO news_fts(rowid, title, content) VALUES (?,?,?)",
+                        (cur.lastrowid, tokenize(title), tokenize(content))
+                    )
+                    added += 1
+            self.conn.commit()
+        return added
+
+    def sync_file(self, jsonl_path):
+        """ 将一个日文件补录入库 (已存在的 id 自动跳过) """
+        match = re.search(r'news_(\d{4}-\d{2}-\d{2})\.jsonl$', jsonl_path)
+        if not match: return 0
+        items = []
+        with open(jsonl_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip(): continue
+                try: items.append(json.loads(line))
+                except Exception: pass
+        return self.add_items(items, match.group(1))
+
+    def backfill(self, data_dir="data_news"):
+        total = 0
+        for path in sorted(glob.glob(os.path.join(data_dir, "news_*.jsonl"))):
+            total += self.sync_file(path)
+        return total
+
+    def search(self, query, start=None, end=None, source=None, limit=20):
+        """
+        BM25 关键词检索 (标题权重 2 倍)，可按时间窗 (epoch 秒) 与来源过滤
+        返回按相关度降序的 dict 列表，score 越大越相关
+        """
+        expr = _match_expression(query)
+        if not expr:
+            return []
+        sql = ("SELECT n.id, n.ts, n.time, n.source, n.title, n.content, bm25(news_fts, 2.0, 1.0) AS rank "
+               "FROM news_fts JOIN news n ON n.rowid = news_fts.rowid WHERE news_fts MATCH ?")
+        params = [expr]
+        if start is not None:
+            sql += " AND n.ts >= ?"; params.append(int(start))
+        if end is not None:
+            sql += " AND n.ts <= ?"; params.append(int(end))
+        if source:
+            sql += " AND n.source = ?"; params.append(source)
+        sql += " ORDER BY rank LIMIT ?"
+        params.append(int(limit))
+
+        with self.lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        return [
+            {"id": r[0], "ts": r[1], "time": r[2], "source": r[3], "title": r[4], "content": r[5], "score": round(-r[6], 3)}
+            for r in rows
+        ]
+
+    def search_recent(self, query, hours=72, limit=20):
+        end = datetime.now(BEIJING_TZ)
+        return self.search(query, (end - timedelta(hours=hours)).timestamp(), end.timestamp(), limit=limit)
+
+if __name__ == "__main__":
+    # 用法: python news_archive.py                 -> 全量补录 data_news
+    #       python news_archive.py 半导体 光刻机 720  -> 检索最近 720 小时
+    archive = NewsArchive()
+    if len(sys.argv) == 1:
+        print(f"📚 补录完成: 新增 {archive.backfill()} 条，库内共 {archive.count()} 条")
+    else:
+        args = sys.argv[1:]
+        hours = int(args.pop()) if len(args) > 1 and args[-1].isdigit() else 72
+        for r in archive.search_recent(" ".join(args), hours=hours):
+            print(f"[{r['time']}] ({r['score']:.2f}) {r['title']}")
@@ -0,0 +1,204 @@
+import bisect
+import hashlib
+import json
+import os
+import re
+import struct
+from datetime import datetime, timedelta, timezone
+
+# ==========================================
+# 🟢 新闻日文件侧车索引 (Sidecar Index)
+# 每个 news_YYYY-MM-DD.jsonl 旁维护一个同名 .idx 二进制文件
+# 定长记录: 16 字节 MD5 摘要 + 8 字节行偏移 + 4 字节行长度
+# 去重只需加载 .idx 做集合查询，偏移量支持随机读取任意一行
+# ==========================================
+ID_RECORD = struct.Struct("<16sQI")
+
+# 🟢 时间索引 .tidx: 入库时将时间归一化为 epoch 秒，按时间升序存放 (epoch, 偏移, 长度)
+TIME_RECORD = struct.Struct("<qQI")
+BEIJING_TZ = timezone(timedelta(hours=8))
+_DAY_PATTERN = re.compile(r'(\d{4}-\d{2}-\d{2})')
+
+def parse_news_epoch(time_str, day_str=None):
+    """
+    将混合格式的新闻时间统一转为 epoch 秒 (北京时间)
+    支持: '%Y-%m-%d %H:%M:%S' / '%Y-%m-%d %H:%M' / '%H:%M(:%S)' (需日文件日期) / 10 位时间戳
+    无法解析时返回所属日 00:00，保证仍落在当日查询范围内；均失败返回 None
+    """
+    s = str(time_str or '').strip()
+    if s.isdigit() and len(s) == 10:
+        return int(s)
+    for fmt, width in (("%Y-%m-%d %H:%M:%S", 19), ("%Y-%m-%d %H:%M", 16)):
+        try:
+            return int(datetime.strptime(s[:width], fmt).replace(tzinfo=BEIJING_TZ).timestamp())
+        except ValueError:
+            pass
+    if day_str:
+        for fmt in ("%H:%M:%S", "%H:%M"):
+            try:
+                t = datetime.strptime(s, fmt).time()
+                day = datetime.strptime(day_str, "%Y-%m-%d").date()
+                return int(datetime.combine(day, t, tzinfo=BEIJING_TZ).timestamp())
+            except ValueError:
+                pass
+        return int(datetime.strptime(day_str, "%Y-%m-%d").replace(tzinfo=BEIJING_TZ).timestamp())
+    return None
+
+def generate_news_id(item):
+    raw = f"{item.get('time','')}{item.get('title','')}"
+    return hashlib.md5(raw.encode('utf-8')).hexdigest()
+
+def news_id_digest(item):
+    """ 与 generate_news_id 同源的 16 字节定长摘要 """
+    return bytes.fromhex(generate_news_id(item))
+
+def _atomic_write(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+class NewsDayIndex:
+    """
+    单日新闻文件的 ID + 偏移索引，以及按时间排序的偏移索引
+    - 加载时校验索引覆盖范围，与 JSONL 不一致 (崩溃/手工编辑/git 合并) 时自动增量或全量重建
+    - append() 先落盘 JSONL 并 fsync，再以 rename 原子替换 .idx / .tidx
+    """
+    def __init__(self, jsonl_path):
+        self.path = jsonl_path
+        self.idx_path = os.path.splitext(jsonl_path)[0] + ".idx"
+        self.tidx_path = os.path.splitext(jsonl_path)[0] + ".tidx"
+        match = _DAY_PATTERN.search(os.path.basename(jsonl_path))
+        self.day_str = match.group(1) if match else None
+        self.entries = []        # [(digest, offset, length)]  追加顺序
+        self.time_entries = []   # [(epoch, offset, length)]   时间升序
+        self.ids = set()
+        self._load()
+        self._load_time_index()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, digest):
+        return digest in self.ids
+
+    def _load(self):
+        file_size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        if os.path.exists(self.idx_path):
+            with open(self.idx_path, 'rb') as f:
+                raw = f.read()
+            usable = len(raw) - len(raw) % ID_RECORD.size
+            self.entries = list(ID_RECORD.iter_unpack(raw[:usable]))
+
+        covered = self._covered_size()
+        if covered > file_size or not self._tail_matches():
+            self.entries = []
+            covered = 0
+
+        self.ids = {digest for digest, _, _ in self.entries}
+        if covered < file_size:
+            self.entries.extend(self._scan(covered))
+            self.ids = {digest for digest, _, _ in self.entries}
+            self._save()
+
+    def _covered_size(self):
+        if not self.entries:
+            return 0
+        _, offset, length = self.entries[-1]
+        return offset + length
+
+    def _tail_matches(self):
+        """ 抽查最后一条记录：偏移处的内容必须能还原出相同的摘要 """
+        if not self.entries:
+            return True
+        digest, offset, length = self.entries[-1]
+        try:
+            return news_id_digest(self.read_at(offset, length)) == digest
+        except Exception:
+            return False
+
+    def _scan(self, start):
+        entries = []
+        with open(self.path, 'rb') as f:
+            f.seek(start)
+            offset = start
+            for line in f:
+                length = len(line)
+                if line.strip():
+                    try:
+                        entries.append((news_id_digest(json.loads(line)), offset, length))
+                    except Exception:
+                        pass
+                offset += length
+        return entries
+
+    def _save(self):
+        _atomic_write(self.idx_path, b"".join(ID_RECORD.pack(*entry) for entry in self.entries))
+
+    def _load_time_index(self):
+        if os.path.exists(self.tidx_path):
+            with open(self.tidx_path, 'rb') as f:
+                raw = f.read()
+            usable = len(raw) - len(raw) % TIME_RECORD.size
+            self.time_entries = list(TIME_RECORD.iter_unpack(raw[:usable]))
+
+        # 条数或偏移集合与 ID 索引不一致即重建 (一次顺序读全文件)
+        if len(self.time_entries) != len(self.entries) or \
+                {offset for _, offset, _ in self.time_entries} != {offset for _, offset, _ in self.entries}:
+            self.time_entries = []
+            if self.entries:
+                with open(self.path, 'rb') as f:
+                    for _, offset, length in self.entries:
+                        f.seek(offset)
+                        try:
+                            epoch = self._epoch_of(json.loads(f.read(length)))
+                        except Exception:
+                            epoch = self._epoch_of({})
+                        self.time_entries.append((epoch, offset, length))
+            self.time_entries.sort()
+            self._save_time_index()
+
+    def _save_time_index(self):
+        _atomic_write(self.tidx_path, b"".join(TIME_RECORD.pack(*entry) for entry in self.time_entries))
+
+    def _epoch_of(self, item):
+        epoch = parse_news_epoch(item.get('time', ''), self.day_str)
+        return epoch if epoch is not None else 0
+
+    def range(self, start_epoch=None, end_epoch=None):
+        """ 二分定位 [start, end] 时间窗内的 (epoch, 偏移, 长度)，升序 """
+        lo = 0 if start_epoch is None else bisect.bisect_left(self.time_entries, (start_epoch,))
+        hi = len(self.time_entries) if end_epoch is None else bisect.bisect_left(self.time_entries, (end_epoch + 1,))
+        return self.time_entries[lo:hi]
+
+    def read_at(self, offset, length):
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            return json.loads(f.read(length))
+
+    def read(self, i):
+        _, offset, length = self.entries[i]
+        return self.read_at(offset, length)
+
+    def append(self, items):
+        """ 追加新闻 (调用方负责去重)，返回实际写入条数 """
+        if not items:
+            return 0
+        lines = [(json.dumps(item, ensure_ascii=False) + "\n").encode('utf-8') for item in items]
+        with open(self.path, 'ab') as f:
+            offset = f.tell()
+            f.write(b"".join(lines))
+            f.flush()
+            os.fsync(f.fileno())
+
+        for item, line in zip(items, lines):
+            digest = news_id_digest(item)
+            self.entries.append((digest, offset, len(line)))
+            self.ids.add(digest)
+            bisect.insort(self.time_entries, (self._epoch_of(item), offset, len(line)))
+            offset += len(line)
+        self._save()
+        self._save_time_index()
+        return len(items)
@@ -1,15 +1,21 @@
 import akshare as ak
+import asyncio
+import glob
 import json
 import os
 import time
 import requests
 import pandas as pd
 from datetime import datetime
-import hashlib
 import pytz
 import re
 import difflib  # 🟢 用于计算文本相似度
+import threading
 from bs4 import BeautifulSoup
+from news_index import NewsDayIndex, news_id_digest
+from news_archive import NewsArchive
+from news_entities import EntityCache
+from event_calendar import EventCalendar
 
 # --- Selenium 模块 ---
 try:
@@ -57,10 +63,6 @@ def get_beijing_time():
 def get_today_str():
     return get_beijing_time().strftime("%Y-%m-%d")
 
-def generate_news_id(item):
-    raw = f"{item.get('time','')}{item.get('title','')}"
-    return hashlib.md5(raw.encode('utf-8')).hexdigest()
-
 def clean_time_str(t_str):
     if not t_str: return ""
     try:
@@ -151,7 +153,7 @@ def fetch_eastmoney_direct():
         print(f"   ❌ [Plan B] 东财直连失败: {e}")
     return items
 
-def fetch_eastmoney():
+def fetch_eastmoney_akshare():
     items = []
     try:
         print("   - [Plan A] 正在抓取: 东方财富 (Akshare)...")
@@ -167,9 +169,16 @@ def fetch_eastmoney():
                     "time": public_time, "title": title, "content": content
                 })
             print(f"   - [Plan A] 成功获取 {len(items)} 条数据")
-            return items
     except Exception as e:
-        print(f"   ⚠️ Akshare 调用出错，切换至 Plan B...")
+        print(f"   ⚠️ Akshare 调用出错: {e}")
+    return items
+
+def fetch_eastmoney():
+    """ 同步兼容入口：Akshare 失败或为空时切换至 Plan B """
+    items = fetch_eastmoney_akshare()
+    if items:
+        return items
+    print(f"   ⚠️ Akshare 未返回数据，切换至 Plan B...")
     return fetch_eastmoney_direct()
 
 # ==========================================
@@ -302,135 +311,251 @@ def fetch_cls():
     return items
 
 # ==========================================
-# 主程序
+# 3. 异步并发调度核心
 # ==========================================
-def fetch_and_save_news():
-    today_date = get_today_str()
-    print(f"📡 [NewsLoader] 启动混合抓取 (Smart Mode) - {today_date}...")
-    
-    all_news_items = []
-
-    # 1. 东财 (抓取 + 评估清洗)
-    raw_em_items = fetch_eastmoney()
-    em_items = []
-    discarded_em_count = 0
-    for item in raw_em_items:
-        new_content, keep = evaluate_and_clean_news(item['title'], item['content'])
-        if keep:
+# 每个数据源: (主源, 备用源, 主源截止秒数, 主源最少条数)
+# 主源在截止时间内返回足量数据则不启动备用源；否则备用源与仍在运行的主源并行补充
+NEWS_SOURCES = {
+    "EM": (fetch_eastmoney_akshare, fetch_eastmoney_direct, 20, 1),
+    "CLS": (fetch_cls_api, fetch_cls_selenium, 15, 15),
+}
+CRAWL_HARD_TIMEOUT = 180  # 整轮抓取的硬上限 (秒)，超时后丢弃仍未返回的数据源 (守护线程不阻塞进程退出)
+
+def _clean_for_match(text):
+    return re.sub(r'[^\w\u4e00-\u9fa5]', '', text or '')
+
+class NewsDeduper:
+    """
+    流式去重器：新闻按到达顺序逐批喂入，先做价值评估清洗，
+    再与【其他数据源】已接纳的新闻做标题包含 + 正文相似度 (difflib/Jaccard) 双层拦截
+    """
+    def __init__(self):
+        self.accepted = []
+        self.clean_titles = {}   # source -> set
+        self.clean_texts = {}    # source -> set
+        self.seen_titles = {}    # source -> set (源内标题去重，兼容 API + Selenium 合并)
+        self.stats = {}          # source -> {"accepted", "discarded", "duplicate"}
+
+    def _is_cross_source_duplicate(self, source, clean_title, clean_text):
+        for other, titles in self.clean_titles.items():
+            if other == source: continue
+            # 拦截层级 1：纯净标题双向包含匹配
+            if len(clean_title) >= 5:
+                for seen_title in titles:
+                    if clean_title in seen_title or seen_title in clean_title:
+                        return True
+
+            # 拦截层级 2：纯净正文高精度比对 (结合 difflib 和 Jaccard)
+            if len(clean_text) >= 10:
+                for seen_text in self.clean_texts.get(other, ()):
+                    if clean_text in seen_text or seen_text in clean_text:
+                        return True
+                    prefix, seen_prefix = clean_text[:100], seen_text[:100]
+                    sim_ratio = difflib.SequenceMatcher(None, prefix, seen_prefix).quick_ratio()
+                    jaccard_ratio = calculate_jaccard_similarity(prefix, seen_prefix)
+                    if sim_ratio > 0.75 or jaccard_ratio > 0.7:
+                        return True
+        return False
+
+    def feed(self, source, items):
+        stats = self.stats.setdefault(source, {"accepted": 0, "discarded": 0, "duplicate": 0})
+        seen_titles = self.seen_titles.setdefault(source, set())
+        for item in items:
+            if item['title'] in seen_titles: continue
+            seen_titles.add(item['title'])
+
+            new_content, keep = evaluate_and_clean_news(item['title'], item['content'])
+            if not keep:
+                stats['discarded'] += 1
+                continue
             item['content'] = new_content
-            em_items.append(item)
-        else:
-            discarded_em_count += 1
-            
-    if discarded_em_count > 0:
-        print(f"   🗑️ [清洗] 剔除了 {discarded_em_count} 条东财低价值新闻。")
-
-    all_news_items.extend(em_items)
-
-    # 🟢 构建东财新闻纯净文本池与纯净标题池 (仅使用清洗后的高质量数据)
-    em_clean_texts = set()
-    em_clean_titles = set()
-    for item in em_items:
-        clean_text = re.sub(r'[^\w\u4e00-\u9fa5]', '', item.get('content', '') + item.get('title', ''))
-        clean_title = re.sub(r'[^\w\u4e00-\u9fa5]', '', item.get('title', ''))
-        
-        if len(clean_text) >= 10: 
-            em_clean_texts.add(clean_text)
-        if len(clean_title) >= 5:
-            em_clean_titles.add(clean_title)
 
-    print(f"⏳ 正在启动财联社抓取任务...")
-    
-    # 2. 财联社 (抓取)
-    cls_items_raw = fetch_cls()
+            clean_text = _clean_for_match(item.get('content', '') + item.get('title', ''))
+            clean_title = _clean_for_match(item.get('title', ''))
+            if self._is_cross_source_duplicate(source, clean_title, clean_text):
+                stats['duplicate'] += 1
+                continue
+
+            if len(clean_text) >= 10:
+                self.clean_texts.setdefault(source, set()).add(clean_text)
+            if len(clean_title) >= 5:
+                self.clean_titles.setdefault(source, set()).add(clean_title)
+            item['source'] = source
+            self.accepted.append(item)
+            stats['accepted'] += 1
+
+def _resolve(future, result, error):
+    if not future.done():
+        future.set_exception(error) if error is not None else future.set_result(result)
+
+def _run_in_daemon(loop, func, name):
+    """
+    在守护线程中执行阻塞抓取，返回 asyncio future
+    不用线程池: concurrent.futures 会在解释器退出时 join 工作线程，卡死的 Selenium / HTTP 源会拖住整个进程
+    """
+    future = loop.create_future()
+    def runner():
+        try:
+            result, error = func(), None
+        except Exception as e:
+            result, error = None, e
+        try:
+            loop.call_soon_threadsafe(_resolve, future, result, error)
+        except RuntimeError:
+            pass   # 事件循环已结束 (超过硬上限被放弃)，结果丢弃
+    threading.Thread(target=runner, name=f"news-{name}", daemon=True).start()
+    return future
+
+async def _crawl_source(name, primary, fallback, deadline, min_items, queue):
+    """ 单数据源调度：主源限时等待，不达标再并行启动备用源，数据一到即推入队列 """
+    loop = asyncio.get_running_loop()
+    started = time.time()
+    primary_future = _run_in_daemon(loop, primary, name)
+    delivered = 0
+    pending = set()
+    try:
+        items = await asyncio.wait_for(asyncio.shield(primary_future), timeout=deadline)
+        if items:
+            await queue.put((name, items))
+            delivered = len(items)
+    except asyncio.TimeoutError:
+        print(f"   ⏱️ [{name}] 主源 {deadline}s 内未返回，启动备用源并行补充...")
+        pending.add(primary_future)
+    except Exception as e:
+        print(f"   ⚠️ [{name}] 主源异常: {e}")
 
-    # 🟢 核心优化：清洗财联社数据 + 多维度拦截重复新闻
-    cls_items_filtered = []
-    filtered_duplicate_count = 0
-    discarded_cls_count = 0
-    
-    for item in cls_items_raw:
-        # 首先进行价值评估清洗
-        new_content, keep = evaluate_and_clean_news(item['title'], item['content'])
-        if not keep:
-            discarded_cls_count += 1
+    if delivered >= min_items:
+        print(f"   ✅ [{name}] 主源完成: {delivered} 条 ({time.time() - started:.1f}s)")
+        return
+
+    if not pending:
+        print(f"   ⚠️ [{name}] 主源数据偏少 ({delivered} 条)，启动备用源补充...")
+    pending.add(_run_in_daemon(loop, fallback, name))
+    for future in asyncio.as_completed(pending):
+        try:
+            items = await future
+        except Exception as e:
+            print(f"   ⚠️ [{name}] 抓取异常: {e}")
             continue
-            
-        item['content'] = new_content
-        
-        cls_clean_text = re.sub(r'[^\w\u4e00-\u9fa5]', '', item.get('content', '') + item.get('title', ''))
-        cls_clean_title = re.sub(r'[^\w\u4e00-\u9fa5]', '', item.get('title', ''))
-        is_duplicate = False
-        
-        # 拦截层级 1：纯净标题双向包含匹配
-        if len(cls_clean_title) >= 5:
-            for em_title in em_clean_titles:
-                if cls_clean_title in em_title or em_title in cls_clean_title:
-                    is_duplicate = True
-                    break
-
-        # 拦截层级 2：纯净正文高精度比对 (结合 difflib 和 Jaccard)
-        if not is_duplicate and len(cls_clean_text) >= 10:
-            for em_text in em_clean_texts:
-                if cls_clean_text in em_text or em_text in cls_clean_text:
-                    is_duplicate = True
-                    break
-                
-                # 双维度相似度计算：弥补单一算法的缺陷
-                cls_prefix, em_prefix = cls_clean_text[:100], em_text[:100]
-                sim_ratio = difflib.SequenceMatcher(None, cls_prefix, em_prefix).quick_ratio()
-                jaccard_ratio = calculate_jaccard_similarity(cls_prefix, em_prefix)
-                
-                # 只要任意一种相似度达到阈值，就判定为重复
-                if sim_ratio > 0.75 or jaccard_ratio > 0.7:
-                    is_duplicate = True
-                    break
-                    
-        if is_duplicate:
-            filtered_duplicate_count += 1
-        else:
-            cls_items_filtered.append(item)
+        if items:
+            await queue.put((name, items))
+            delivered += len(items)
+    print(f"   ✅ [{name}] 主备源完成: {delivered} 条 ({time.time() - started:.1f}s)")
+
+async def crawl_all_sources():
+    """ 所有数据源并发抓取，结果流式进入去重器；总耗时取决于最慢的数据源 """
+    deduper = NewsDeduper()
+    queue = asyncio.Queue()
+
+    producers = [
+        asyncio.create_task(_crawl_source(name, primary, fallback, deadline, min_items, queue))
+        for name, (primary, fallback, deadline, min_items) in NEWS_SOURCES.items()
+    ]
+
+    async def _close_queue():
+        await asyncio.gather(*producers, return_exceptions=True)
+        await queue.put(None)
+    closer = asyncio.create_task(_close_queue())
+
+    loop = asyncio.get_running_loop()
+    hard_deadline = loop.time() + CRAWL_HARD_TIMEOUT
+    try:
+        while True:
+            remaining = hard_deadline - loop.time()
+            if remaining <= 0:
+                raise asyncio.TimeoutError
+            batch = await asyncio.wait_for(queue.get(), timeout=remaining)
+            if batch is None: break
+            deduper.feed(*batch)
+    except asyncio.TimeoutError:
+        print(f"   ⏱️ 抓取超过硬上限 {CRAWL_HARD_TIMEOUT}s，放弃仍未返回的数据源")
+        # 卡死的抓取线程 (如 Selenium) 是守护线程，不等待，也不阻塞进程退出；已到达的数据照常入库
+        for task in producers: task.cancel()
+        closer.cancel()
+    return deduper
 
-    if discarded_cls_count > 0:
-        print(f"   🗑️ [清洗] 剔除了 {discarded_cls_count} 条财联社低价值新闻。")
-    if filtered_duplicate_count > 0:
-        print(f"   🛡️ [去重] 发现 {filtered_duplicate_count} 条财联社新闻已在东财中播报过，自动拦截过滤。")
+# ==========================================
+# 主程序
+# ==========================================
+def fetch_and_save_news():
+    """ 抓取全部新闻源并入库，返回新增条数 """
+    today_date = get_today_str()
+    print(f"📡 [NewsLoader] 启动并发抓取 (Async Mode) - {today_date}...")
+
+    deduper = asyncio.run(crawl_all_sources())
+    all_news_items = deduper.accepted
 
-    all_news_items.extend(cls_items_filtered)
+    for source, stats in deduper.stats.items():
+        if stats['discarded'] > 0:
+            print(f"   🗑️ [清洗] 剔除了 {stats['discarded']} 条 {source} 低价值新闻。")
+        if stats['duplicate'] > 0:
+            print(f"   🛡️ [去重] 发现 {stats['duplicate']} 条 {source} 新闻已被其他源播报过，自动拦截过滤。")
 
     # 3. 入库
     if not all_news_items:
         print("⚠️ 未获取到任何有效新闻数据")
-        return
+        return 0
 
     today_file = os.path.join(DATA_DIR, f"news_{today_date}.jsonl")
-    existing_ids = set()
-    
-    # 🟢 由于本地不再存 id 字段，读取时动态生成历史数据的 id 以用于去重
-    if os.path.exists(today_file):
-        with open(today_file, 'r', encoding='utf-8') as f:
-            for line in f:
-                try:
-                    saved_item = json.loads(line)
-                    existing_ids.add(generate_news_id(saved_item))
-                except: pass
-
-    new_count = 0
+    # 🟢 侧车索引直接提供已入库 id 集合，无需重读并重新哈希整个日文件
+    day_index = NewsDayIndex(today_file)
+
     all_news_items.sort(key=lambda x: x['time'], reverse=True)
 
-    with open(today_file, 'a', encoding='utf-8') as f:
-        for item in all_news_items:
-            # 🟢 在内存中动态计算 id 进行比对，不再将 id 写入 item 字典
-            item_id = generate_news_id(item)
-            if item_id not in existing_ids:
-                # 确保字典内干净，直接序列化
-                item.pop('source', None)
-                item.pop('id', None)
-                f.write(json.dumps(item, ensure_ascii=False) + "\n")
-                existing_ids.add(item_id)
-                new_count += 1
+    new_items = []
+    new_sources = []
+    batch_ids = set()
+    for item in all_news_items:
+        item_id = news_id_digest(item)
+        if item_id in day_index or item_id in batch_ids: continue
+        # 确保字典内干净，直接序列化 (来源只进检索库，不写入 JSONL)
+        new_sources.append(item.pop('source', None))
+        item.pop('id', None)
+        new_items.append(item)
+        batch_ids.add(item_id)
+
+    new_count = day_index.append(new_items)
+
+    # 🟢 入库即抽取实体并写入缓存，分析端不再逐条重跑 jieba
+    try:
+        entity_cache = EntityCache(today_file)
+        for item in new_items:
+            entity_cache.get(item)
+        entity_cache.save()
+    except Exception as e:
+        print(f"   ⚠️ [Entity] 实体缓存写入失败: {e}")
+
+    # 🟢 入库即抽取带日期的事件写入事件日历；日历丢失 (缓存未命中) 时回扫近期日文件重建
+    try:
+        calendar = EventCalendar()
+        if len(calendar) == 0:
+            calendar.rebuild(DATA_DIR)
+        else:
+            calendar.add_items(new_items, today_date)
+        calendar.prune()
+        calendar.save()
+        print(f"   📅 [Calendar] 事件日历共 {len(calendar)} 个事件")
+    except Exception as e:
+        print(f"   ⚠️ [Calendar] 事件日历写入失败: {e}")
+
+    # 🟢 同步写入全文检索库；库为空 (首次运行/缓存丢失) 时全量补录历史日文件
+    try:
+        archive = NewsArchive()
+        if archive.count() == 0:
+            print(f"📚 [Archive] 检索库为空，正在补录历史新闻...")
+            archive.backfill(DATA_DIR)
+        else:
+            archive.add_items(new_items, today_date, new_sources)
+            # 补齐缓存恢复后其他任务在近几日追加、但未进入本地检索库的新闻
+            for path in sorted(glob.glob(os.path.join(DATA_DIR, "news_*.jsonl")))[-3:]:
+                archive.sync_file(path)
+        archive.close()
+    except Exception as e:
+        print(f"   ⚠️ [Archive] 检索库写入失败 (不影响 JSONL 入库): {e}")
     
-    print(f"✅ 入库完成: 新增 {new_count} 条 (EM:{len(em_items)} | CLS:{len(cls_items_filtered)})")
+    summary = " | ".join(f"{source}:{stats['accepted']}" for source, stats in deduper.stats.items())
+    print(f"✅ 入库完成: 新增 {new_count} 条 ({summary})")
+    return new_count
 
 if __name__ == "__main__":
     fetch_and_save_news()
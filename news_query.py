@@ -0,0 +1,122 @@
+import os
+import json
+import threading
+from datetime import datetime, timedelta
+
+from news_index import NewsDayIndex, BEIJING_TZ
+
+# 按优先级查找日文件的目录 (兼容旧版把 news_*.jsonl 放在根目录的情况)
+NEWS_DIRS = ["data_news", "."]
+
+def _to_epoch(value):
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=BEIJING_TZ)
+    return int(value.timestamp())
+
+def _match_filters(item, filters):
+    if not filters:
+        return True
+    title = str(item.get('title', '')).strip()
+    if len(title) < filters.get('min_title_len', 0):
+        return False
+    title_keywords = filters.get('title_keywords')
+    if title_keywords and not any(k in title for k in title_keywords):
+        return False
+    keywords = filters.get('keywords')
+    if keywords:
+        text = f"{title} {item.get('content') or item.get('digest') or ''}"
+        if not any(k in text for k in keywords):
+            return False
+    predicate = filters.get('predicate')
+    if predicate and not predicate(item):
+        return False
+    return True
+
+class NewsQuery:
+    """
+    新闻时间窗查询层
+    基于每日 .tidx 时间索引二分定位，只读取命中时间窗的行，多日回溯与单日读取成本一致
+    """
+    def __init__(self, news_dirs=None):
+        self.news_dirs = news_dirs or NEWS_DIRS
+        self._indexes = {}   # path -> (size, NewsDayIndex)
+        self._lock = threading.Lock()
+
+    def day_path(self, day_str):
+        for d in self.news_dirs:
+            p = os.path.join(d, f"news_{day_str}.jsonl")
+            if os.path.exists(p):
+                return p
+        return None
+
+    def _day_index(self, path):
+        """ 日文件未变化 (大小相同) 时复用已加载的索引 """
+        size = os.path.getsize(path)
+        with self._lock:
+            cached = self._indexes.get(path)
+            if cached and cached[0] == size:
+                return cached[1]
+            index = NewsDayIndex(path)
+            self._indexes[path] = (size, index)
+            return index
+
+    def available_days(self, start, end):
+        # 凌晨抓取的日文件会含前一日深夜的新闻，因此多查一天
+        start_day = datetime.fromtimestamp(start, BEIJING_TZ).date()
+        end_day = datetime.fromtimestamp(end, BEIJING_TZ).date() + timedelta(days=1)
+        days = []
+        day = start_day
+        while day <= end_day:
+            path = self.day_path(day.strftime("%Y-%m-%d"))
+            if path: days.append(path)
+            day += timedelta(days=1)
+        return days
+
+    def query(self, start=None, end=None, filters=None, newest_first=True, limit=None):
+        """
+        流式返回 [start, end] 时间窗内的新闻 (dict，附带归一化的 'ts' 与所属日文件 'day' 字段)
+        start/end: datetime (无时区按北京时间) 或 epoch 秒；默认 end=现在, start=当日 0 点
+        filters: {'keywords': [...], 'title_keywords': [...], 'min_title_len': int, 'predicate': callable}
+        """
+        now = datetime.now(BEIJING_TZ)
+        end_epoch = _to_epoch(end) if end is not None else int(now.timestamp())
+        if start is None:
+            start = datetime.fromtimestamp(end_epoch, BEIJING_TZ).replace(hour=0, minute=0, second=0, microsecond=0)
+        start_epoch = _to_epoch(start)
+        if start_epoch > end_epoch:
+            return
+
+        paths = self.available_days(start_epoch, end_epoch)
+        if newest_first:
+            paths.reverse()
+
+        emitted = 0
+        for path in paths:
+            index = self._day_index(path)
+            entries = index.range(start_epoch, end_epoch)
+            if newest_first:
+                entries = reversed(entries)
+            with open(path, 'rb') as f:
+                for epoch, offset, length in entries:
+                    f.seek(offset)
+                    try:
+                        item = json.loads(f.read(length))
+                    except Exception:
+                        continue
+                    if not _match_filters(item, filters):
+                        continue
+                    item['ts'] = epoch
+                    item['day'] = index.day_str
+                    yield item
+                    emitted += 1
+                    if limit and emitted >= limit:
+                        return
+
+    def query_hours(self, hours, filters=None, newest_first=True, limit=None):
+        """ 最近 N 小时的新闻，如 query_hours(72) """
+        end = datetime.now(BEIJING_TZ)
+        return self.query(end - timedelta(hours=hours), end, filters, newest_first, limit)
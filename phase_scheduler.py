@@ -0,0 +1,58 @@
+import time
+import threading
+
+# ==========================================
+# 🟢 Phase 1 截止时间调度 (Deadline Scheduler)
+# 整个分析进程共享一个全局时间预算；每次 LLM 调用领取 min(单次上限, 预算剩余) 的截止时间，
+# 标的按优先级 (持仓 > 技术分/情绪分) 排队，预算耗尽后剩余标的走规则兜底，保证报告与邮件照常发出
+# ==========================================
+DEFAULT_RUN_BUDGET_MIN = 45      # main.py 总预算 (Actions 任务上限 60 分钟，扣除安装与抓取)
+DEFAULT_RESERVE_MIN = 12         # 为 Phase 2 风控 / CIO 研判 / 渲染发信保留的时间
+DEFAULT_CALL_TIMEOUT = 300       # 单次 IC 调用上限 (秒)
+MIN_CALL_SECONDS = 45            # 剩余不足该值时不再发起新的 LLM 调用
+
+class DeadlineExceeded(Exception):
+    """ LLM 调用超过分配的截止时间 """
+
+class TimeBudget:
+    """
+    以 time.monotonic() 为基准的时间预算
+    run_deadline: 整个进程的截止时刻；phase1_deadline: 在其之前预留后续阶段所需时间
+    """
+    def __init__(self, started=None, run_budget_min=DEFAULT_RUN_BUDGET_MIN,
+                 reserve_min=DEFAULT_RESERVE_MIN, call_timeout=DEFAULT_CALL_TIMEOUT):
+        self.started = started if started is not None else time.monotonic()
+        self.run_deadline = self.started + run_budget_min * 60
+        self.phase1_deadline = self.run_deadline - reserve_min * 60
+        self.call_timeout = call_timeout
+        self.lock = threading.Lock()
+        self.degraded = []
+
+    @classmethod
+    def from_config(cls, global_cfg, started=None):
+        return cls(
+            started,
+            run_budget_min=global_cfg.get('run_budget_minutes', DEFAULT_RUN_BUDGET_MIN),
+            reserve_min=global_cfg.get('post_phase1_reserve_minutes', DEFAULT_RESERVE_MIN),
+            call_timeout=global_cfg.get('ic_call_timeout', DEFAULT_CALL_TIMEOUT),
+        )
+
+    def remaining(self, deadline=None):
+        return (deadline or self.run_deadline) - time.monotonic()
+
+    def call_deadline(self):
+        """ 为一次 Phase 1 LLM 调用分配截止时刻；预算不足时返回 None """
+        now = time.monotonic()
+        if self.phase1_deadline - now < MIN_CALL_SECONDS:
+            return None
+        return min(now + self.call_timeout, self.phase1_deadline)
+
+    def mark_degraded(self, name):
+        with self.lock:
+            self.degraded.append(name)
+
+def phase1_priority(prep, held_codes, rag_hits):
+    """ 排序键 (越小越先): 持仓标的优先，其次按 max(技术分, 情绪分) 降序 """
+    code = str(prep['fund']['code'])
+    hype = rag_hits.get(prep['fund']['name'], {}).get('hype', 0)
+    return (0 if code in held_codes else 1, -max(prep['tech'].get('quant_score', 0), hype))
@@ -0,0 +1,80 @@
+import os
+
+from utils import logger
+from portfolio_tracker import PortfolioTracker
+from trade_ledger import LEDGER_PATH
+
+# ==========================================
+# 🟢 多账户 (Portfolio Accounts)
+# 行情 / 技术指标 / RAG / IC 与风控的 LLM 调用每次运行只做一遍，
+# 仅仓位计算、记账与出报告按账户展开；每个账户有独立的账本、成交明细、预算与风险偏好。
+# config.yaml 未配置 portfolios 时退化为单一默认账户 (portfolio.json + 全局预算)，行为与单账户完全一致
+# ==========================================
+DEFAULT_ACCOUNT = "default"
+PORTFOLIO_DIR = "portfolios"
+ALL_MODES = ("A", "B", "C", "D")
+
+class PortfolioAccount:
+    def __init__(self, name, tracker, base_invest_amount, max_daily_invest, allowed_modes=ALL_MODES,
+                 title=None, email_to_env=None):
+        self.name = name
+        self.tracker = tracker
+        self.base_invest_amount = base_invest_amount
+        self.max_daily_invest = max_daily_invest
+        self.allowed_modes = tuple(allowed_modes)
+        self.title = title or name
+        self.email_to_env = email_to_env
+
+    def gate_decisions(self, decisions, modes, regime_modes=None):
+        """
+        账户风险偏好: 不在 allowed_modes 内的轨道不开新仓 (按 D 轨防守处理，破位仍会减仓)；
+        regime_modes 为市场水位允许的轨道，与账户偏好取交集
+        """
+        allowed = set(self.allowed_modes) if regime_modes is None else set(self.allowed_modes) & set(regime_modes)
+        return [d if d != "EXECUTE" or m in allowed else "HOLD" for d, m in zip(decisions, modes)]
+
+    def email_to(self):
+        return os.getenv(self.email_to_env) if self.email_to_env else None
+
+    def held_codes(self):
+        return {str(code) for code, pos in self.tracker.portfolio.items() if pos.get('shares', 0) > 0}
+
+def account_specs(config):
+    """ 规范化 portfolios 配置；第一个账户沿用 portfolio.json 与默认成交明细，其余按账户名分文件 """
+    global_cfg = config.get('global', {})
+    specs = config.get('portfolios') or [{"name": DEFAULT_ACCOUNT}]
+    normalized = []
+    for i, spec in enumerate(specs):
+        name = str(spec.get('name') or f"account{i + 1}")
+        if i == 0:
+            default_file, default_ledger = "portfolio.json", LEDGER_PATH
+        else:
+            default_file = os.path.join(PORTFOLIO_DIR, f"{name}.json")
+            default_ledger = os.path.join("data_cache", f"trade_ledger_{name}.npz")
+        normalized.append({
+            "name": name,
+            "file": spec.get('file', default_file),
+            "ledger": spec.get('ledger', default_ledger),
+            "base_invest_amount": spec.get('base_invest_amount', global_cfg.get('base_invest_amount', 1000)),
+            "max_daily_invest": spec.get('max_daily_invest', global_cfg.get('max_daily_invest', 5000)),
+            "allowed_modes": [str(m).upper() for m in spec.get('allowed_modes', ALL_MODES)],
+            "title": spec.get('title'),
+            "email_to_env": spec.get('email_to_env'),
+        })
+    names = [s['name'] for s in normalized]
+    if len(set(names)) != len(names):
+        raise ValueError(f"portfolios 账户名重复: {names}")
+    return normalized
+
+def open_accounts(config):
+    accounts = []
+    for spec in account_specs(config):
+        os.makedirs(os.path.dirname(spec['file']) or ".", exist_ok=True)
+        tracker = PortfolioTracker(spec['file'], ledger_path=spec['ledger'])
+        accounts.append(PortfolioAccount(
+            spec['name'], tracker, spec['base_invest_amount'], spec['max_daily_invest'],
+            spec['allowed_modes'], spec['title'], spec['email_to_env'],
+        ))
+    if len(accounts) > 1:
+        logger.info(f"💼 多账户运行: {', '.join(a.name for a in accounts)} (共享分析，仅仓位/记账/报告按账户展开)")
+    return accounts
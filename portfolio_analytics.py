@@ -0,0 +1,162 @@
+import numpy as np
+import pandas as pd
+
+from utils import logger
+
+# ==========================================
+# 🟢 持仓绩效分析 (Portfolio Analytics)
+# 成交明细 (trade_ledger) × 行情面板 一次联表：日期 × 标的 矩阵上向量化计算
+# 每日持仓、市值、成本、已实现 / 未实现盈亏、净值 (按收盘成交的时间加权收益) 与回撤，
+# 不再依赖 portfolio.json 中截断的 history 与均价
+# ==========================================
+
+def trade_frame(trades):
+    """ 列字典 (trade_ledger.load_trades) -> 按 (标的, 日期, 顺序) 排好的 DataFrame """
+    df = pd.DataFrame({name: np.asarray(col) for name, col in trades.items()})
+    if df.empty:
+        return df
+    df['date'] = pd.to_datetime(df['date'], errors='coerce')
+    df = df.dropna(subset=['date'])
+    return df.sort_values(['code', 'date', 'seq'], kind='mergesort').reset_index(drop=True)
+
+def cost_basis(df):
+    """
+    均价法逐笔成本 (向量化): 持仓成本总额满足 B_k = a_k·B_{k-1} + b_k
+      买入 a=1, b=成交额；卖出 a=剩余份额/原份额, b=0
+    清仓行 B 归零并开启新的分段，段内 a>0，可用累乘 / 累加闭式求解:
+      B_k = P_k · Σ b_j / P_j,  P_k = Π a_j
+    返回 (每笔成交后的成本总额, 每笔卖出的已实现盈亏)
+    """
+    shares = df['shares'].to_numpy(float)
+    amount = df['amount'].to_numpy(float)
+    codes = df['code'].to_numpy()
+    qty_after = df.groupby('code', sort=False)['shares'].cumsum().to_numpy(copy=True)
+    qty_after[np.abs(qty_after) < 1e-6] = 0.0
+    qty_before = qty_after - shares
+    first = np.r_[True, codes[1:] != codes[:-1]]
+
+    is_sell = shares < 0
+    closed = qty_after <= 0
+    a = np.ones(len(df))
+    held = is_sell & (qty_before > 0) & ~closed
+    a[held] = qty_after[held] / qty_before[held]
+    b = np.where(is_sell, 0.0, amount)
+
+    # 每次清仓后的下一笔开启新段；段首前无持仓成本
+    segment = np.cumsum(first | np.r_[False, closed[:-1]])
+    growth = pd.Series(a).groupby(segment).cumprod().to_numpy()
+    basis = growth * pd.Series(b / growth).groupby(segment).cumsum().to_numpy()
+    basis[closed] = 0.0
+
+    prev_basis = np.where(first, 0.0, np.r_[0.0, basis[:-1]])
+    avg_before = np.divide(prev_basis, qty_before, out=np.zeros(len(df)), where=qty_before > 0)
+    realized = np.where(is_sell, -shares * (df['price'].to_numpy(float) - avg_before), 0.0)
+    return basis, realized
+
+def _load_closes(codes, price_loader):
+    closes = {}
+    for code in codes:
+        try:
+            hist = price_loader(code)
+        except Exception as e:
+            logger.warning(f"⚠️ [Analytics] {code} 行情读取失败: {e}")
+            continue
+        if hist is not None and not hist.empty and 'close' in hist.columns:
+            closes[code] = hist['close'][~hist.index.duplicated(keep='last')]
+    return closes
+
+def analyze_portfolio(trades, price_loader, as_of=None):
+    """
+    trades: 成交明细列字典；price_loader: code -> 带 close 列、日期索引的行情 DataFrame (行情面板)
+    返回 {as_of, summary, funds, daily}；daily 为逐日净值 / 市值 / 盈亏 DataFrame
+    """
+    df = trade_frame(trades)
+    if df.empty:
+        return {"as_of": as_of, "summary": {}, "funds": {}, "daily": pd.DataFrame()}
+
+    df['basis'], df['realized'] = cost_basis(df)
+    codes = list(dict.fromkeys(df['code']))
+    as_of = pd.Timestamp(as_of) if as_of is not None else pd.Timestamp.now().normalize()
+    start = df['date'].min()
+
+    closes = _load_closes(codes, price_loader)
+
+    # 日期轴 = 交易日 ∪ 成交日 (非交易日的成交也有落点)
+    dates = pd.DatetimeIndex(df['date']).append([s.index for s in closes.values()]).unique().sort_values()
+    dates = dates[(dates >= start) & (dates <= max(as_of, df['date'].max()))]
+
+    n_days, n_codes = len(dates), len(codes)
+    row = dates.searchsorted(df['date'])
+    col = pd.Index(codes).get_indexer(df['code'])
+
+    flow_shares = np.zeros((n_days, n_codes))
+    np.add.at(flow_shares, (row, col), df['shares'].to_numpy(float))
+    realized = np.zeros((n_days, n_codes))
+    np.add.at(realized, (row, col), df['realized'].to_numpy(float))
+    flows = np.zeros(n_days)
+    np.add.at(flows, row, df['amount'].to_numpy(float))
+
+    # 当日最后一笔成交后的成本总额 / 成交价，向后填充到下一笔
+    last = df.assign(row=row, col=col).drop_duplicates(['row', 'col'], keep='last')
+    basis = np.full((n_days, n_codes), np.nan)
+    basis[last['row'], last['col']] = last['basis']
+    basis = pd.DataFrame(basis).ffill().fillna(0.0).to_numpy()
+    trade_px = np.full((n_days, n_codes), np.nan)
+    trade_px[last['row'], last['col']] = last['price']
+
+    close = pd.DataFrame(closes, columns=codes).reindex(dates).ffill().to_numpy(float)
+    close = np.where(np.isnan(close), pd.DataFrame(trade_px).ffill().to_numpy(), close)   # 缺行情时按最近成交价估值
+
+    holdings = np.cumsum(flow_shares, axis=0)
+    holdings[np.abs(holdings) < 1e-6] = 0.0
+    market_value = np.nan_to_num(holdings * close)
+    unrealized = market_value - basis
+    realized_cum = np.cumsum(realized, axis=0)
+
+    # 成交均按收盘价发生: r_t = (MV_t - MV_{t-1} - F_t) / MV_{t-1}，空仓日收益为 0
+    total_mv = market_value.sum(axis=1)
+    prev_mv = np.r_[0.0, total_mv[:-1]]
+    returns = np.divide(total_mv - prev_mv - flows, prev_mv, out=np.zeros(n_days), where=prev_mv > 1e-6)
+    nav = np.cumprod(1.0 + returns)
+    drawdown = nav / np.maximum.accumulate(nav) - 1.0
+
+    daily = pd.DataFrame({
+        "nav": nav, "return": returns, "drawdown": drawdown, "flow": flows,
+        "market_value": total_mv, "cost_basis": basis.sum(axis=1),
+        "unrealized_pnl": unrealized.sum(axis=1), "realized_pnl": realized_cum.sum(axis=1),
+    }, index=dates)
+
+    end_mv = market_value[-1]
+    total_end_mv = end_mv.sum()
+    names = df.drop_duplicates('code', keep='last').set_index('code')['name']
+    funds = {}
+    for j, code in enumerate(codes):
+        shares = holdings[-1, j]
+        funds[code] = {
+            "name": names.get(code, ""),
+            "shares": round(float(shares), 2),
+            "avg_cost": round(float(basis[-1, j] / shares), 4) if shares > 0 else 0.0,
+            "last_price": round(float(close[-1, j]), 4) if not np.isnan(close[-1, j]) else None,
+            "market_value": round(float(end_mv[j]), 2),
+            "weight": round(float(end_mv[j] / total_end_mv), 4) if total_end_mv > 0 else 0.0,
+            "unrealized_pnl": round(float(unrealized[-1, j]), 2),
+            "unrealized_pct": round(float(unrealized[-1, j] / basis[-1, j] * 100), 2) if basis[-1, j] > 0 else 0.0,
+            "realized_pnl": round(float(realized_cum[-1, j]), 2),
+            "trades": int((col == j).sum()),
+        }
+
+    summary = {
+        "start": dates[0].strftime("%Y-%m-%d"),
+        "market_value": round(float(total_end_mv), 2),
+        "cost_basis": round(float(basis[-1].sum()), 2),
+        "unrealized_pnl": round(float(unrealized[-1].sum()), 2),
+        "realized_pnl": round(float(realized_cum[-1].sum()), 2),
+        "total_pnl": round(float(unrealized[-1].sum() + realized_cum[-1].sum()), 2),
+        "nav": round(float(nav[-1]), 4),
+        "cumulative_return_pct": round(float((nav[-1] - 1) * 100), 2),
+        "max_drawdown_pct": round(float(drawdown.min() * 100), 2),
+        "current_drawdown_pct": round(float(drawdown[-1] * 100), 2),
+        "positions": int((holdings[-1] > 0).sum()),
+        "trades": len(df),
+    }
+    return {"as_of": dates[-1].strftime("%Y-%m-%d"), "summary": summary, "funds": funds, "daily": daily}
@@ -1,23 +1,182 @@
+import copy
 import json
+import math
 import os
 import threading
 from datetime import datetime
 from utils import logger
+from news_index import _atomic_write
+from trade_ledger import LEDGER_PATH, new_trade, open_ledger, append_trades, seed_rows, load_trades
+
+# ==========================================
+# 🟢 账本预写日志 (Write-Ahead Journal)
+# 每次变更只向 portfolio.journal 追加一行 "变更后持仓镜像" (after-image)，不再整体重写 portfolio.json；
+# 加载时 快照 + 按序重放日志 即为最新账本 (镜像覆盖写，重放幂等)。
+# 日志超过阈值或运行结束时压缩: 先把日志中的成交并入完整成交明细 (trade_ledger)，
+# 再以 rename 原子替换快照并清空日志，中途崩溃重放结果不变
+# ==========================================
+JOURNAL_SUFFIX = ".journal"
+COMPACT_THRESHOLD = 64      # 日志记录数超过该值时自动压缩
+
+def journal_path_for(filepath):
+    return os.path.splitext(filepath)[0] + JOURNAL_SUFFIX
+
+def read_journal(journal_path):
+    """ 返回 (记录列表, 是否存在残缺行)；残缺只可能出现在崩溃时的最后一行 """
+    records, torn = [], False
+    if not os.path.exists(journal_path):
+        return records, torn
+    with open(journal_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip(): continue
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                torn = True
+                break
+    return records, torn
+
+def replay(portfolio, records):
+    """ 按序应用日志，返回尚未并入成交明细的成交行 (reset 记录自带保留的成交) """
+    pending = []
+    for record in records:
+        if record.get('op') == 'reset':
+            portfolio.clear()
+            portfolio.update(record['portfolio'])
+            pending = list(record.get('trades', []))
+            continue
+        for code, pos in record.get('set', {}).items():
+            portfolio[code] = pos
+        if record.get('trade'):
+            pending.append(record['trade'])
+        pending.extend(record.get('trades', []))   # 批量交易 (apply_batch) 一条记录携带多笔成交
+    return pending
+
+def load_ledger(filepath='portfolio.json'):
+    """ 只读加载 快照 + 日志 (供查询服务等旁路读取，不触发压缩) """
+    portfolio = {}
+    if os.path.exists(filepath):
+        with open(filepath, 'r', encoding='utf-8') as f:
+            portfolio = json.load(f)
+    records, _ = read_journal(journal_path_for(filepath))
+    replay(portfolio, records)
+    return portfolio
+
+def apply_trade(portfolio, code, name, amount_or_value, price, is_sell=False):
+    """ 在给定持仓字典上撮合一笔交易 (均价法)，返回成交明细行；未成交 (无可卖份额) 返回 None """
+    if code not in portfolio:
+        portfolio[code] = {
+            "name": name,
+            "shares": 0,
+            "cost": 0.0,
+            "held_days": 0,
+            "history": []
+        }
+    
+    pos = portfolio[code]
+    # 运行时防御
+    if 'shares' not in pos: pos['shares'] = 0
+    if 'cost' not in pos: pos['cost'] = 0.0
+    if 'held_days' not in pos: pos['held_days'] = 0
+    if 'history' not in pos: pos['history'] = []
+
+    shares_change = amount_or_value / price
+    
+    record = {
+        "date": datetime.now().strftime("%Y-%m-%d"),
+        "price": round(price, 3),
+        "s": "S" if is_sell else "B"
+    }
+
+    if is_sell:
+        real_sell_shares = min(pos['shares'], shares_change)
+        pos['shares'] = max(0, pos['shares'] - real_sell_shares)
+        record['amt'] = -int(real_sell_shares * price)
+        traded_shares = -real_sell_shares
+        
+        if pos['shares'] == 0:
+            pos['cost'] = 0.0 
+            pos['held_days'] = 0
+    else:
+        old_value = pos['shares'] * pos['cost']
+        new_invest = shares_change * price
+        total_shares = pos['shares'] + shares_change
+        
+        if total_shares > 0:
+            new_cost = (old_value + new_invest) / total_shares
+            pos['cost'] = round(new_cost, 4)
+        
+        pos['shares'] = total_shares
+        record['amt'] = int(amount_or_value)
+        traded_shares = shares_change
+        if pos['held_days'] == 0:
+            pos['held_days'] = 1
+
+    pos['history'].append(record)
+    if len(pos['history']) > 10:
+        pos['history'] = pos['history'][-10:]
+
+    if not traded_shares:
+        return None
+    return new_trade(record["date"], code, name, "S" if is_sell else "B", price, traded_shares)
+
+def validate_order(order):
+    try:
+        return (bool(str(order['code'])) and order.get('name') is not None
+                and math.isfinite(order['price']) and order['price'] > 0
+                and math.isfinite(order['amount']) and order['amount'] >= 0)
+    except (KeyError, TypeError):
+        return False
+
+def batch_diff(before, after, touched, trades):
+    """ 批量交易前后的持仓变化摘要 """
+    positions = {}
+    for code in touched:
+        shares_before, cost_before = before.get(code, (0, 0.0))
+        pos = after[code]
+        positions[code] = {
+            "name": pos.get('name'),
+            "shares_before": round(shares_before, 2), "shares_after": round(pos['shares'], 2),
+            "cost_before": cost_before, "cost_after": pos['cost'],
+            "amount": round(sum(t['amount'] for t in trades if t['code'] == code), 2),
+        }
+    return {
+        "positions": positions,
+        "bought": sum(t['amount'] for t in trades if t['shares'] > 0),
+        "sold": -sum(t['amount'] for t in trades if t['shares'] < 0),
+        "opened": [c for c, d in positions.items() if d['shares_before'] <= 0 < d['shares_after']],
+        "closed": [c for c, d in positions.items() if d['shares_before'] > 0 >= d['shares_after']],
+    }
 
 class PortfolioTracker:
-    def __init__(self, filepath='portfolio.json'):
+    def __init__(self, filepath='portfolio.json', ledger_path=LEDGER_PATH):
         self.filepath = filepath
-        self.lock = threading.Lock()
+        self.journal_path = journal_path_for(filepath)
+        self.ledger_path = ledger_path
+        self.pending_trades = []   # 已写入日志、尚未并入成交明细的成交
+        self.lock = threading.RLock()
+        self._journal_file = None
+        self._journal_count = 0
         self._load_portfolio()
 
     def _load_portfolio(self):
-        if not os.path.exists(self.filepath):
+        if not os.path.exists(self.filepath) and not os.path.exists(self.journal_path):
             self.portfolio = {}
             self._save_portfolio()
         else:
             try:
-                with open(self.filepath, 'r', encoding='utf-8') as f:
-                    self.portfolio = json.load(f)
+                self.portfolio = {}
+                if os.path.exists(self.filepath):
+                    with open(self.filepath, 'r', encoding='utf-8') as f:
+                        self.portfolio = json.load(f)
+                if self.portfolio and not os.path.exists(self.ledger_path):
+                    self._seed_ledger()
+                records, torn = read_journal(self.journal_path)
+                self.pending_trades = replay(self.portfolio, records)
+                self._journal_count = len(records)
+                if records:
+                    logger.info(f"📒 账本日志重放 {len(records)} 条变更")
+                
                 
                 # [V14.12 修复] 数据自愈：自动补全旧版数据的缺失字段
                 dirty = False
@@ -38,17 +197,86 @@ class PortfolioTracker:
                 if dirty:
                     self._save_portfolio()
                     logger.info("🔧 检测到旧版账本数据，已自动补全缺失字段 (Self-Healing).")
+                elif torn or self._journal_count > COMPACT_THRESHOLD:
+                    # 崩溃留下的残缺尾行不能再往后追加，立即压缩
+                    self._save_portfolio()
 
             except Exception as e:
                 logger.error(f"账本加载失败: {e}, 重置为空账本")
                 self.portfolio = {}
 
+    def _seed_ledger(self):
+        """ 首次启用成交明细时，用快照中保留的 history 补齐期初成交 """
+        table = open_ledger(self.ledger_path)
+        added = append_trades(table, seed_rows(self.portfolio))
+        table.save()
+        logger.info(f"📒 成交明细初始化: 由账本 history 补录 {added} 笔")
+
     def _save_portfolio(self):
+        """ 压缩: 成交并入明细 -> 原子替换完整快照 -> 清空日志；任一步失败则保留日志 """
+        with self.lock:
+            try:
+                if self.pending_trades:
+                    table = open_ledger(self.ledger_path)
+                    append_trades(table, self.pending_trades)
+                    table.save()
+                    self.pending_trades = []
+                data = json.dumps(self.portfolio, indent=2, ensure_ascii=False).encode('utf-8')
+                _atomic_write(self.filepath, data)
+                self._close_journal()
+                _atomic_write(self.journal_path, b"")
+                self._journal_count = 0
+            except Exception as e:
+                logger.error(f"账本保存失败: {e}")
+
+    def compact(self):
+        self._save_portfolio()
+
+    def trades(self):
+        """ 完整成交明细 (含日志中尚未并入的部分)，列字典形式 """
+        return load_trades(self.ledger_path, self.pending_trades)
+
+    def _close_journal(self):
+        if self._journal_file is not None:
+            self._journal_file.close()
+            self._journal_file = None
+
+    def _append(self, record):
+        """ 追加一条日志并立即 fsync """
+        with self.lock:
+            if self._journal_file is None:
+                self._journal_file = open(self.journal_path, 'a', encoding='utf-8')
+            self._journal_count += 1
+            record = dict(record, seq=self._journal_count, ts=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+            self._journal_file.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + "\n")
+            self._journal_file.flush()
+            os.fsync(self._journal_file.fileno())
+            if self._journal_count > COMPACT_THRESHOLD:
+                self._save_portfolio()
+
+    def _log_positions(self, op, codes, trade=None):
+        record = {"op": op, "set": {code: self.portfolio[code] for code in codes}}
+        if trade is not None:
+            record["trade"] = trade
+            self.pending_trades.append(trade)
         try:
-            with open(self.filepath, 'w', encoding='utf-8') as f:
-                json.dump(self.portfolio, f, indent=2, ensure_ascii=False)
+            self._append(record)
         except Exception as e:
-            logger.error(f"账本保存失败: {e}")
+            logger.error(f"账本日志写入失败: {e}")
+
+    def replace_portfolio(self, portfolio, trades=None):
+        """
+        整体替换账本 (断点续跑还原快照)：先写入一条完整镜像，再压缩
+        trades 为该快照对应、需要保留的成交；日志中其余未并入明细的成交随回滚一并丢弃
+        """
+        with self.lock:
+            self.portfolio = portfolio
+            self.pending_trades = list(trades or [])
+            try:
+                self._append({"op": "reset", "portfolio": portfolio, "trades": self.pending_trades})
+            except Exception as e:
+                logger.error(f"账本日志写入失败: {e}")
+            self._save_portfolio()
 
     def get_position(self, code):
         if code not in self.portfolio:
@@ -63,59 +291,54 @@ class PortfolioTracker:
 
     def add_trade(self, code, name, amount_or_value, price, is_sell=False):
         if price <= 0: return
+        with self.lock:
+            trade = apply_trade(self.portfolio, code, name, amount_or_value, price, is_sell)
+            self._log_positions("trade", [code], trade)
+        logger.info(f"⚖️ 账本更新 {name}: {'卖出' if is_sell else '买入'} | 最新成本: {self.portfolio[code].get('cost',0):.3f}")
+        return trade
 
-        if code not in self.portfolio:
-            self.portfolio[code] = {
-                "name": name,
-                "shares": 0,
-                "cost": 0.0,
-                "held_days": 0,
-                "history": []
-            }
-        
-        pos = self.portfolio[code]
-        # 运行时防御
-        if 'shares' not in pos: pos['shares'] = 0
-        if 'cost' not in pos: pos['cost'] = 0.0
-        if 'held_days' not in pos: pos['held_days'] = 0
-        if 'history' not in pos: pos['history'] = []
+    def apply_batch(self, orders):
+        """
+        一次性应用当日全部指令: orders 为 [{code, name, amount, price, is_sell}]
+        (买入 amount 为金额，卖出为拟卖市值)。先整体校验，再在持仓副本上逐笔撮合，
+        最后以一条日志记录 (一次 fsync) 提交；校验或写日志失败时账本保持不变
+        返回变更摘要 (含逐笔成交行 trades)
+        """
+        invalid = [o.get('code') for o in orders if not validate_order(o)]
+        if invalid:
+            raise ValueError(f"非法交易指令: {invalid}")
+        with self.lock:
+            codes = list(dict.fromkeys(str(o['code']) for o in orders))
+            scratch = {code: copy.deepcopy(self.portfolio[code]) for code in codes if code in self.portfolio}
+            before = {code: (pos.get('shares', 0), pos.get('cost', 0.0)) for code, pos in scratch.items()}
+            trades = []
+            for o in orders:
+                if o['amount'] <= 0: continue
+                trade = apply_trade(scratch, str(o['code']), o['name'], o['amount'], o['price'], o.get('is_sell', False))
+                if trade is not None:
+                    trades.append(trade)
+            touched = list(dict.fromkeys(t['code'] for t in trades))
+            if touched:
+                # 先替换内存账本再写日志 (写日志可能触发压缩)，写日志失败时回滚
+                previous = {code: self.portfolio.get(code) for code in touched}
+                pending_len = len(self.pending_trades)
+                self.portfolio.update({code: scratch[code] for code in touched})
+                self.pending_trades.extend(trades)
+                try:
+                    self._append({"op": "batch", "set": {code: scratch[code] for code in touched}, "trades": trades})
+                except Exception:
+                    for code, pos in previous.items():
+                        if pos is None: self.portfolio.pop(code, None)
+                        else: self.portfolio[code] = pos
+                    del self.pending_trades[pending_len:]
+                    raise
 
-        shares_change = amount_or_value / price
-        
-        record = {
-            "date": datetime.now().strftime("%Y-%m-%d"),
-            "price": round(price, 3),
-            "s": "S" if is_sell else "B"
-        }
-
-        if is_sell:
-            real_sell_shares = min(pos['shares'], shares_change)
-            pos['shares'] = max(0, pos['shares'] - real_sell_shares)
-            record['amt'] = -int(real_sell_shares * price)
-            
-            if pos['shares'] == 0:
-                pos['cost'] = 0.0 
-                pos['held_days'] = 0
-        else:
-            old_value = pos['shares'] * pos['cost']
-            new_invest = shares_change * price
-            total_shares = pos['shares'] + shares_change
-            
-            if total_shares > 0:
-                new_cost = (old_value + new_invest) / total_shares
-                pos['cost'] = round(new_cost, 4)
-            
-            pos['shares'] = total_shares
-            record['amt'] = int(amount_or_value)
-            if pos['held_days'] == 0:
-                pos['held_days'] = 1
-
-        pos['history'].append(record)
-        if len(pos['history']) > 10:
-            pos['history'] = pos['history'][-10:]
-
-        self._save_portfolio()
-        logger.info(f"⚖️ 账本更新 {name}: {'卖出' if is_sell else '买入'} | 最新成本: {pos.get('cost',0):.3f}")
+        diff = batch_diff(before, scratch, touched, trades)
+        diff["orders"] = len(orders)
+        diff["trades"] = trades
+        logger.info(f"⚖️ 账本批量更新: {len(orders)} 条指令 -> {len(trades)} 笔成交 "
+                    f"(买入 {diff['bought']:.0f} / 卖出 {diff['sold']:.0f}，开仓 {len(diff['opened'])} / 清仓 {len(diff['closed'])})")
+        return diff
 
     def record_signal(self, code, signal):
         pass 
@@ -127,7 +350,9 @@ class PortfolioTracker:
         
     def confirm_trades(self):
         # [V14.12 修复] 使用 .get() 安全访问
+        held = []
         for code, pos in self.portfolio.items():
             if pos.get('shares', 0) > 0:
                 pos['held_days'] = pos.get('held_days', 0) + 1
-        self._save_portfolio()
+                held.append(code)
+        self._log_positions("confirm", held)
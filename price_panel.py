@@ -0,0 +1,79 @@
+import os
+import hashlib
+import threading
+import pandas as pd
+
+# ==========================================
+# 🟢 行情面板缓存 (Price Panel)
+# data_cache/*.csv 按文件 (mtime, size) 失效的内存缓存：文件未被行情刷新改写时直接返回已解析的 DataFrame，
+# 常驻进程 (advisor_daemon) 内多次分析只重读当轮真正更新过的标的
+# ==========================================
+NUMERIC_COLS = ['open', 'high', 'low', 'close', 'volume', 'amount']
+
+def read_price_csv(path):
+    """ 读取单只标的的历史行情并清洗 (日期索引升序、数值化、剔除 0 价格行) """
+    df = pd.read_csv(path)
+    if 'date' in df.columns:
+        df['date'] = pd.to_datetime(df['date'])
+        df.set_index('date', inplace=True)
+    df.sort_index(inplace=True)
+
+    for col in NUMERIC_COLS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+
+    # 🟢 自动排毒，删掉之前保存进去的 0.0 错误行
+    return df[df['close'] > 0.001]
+
+class PricePanel:
+    def __init__(self):
+        self._frames = {}   # path -> ((mtime_ns, size), DataFrame)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.loads = 0
+
+    @staticmethod
+    def stamp(path):
+        """ 文件失效戳 (mtime_ns, size)；文件不存在时为 None """
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    @staticmethod
+    def content_stamp(path, tail_bytes=512):
+        """
+        按文件内容的版本戳 (size, 末尾 tail_bytes 字节的 md5)：只读文件尾，不解析 CSV；
+        与 mtime 无关，重新 checkout 或内容不变的重写后仍然相同，可用作跨运行持久缓存的键。文件不存在时为 None
+        """
+        try:
+            with open(path, 'rb') as f:
+                size = f.seek(0, os.SEEK_END)
+                f.seek(max(0, size - tail_bytes))
+                return (size, hashlib.md5(f.read()).hexdigest()[:16])
+        except FileNotFoundError:
+            return None
+
+    def get(self, path):
+        """ 返回副本，调用方 (技术指标计算) 可以原地修改 """
+        stamp = self.stamp(path)
+        if stamp is None:
+            raise FileNotFoundError(path)
+        with self._lock:
+            cached = self._frames.get(path)
+            if cached and cached[0] == stamp:
+                self.hits += 1
+                return cached[1].copy()
+        df = read_price_csv(path)
+        with self._lock:
+            self._frames[path] = (stamp, df)
+            self.loads += 1
+        return df.copy()
+
+    def invalidate(self, path=None):
+        with self._lock:
+            if path is None:
+                self._frames.clear()
+            else:
+                self._frames.pop(path, None)
@@ -0,0 +1,183 @@
+import os
+import sys
+import json
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from utils import logger
+from news_index import _atomic_write
+from run_checkpoint import _json_default
+from portfolio_tracker import load_ledger, journal_path_for
+
+# ==========================================
+# 🟢 本地查询 API (Query API)
+# 分析运行结束时把每只基金的技术指标 / RAG 命中 / IC 结论导出为快照，本服务把快照与账本 (portfolio.json + 日志)
+# 预先编码成各端点的响应字节，后台线程按文件 mtime 热更新；请求路径只做字典查找，
+# 不解析 CSV、不调用 LLM。
+#   GET /funds                       全部标的的决策摘要
+#   GET /fund/{code}                 单只标的全部信息
+#   GET /fund/{code}/technicals      技术指标
+#   GET /fund/{code}/rag             RAG 情绪分与检索情报
+#   GET /fund/{code}/ic              IC 投委会结论与最终执行决策
+#   GET /portfolio                   当前持仓账本
+#   GET /health                      快照时间与加载状态
+# 用法: python query_api.py [端口]
+# ==========================================
+SNAPSHOT_PATH = os.path.join("data_cache", "query_snapshot.json")
+PORTFOLIO_PATH = "portfolio.json"
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8766
+RELOAD_INTERVAL_SEC = 2
+FUND_SECTIONS = ("technicals", "rag", "ic")
+
+def _encode(obj):
+    return json.dumps(obj, ensure_ascii=False, default=_json_default, separators=(',', ':')).encode('utf-8')
+
+# --- 写端: 由 main.py 在每次运行结束时调用 ---
+def build_snapshot(generated_at, proposals, final_results, rag_hits, rag_contexts):
+    """
+    proposals: Phase 1 提案 (含 tech / ic_res)；final_results: Phase 3 执行结果；
+    rag_hits: fund_name -> 打分；rag_contexts: fund_name -> RAG 情报 JSON 串
+    """
+    finals = {str(r['code']): r for r in final_results}
+    funds = {}
+    for p in proposals:
+        code, name = str(p['code']), p['name']
+        final = finals.get(code, {})
+        context = rag_contexts.get(name)
+        try:
+            context = json.loads(context) if isinstance(context, str) else context
+        except ValueError:
+            pass
+        funds[code] = {
+            "code": code,
+            "name": name,
+            "technicals": p['tech'],
+            "rag": dict(rag_hits.get(name, {}), context=context),
+            "ic": {
+                "proposal": p['decision'],
+                "fallback": p.get('fallback', False),
+                "verdict": p['ic_res'].get('chairman_verdict', {}),
+                "days_to_event": p['ic_res'].get('days_to_event'),
+                "final_decision": final.get('decision'),
+                "amount": final.get('amount', 0),
+                "is_sell": final.get('is_sell', False),
+            },
+        }
+    return {"generated_at": generated_at, "funds": funds}
+
+def write_snapshot(snapshot, path=SNAPSHOT_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    _atomic_write(path, _encode(snapshot))
+
+# --- 读端 ---
+class ResponseCache:
+    """ 路径 -> 预编码响应字节；快照或账本文件变化时整体重建后原子替换 """
+    def __init__(self, snapshot_path=SNAPSHOT_PATH, portfolio_path=PORTFOLIO_PATH):
+        self.snapshot_path = snapshot_path
+        self.portfolio_path = portfolio_path
+        self.stamps = {}
+        self.routes = {}
+        self.generated_at = None
+        self.reload()
+
+    def _stamp(self, path):
+        try:
+            stat = os.stat(path)
+            return (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return None
+
+    def _load_json(self, path, default):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return default
+
+    def reload(self, force=False):
+        """ 文件未变化时不做任何事，返回是否重建 """
+        stamps = {p: self._stamp(p) for p in (self.snapshot_path, self.portfolio_path, journal_path_for(self.portfolio_path))}
+        if not force and stamps == self.stamps:
+            return False
+        snapshot = self._load_json(self.snapshot_path, {"generated_at": None, "funds": {}})
+        try:
+            portfolio = load_ledger(self.portfolio_path)   # 快照 + 账本日志
+        except (OSError, ValueError):
+            portfolio = {}
+
+        routes = {}
+        summary = []
+        for code, fund in snapshot.get("funds", {}).items():
+            routes[f"/fund/{code}"] = _encode(fund)
+            for section in FUND_SECTIONS:
+                routes[f"/fund/{code}/{section}"] = _encode({"code": code, "name": fund.get("name"), section: fund.get(section)})
+            summary.append({
+                "code": code, "name": fund.get("name"),
+                "decision": fund.get("ic", {}).get("final_decision"),
+                "quant_score": fund.get("technicals", {}).get("quant_score"),
+                "hype": fund.get("rag", {}).get("hype"),
+            })
+        holdings = {code: pos for code, pos in portfolio.items() if pos.get('shares', 0) > 0}
+        routes["/funds"] = _encode({"generated_at": snapshot.get("generated_at"), "funds": summary})
+        routes["/portfolio"] = _encode({"positions": portfolio, "holding_codes": sorted(holdings)})
+        routes["/health"] = _encode({"ok": True, "generated_at": snapshot.get("generated_at"), "funds": len(summary)})
+
+        self.routes = routes   # 单次引用替换，读线程无需加锁
+        self.stamps = stamps
+        self.generated_at = snapshot.get("generated_at")
+        return True
+
+    def watch(self, stop, interval=RELOAD_INTERVAL_SEC):
+        while not stop.wait(interval):
+            try:
+                if self.reload():
+                    logger.info(f"🔄 [QueryAPI] 快照已重新加载 ({self.generated_at})")
+            except Exception as e:
+                logger.warning(f"⚠️ [QueryAPI] 快照重新加载失败: {e}")
+
+NOT_FOUND = _encode({"ok": False, "error": "not found"})
+
+class QueryHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive，压测与频繁查询免去重复建连
+    disable_nagle_algorithm = True  # 响应头与正文分两次写出，不关闭 Nagle 会与对端延迟 ACK 叠加出 ~40ms 停顿
+
+    def do_GET(self):
+        body = self.server.cache.routes.get(self.path.split('?', 1)[0].rstrip('/') or '/')
+        status = 200 if body is not None else 404
+        body = body if body is not None else NOT_FOUND
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass   # 逐请求日志会成为延迟的主要部分
+
+class QueryServer(ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128        # 默认 backlog 只有 5，并发建连时溢出会触发 1s 的 SYN 重传
+
+def start_server(host=DEFAULT_HOST, port=DEFAULT_PORT, cache=None):
+    """ 在后台线程中启动服务，返回 (server, stop_event)；常驻进程 (advisor_daemon) 复用该入口 """
+    server = QueryServer((host, port), QueryHandler)
+    server.cache = cache or ResponseCache()
+    stop = threading.Event()
+    threading.Thread(target=server.serve_forever, name="query-api", daemon=True).start()
+    threading.Thread(target=server.cache.watch, args=(stop,), name="query-api-reload", daemon=True).start()
+    return server, stop
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_PORT
+    server, stop = start_server(port=port)
+    print(f"🛰️ [QueryAPI] 监听 http://{DEFAULT_HOST}:{server.server_address[1]} "
+          f"(快照 {server.cache.generated_at or '未生成'}，{len(server.cache.routes)} 个端点)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stop.set()
+        server.shutdown()
@@ -0,0 +1,251 @@
+import io
+import os
+import hashlib
+import threading
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from utils import logger
+from news_index import _atomic_write
+
+# ==========================================
+# 🟢 组合风险引擎 (Risk Engine)
+# 由行情面板构建 日期 × 标的 收益矩阵，一次性向量化计算全市场协方差 / 相关系数 / beta 与滚动相关，
+# 再对当前持仓给出历史 VaR、参数 VaR、情景冲击与因子集中度，为风控委员会提供硬数据
+# (替代 POST_VALIDATION_RULES / CIO_PRE_FILTER 中只能交给模型 "目测" 的文字阈值)。
+# 模型按 (交易日, 标的集合, 各行情 CSV 的内容版本戳) 缓存: 命中时不读行情文件，进程内复用，
+# 并落盘 data_cache/risk_model.npz 供同日后续运行直接载入
+# ==========================================
+MODEL_PATH = os.path.join("data_cache", "risk_model.npz")
+DEFAULT_RISK_CONFIG = {
+    "history_days": 250,            # 收益矩阵回看交易日 (历史 VaR 样本)
+    "window_days": 60,              # 协方差 / 相关系数窗口
+    "min_obs": 40,                  # 有效收益少于该值的标的不进入模型
+    "confidence": [0.95, 0.99],
+    "concentration_corr": 0.7,      # 前三大持仓平均相关超过该值视为因子集中 (对应测试5)
+}
+# 情景冲击: market 为全市场等权收益的冲击 (按各标的 beta 传导)，keywords 为命中名称 / 板块关键词的额外冲击
+DEFAULT_SCENARIOS = [
+    {"name": "大盘急跌", "market": -0.05, "keywords": {}},
+    {"name": "科技杀估值", "market": -0.02, "keywords": {"半导体 芯片 科创 人工智能 软件 计算机 通信": -0.08}},
+    {"name": "地缘冲突升级", "market": -0.03, "keywords": {"黄金": 0.03, "油气 原油 石油 能源": 0.05, "军工": 0.04}},
+    {"name": "外资流出/美元走强", "market": -0.02, "keywords": {"恒生 港股 纳斯达克 标普 海外 中概": -0.06}},
+]
+
+def risk_config(config):
+    cfg = dict(DEFAULT_RISK_CONFIG, scenarios=DEFAULT_SCENARIOS)
+    cfg.update(config.get('risk') or {})
+    return cfg
+
+def returns_matrix(codes, price_loader, history_days, min_obs):
+    """ 收盘价对齐 (停牌日前值填充) 后的日收益矩阵；返回 (收益 DataFrame, 最新收盘价 Series) """
+    closes = {}
+    for code in codes:
+        try:
+            hist = price_loader(code)
+        except Exception as e:
+            logger.warning(f"⚠️ [Risk] {code} 行情读取失败: {e}")
+            continue
+        if hist is not None and not hist.empty and 'close' in hist.columns:
+            closes[str(code)] = hist['close'][~hist.index.duplicated(keep='last')]
+    if not closes:
+        return pd.DataFrame(), pd.Series(dtype=float)
+    panel = pd.DataFrame(closes).sort_index().ffill().iloc[-(history_days + 1):]
+    returns = panel.pct_change().iloc[1:]
+    returns = returns.loc[:, returns.notna().sum() >= min_obs]
+    return returns.fillna(0.0), panel.iloc[-1][returns.columns]
+
+def _corr_from_cov(cov):
+    vol = np.sqrt(np.clip(np.diagonal(cov, axis1=-2, axis2=-1), 1e-18, None))
+    return cov / (vol[..., :, None] * vol[..., None, :])
+
+def rolling_cov(returns, window):
+    """ (T, N) -> (T-window+1, N, N)，全部窗口一次 einsum 计算 """
+    windows = sliding_window_view(returns, window, axis=0)        # (T-w+1, N, w)
+    centered = windows - windows.mean(axis=2, keepdims=True)
+    return np.einsum('tiw,tjw->tij', centered, centered) / (window - 1)
+
+class RiskModel:
+    def __init__(self, codes, dates, returns, last_close, window):
+        self.codes = list(codes)
+        self.index = {code: i for i, code in enumerate(self.codes)}
+        self.dates = dates
+        self.returns = returns                      # (T, N) 日收益
+        self.last_close = last_close                # (N,)
+        self.window = window
+        recent = returns[-window:]
+        self.mean = recent.mean(axis=0)
+        self.cov = np.cov(recent, rowvar=False, ddof=1).reshape(len(self.codes), len(self.codes))
+        self.vol = np.sqrt(np.diag(self.cov))
+        self.corr = _corr_from_cov(self.cov)
+        market = recent.mean(axis=1)                # 全市场等权收益作为 "市场因子"
+        self.beta = (recent - self.mean).T @ (market - market.mean()) / max(window - 1, 1) / max(market.var(ddof=1), 1e-18)
+        self._rolling = None
+
+    @property
+    def rolling_corr(self):
+        """ 逐日滚动相关矩阵 (T-window+1, N, N)，首次访问时计算 """
+        if self._rolling is None:
+            self._rolling = _corr_from_cov(rolling_cov(self.returns, self.window)) if len(self.returns) >= self.window else None
+        return self._rolling
+
+    # --- 组合层面 ---
+    def exposure(self, positions):
+        """ {code: shares} -> 按最新收盘价计的市值向量 (模型外的标的忽略) """
+        value = np.zeros(len(self.codes))
+        for code, shares in positions.items():
+            i = self.index.get(str(code))
+            if i is not None and shares > 0:
+                value[i] = shares * self.last_close[i]
+        return value
+
+    def var(self, value, confidence):
+        """ 市值向量的 历史 / 参数 VaR 与 CVaR (金额，正数表示损失) """
+        pnl = self.returns @ value
+        sigma = float(np.sqrt(value @ self.cov @ value))
+        out = {}
+        for c in confidence:
+            tail = pnl[pnl <= np.quantile(pnl, 1 - c)]
+            key = int(round(c * 100))
+            out[f"hist_var_{key}"] = float(-np.quantile(pnl, 1 - c))
+            out[f"hist_cvar_{key}"] = float(-tail.mean()) if len(tail) else 0.0
+            out[f"param_var_{key}"] = float(NormalDist().inv_cdf(c) * sigma - self.mean @ value)
+        out["daily_vol"] = sigma
+        return out
+
+    def scenario_shocks(self, value, scenarios, fund_texts):
+        """ 情景冲击损益: 冲击矩阵 (情景 × 标的) @ 市值向量 """
+        shocks = np.zeros((len(scenarios), len(self.codes)))
+        texts = [fund_texts.get(code, "") for code in self.codes]
+        for s, scenario in enumerate(scenarios):
+            shocks[s] = self.beta * scenario.get("market", 0.0)
+            for words, shock in scenario.get("keywords", {}).items():
+                hit = np.array([any(w in text for w in words.split()) for text in texts])
+                shocks[s] += hit * shock
+        pnl = shocks @ value
+        return [{"scenario": sc["name"], "pnl": round(float(p), 2)} for sc, p in zip(scenarios, pnl)]
+
+    def portfolio_risk(self, positions, cfg, fund_texts=None, names=None):
+        value = self.exposure(positions)
+        total = value.sum()
+        if total <= 0:
+            return {"market_value": 0.0, "holdings": 0}
+        names = names or {}
+        weights = value / total
+        held = np.flatnonzero(value > 0)
+        var = self.var(value, cfg["confidence"])
+        pct = lambda x: round(float(x / total * 100), 2)
+
+        top = held[np.argsort(-weights[held])][:3]
+        top_corr = self.corr[np.ix_(top, top)][np.triu_indices(len(top), 1)]
+        avg_top_corr = float(top_corr.mean()) if len(top_corr) else 0.0
+        pair = self.corr[np.ix_(held, held)]
+        iu = np.triu_indices(len(held), 1)
+        avg_corr = float(pair[iu].mean()) if len(held) > 1 else 0.0
+        corr_trend = None
+        if self.rolling_corr is not None and len(held) > 1:
+            series = self.rolling_corr[:, held][:, :, held][:, iu[0], iu[1]].mean(axis=1)
+            corr_trend = {"now": round(float(series[-1]), 3), "20d_ago": round(float(series[max(-21, -len(series))]), 3)}
+
+        return {
+            "market_value": round(float(total), 2),
+            "holdings": int(len(held)),
+            "daily_vol_pct": pct(var["daily_vol"]),
+            "var_pct": {k: pct(v) for k, v in var.items() if k != "daily_vol"},
+            "var_amount": {k: round(v, 2) for k, v in var.items() if k != "daily_vol"},
+            "avg_pairwise_corr": round(avg_corr, 3),
+            "holding_corr_trend": corr_trend,
+            "effective_bets": round(float(1.0 / (weights[held] ** 2).sum()), 2),
+            "diversification_ratio": round(float(weights @ self.vol / max(var["daily_vol"] / total, 1e-12)), 2),
+            "top3": [{"code": self.codes[i], "name": names.get(self.codes[i], ""), "weight": round(float(weights[i]), 3)} for i in top],
+            "top3_avg_corr": round(avg_top_corr, 3),
+            "factor_concentration": "HIGH" if avg_top_corr > cfg["concentration_corr"] else ("MEDIUM" if avg_top_corr > 0.4 else "LOW"),
+            "scenarios": [dict(s, pnl_pct=pct(s["pnl"])) for s in self.scenario_shocks(value, cfg["scenarios"], fund_texts or {})],
+        }
+
+    def candidate_risk(self, codes, positions, amount, cfg, names=None):
+        """ 每个候选: 年化波动、beta、与现有持仓的相关性，以及按 amount 加仓后的参数 VaR 增量 (一次矩阵运算) """
+        names = names or {}
+        value = self.exposure(positions)
+        held = np.flatnonzero(value > 0)
+        c = max(cfg["confidence"])
+        z = NormalDist().inv_cdf(c)
+        base_sigma = float(np.sqrt(value @ self.cov @ value))
+        idx = np.array([self.index[str(code)] for code in codes if str(code) in self.index], dtype=int)
+        if not len(idx):
+            return {}
+        # 加仓后组合方差: σ² + 2a·(Σv)_i + a²·Σ_ii，对全部候选一次算出
+        cov_v = self.cov @ value
+        new_sigma = np.sqrt(np.clip(base_sigma ** 2 + 2 * amount * cov_v[idx] + amount ** 2 * np.diag(self.cov)[idx], 0, None))
+        port_vol = max(base_sigma, 1e-12)
+        corr_port = cov_v[idx] / (self.vol[idx] * port_vol) if base_sigma > 0 else np.zeros(len(idx))
+        out = {}
+        for k, i in enumerate(idx):
+            entry = {
+                "ann_vol_pct": round(float(self.vol[i] * np.sqrt(252) * 100), 1),
+                "beta": round(float(self.beta[i]), 2),
+                "corr_to_portfolio": round(float(corr_port[k]), 3),
+                f"incremental_var_{int(round(c * 100))}": round(float(z * (new_sigma[k] - base_sigma)), 2),
+            }
+            if len(held):
+                others = held[held != i]
+                if len(others):
+                    j = others[np.argmax(self.corr[i, others])]
+                    entry["max_corr_holding"] = {"code": self.codes[j], "name": names.get(self.codes[j], ""),
+                                                 "corr": round(float(self.corr[i, j]), 3)}
+            out[self.codes[i]] = entry
+        return out
+
+    # --- 缓存 ---
+    def save(self, path, key):
+        buf = io.BytesIO()
+        np.savez_compressed(buf, key=key, codes=np.array(self.codes), dates=np.array(self.dates),
+                            returns=self.returns, last_close=self.last_close, window=self.window)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        _atomic_write(path, buf.getvalue())
+
+    @classmethod
+    def load(cls, path, key):
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                if str(data['key']) != key:
+                    return None
+                return cls(data['codes'].tolist(), data['dates'].tolist(), data['returns'], data['last_close'], int(data['window']))
+        except (OSError, KeyError, ValueError):
+            return None
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+def _model_key(day, stamps, cfg):
+    """ stamps: {code: 内容版本戳 或 None}，任一行情文件内容变化即失效 (与 mtime 无关，跨 checkout 仍可命中磁盘缓存) """
+    stamp_text = ",".join(f"{code}:{stamps[code]}" for code in sorted(stamps))
+    digest = hashlib.md5(stamp_text.encode()).hexdigest()[:12]
+    return f"{day}|{cfg['history_days']}|{cfg['window_days']}|{cfg['min_obs']}|{digest}"
+
+def get_risk_model(day, codes, price_loader, stamp_loader, cfg, path=MODEL_PATH):
+    """
+    同一交易日、同一标的集合且行情文件未改写时只构建一次模型 (进程内 + 磁盘缓存)
+    stamp_loader(codes) 返回各标的行情文件的廉价版本戳 (DataFetcher.price_stamps)，缓存命中时不读取任何行情
+    """
+    codes = [str(code) for code in codes]
+    key = _model_key(day, stamp_loader(codes), cfg)
+    with _cache_lock:
+        model = _cache.get(key) or RiskModel.load(path, key)
+        if model is None:
+            returns, last_close = returns_matrix(codes, price_loader, cfg["history_days"], cfg["min_obs"])
+            if returns.empty or len(returns) < cfg["window_days"]:
+                logger.warning("⚠️ [Risk] 行情样本不足，跳过风险模型")
+                return None
+            key = _model_key(day, stamp_loader(codes), cfg)   # 读取时可能补抓了缺失的行情文件
+            model = RiskModel(returns.columns, returns.index.strftime("%Y-%m-%d").tolist(), returns.to_numpy(float),
+                              last_close.to_numpy(float), cfg["window_days"])
+            try: model.save(path, key)
+            except Exception as e: logger.warning(f"⚠️ [Risk] 风险模型缓存写入失败: {e}")
+            logger.info(f"📐 [Risk] 风险模型已构建: {len(model.codes)} 个标的 × {len(model.dates)} 日")
+        _cache.clear()
+        _cache[key] = model
+    return model
@@ -0,0 +1,141 @@
+import os
+import json
+import glob
+import shutil
+import threading
+from datetime import datetime, timedelta
+
+from news_index import _atomic_write
+
+# ==========================================
+# 🟢 分阶段断点续跑 (Run Checkpoint)
+# 每次运行对应 runs/{日期}_{时段}/ 目录，阶段产出落盘为 JSON，manifest.json 记录已完成阶段；
+# 进程中途退出后，重启 / 重新触发的运行接续最近一次未完成的目录，已付费的 LLM 结果不再重复调用:
+#   同一 workflow run 的重新运行 (GITHUB_RUN_ATTEMPT > 1) 不限时长 —— 缓存键已限定在该 run，被步骤超时强杀的运行
+#   其 manifest 早已超过 45 分钟；手动触发的续跑 (RUN_RESUME=1，恢复当日缓存) 只接续 RESUME_MAX_MINUTES 内创建的运行
+# 新的定时运行一律新建目录，不会拿几小时前的 IC / 风控结论按当前价格下单
+# ==========================================
+RUNS_DIR = "runs"
+STAGES = ["fetch", "flow", "regime", "rag", "phase1", "phase2", "phase3", "cio", "render"]
+RESUME_MAX_MINUTES = 180  # 手动续跑的时效: 覆盖任务超时 (60 分钟) 加发现失败后重新触发的间隔
+KEEP_DAYS = 3             # 运行目录保留天数
+
+def _json_default(o):
+    # numpy 标量 / 数组
+    if hasattr(o, 'item') and getattr(o, 'ndim', 0) == 0:
+        return o.item()
+    if hasattr(o, 'tolist'):
+        return o.tolist()
+    return str(o)
+
+def _dump(obj):
+    return json.dumps(obj, ensure_ascii=False, default=_json_default).encode('utf-8')
+
+class RunCheckpoint:
+    def __init__(self, run_dir, resumed=False, now=None):
+        self.run_dir = run_dir
+        self.resumed = resumed
+        self.lock = threading.Lock()
+        os.makedirs(run_dir, exist_ok=True)
+        self.manifest_path = os.path.join(run_dir, "manifest.json")
+        self.manifest = {"created": (now or datetime.now()).strftime("%Y-%m-%d %H:%M:%S"), "stages": {}}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                self.manifest = json.load(f)
+
+    @staticmethod
+    def run_attempt():
+        try:
+            return int(os.getenv("GITHUB_RUN_ATTEMPT") or 1)
+        except ValueError:
+            return 1
+
+    @classmethod
+    def resume_requested(cls):
+        """ 只有重启 / 重新触发才接续: Actions 重新运行 (GITHUB_RUN_ATTEMPT > 1) 或显式 RUN_RESUME=1 """
+        return os.getenv("RUN_RESUME") == "1" or cls.run_attempt() > 1
+
+    @classmethod
+    def open(cls, now, runs_dir=RUNS_DIR):
+        """
+        RUN_SLOT 指定时段时直接使用该目录；请求接续时 (见 resume_requested) 接续当日最近一次未完成的运行
+        (仅手动续跑检查时效)，其余情况以当前时分新建
+        """
+        day = now.strftime("%Y-%m-%d")
+        cls.prune(now, runs_dir)
+        slot = os.getenv("RUN_SLOT")
+        if slot:
+            run_dir = os.path.join(runs_dir, f"{day}_{slot}")
+            return cls(run_dir, resumed=os.path.exists(run_dir), now=now)
+
+        if cls.resume_requested():
+            for run_dir in sorted(glob.glob(os.path.join(runs_dir, f"{day}_*")), reverse=True):
+                ckpt = cls(run_dir, resumed=True, now=now)
+                if ckpt.is_done("render"):
+                    break
+                if cls.run_attempt() > 1:
+                    return ckpt
+                created = datetime.strptime(ckpt.manifest["created"], "%Y-%m-%d %H:%M:%S")
+                if now.replace(tzinfo=None) - created <= timedelta(minutes=RESUME_MAX_MINUTES):
+                    return ckpt
+                break
+        run_dir = os.path.join(runs_dir, f"{day}_{now.strftime('%H%M')}")
+        if os.path.exists(run_dir):
+            run_dir = os.path.join(runs_dir, f"{day}_{now.strftime('%H%M%S')}")
+        return cls(run_dir, now=now)
+
+    @staticmethod
+    def prune(now, runs_dir=RUNS_DIR):
+        cutoff = (now - timedelta(days=KEEP_DAYS)).strftime("%Y-%m-%d")
+        for run_dir in glob.glob(os.path.join(runs_dir, "*_*")):
+            if os.path.basename(run_dir)[:10] < cutoff:
+                shutil.rmtree(run_dir, ignore_errors=True)
+
+    @property
+    def name(self):
+        return os.path.basename(self.run_dir)
+
+    def last_stage(self):
+        done = [s for s in STAGES if self.is_done(s)]
+        return done[-1] if done else None
+
+    def is_done(self, stage):
+        return stage in self.manifest["stages"]
+
+    def _path(self, name):
+        return os.path.join(self.run_dir, f"{name}.json")
+
+    def save(self, name, obj):
+        """ 保存阶段产出 (不标记完成) """
+        _atomic_write(self._path(name), _dump(obj))
+
+    def load(self, name, default=None):
+        path = self._path(name)
+        if not os.path.exists(path):
+            return default
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def complete(self, stage, obj=None):
+        """ 保存产出并在 manifest 中标记阶段完成 """
+        if obj is not None:
+            self.save(stage, obj)
+        with self.lock:
+            self.manifest["stages"][stage] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            _atomic_write(self.manifest_path, _dump(self.manifest))
+
+    def save_item(self, stage, key, obj):
+        """ 阶段内的单项产出 (如 Phase 1 单只基金的提案)，完成一项落盘一项 """
+        item_dir = os.path.join(self.run_dir, stage)
+        os.makedirs(item_dir, exist_ok=True)
+        _atomic_write(os.path.join(item_dir, f"{key}.json"), _dump(obj))
+
+    def load_items(self, stage):
+        items = {}
+        for path in sorted(glob.glob(os.path.join(self.run_dir, stage, "*.json"))):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    items[os.path.splitext(os.path.basename(path))[0]] = json.load(f)
+            except Exception:
+                continue
+        return items
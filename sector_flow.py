@@ -0,0 +1,112 @@
+import os
+import numpy as np
+import pandas as pd
+
+from columnar_store import ColumnarTable
+
+# ==========================================
+# 🟢 行业主力资金流历史序列
+# 每个已收盘交易日 × 每个行业板块一行: 全天主力净流入与 3/5/20 日滚动累计 (亿元)，另有一行全市场合计；
+# 接口的 "今日" 快照按所属交易日落盘 (flow_session): 开盘前的快照是上一交易日的全天终值，收盘后是当日终值，
+# 盘中的半场数据不入序列，滚动累计因此都是完整交易日之和；
+# 写入时只取此前 19 个交易日的流入补算滚动值，读取时直接取最新一日的行，不再逐日回放
+# (键列为 session: 旧版按运行日期混存盘中快照的文件与新 schema 不符，载入时视为空表重新积累)
+# ==========================================
+FLOW_PATH = os.path.join("data_cache", "sector_flow.npz")
+WINDOWS = (3, 5, 20)
+FLOW_SCHEMA = {
+    "session": "U10",
+    "sector": "U16",
+    "flow": np.float64,
+    **{f"flow_{w}d": np.float64 for w in WINDOWS},
+}
+MARKET_KEY = "全市场"
+KEEP_DAYS = 250
+PRE_OPEN = "09:15"   # 集合竞价开始前，"今日" 资金流仍是上一交易日的终值
+CLOSE = "15:00"
+
+def open_flows(path=FLOW_PATH):
+    return ColumnarTable(path, FLOW_SCHEMA)
+
+def parse_flow_values(values):
+    """
+    带单位的资金数值整列转为亿元: '-15.5亿' -> -15.5; '3000万' -> 0.3; 纯数字 (含数值列) 按元计
+    无法解析的值 ('-' / 空) 记为 0
+    """
+    series = pd.Series(values)
+    if pd.api.types.is_numeric_dtype(series):
+        return np.nan_to_num(series.to_numpy(dtype=float) / 1e8)
+    text = series.astype(str).str.strip()
+    unit = np.select([text.str.contains('亿', regex=False), text.str.contains('万', regex=False)], [1.0, 1e-4], 1e-8)
+    number = pd.to_numeric(text.str.replace(r'[亿万元,\s]', '', regex=True), errors='coerce').to_numpy(dtype=float)
+    return np.nan_to_num(number * unit)
+
+def flow_session(now, trading_days):
+    """
+    now (北京时间) 抓到的 "今日" 资金流快照属于哪个已收盘交易日；盘中返回 None (半场数据不入日频序列)
+    trading_days: 交易日字符串 (取自宽基代理的行情)，用于跳过周末与节假日；收盘后行情尚未更新到当日时同样返回 None
+    """
+    today, hm = now.strftime("%Y-%m-%d"), now.strftime("%H:%M")
+    days = sorted(str(d) for d in trading_days)
+    if hm < PRE_OPEN:
+        prior = [d for d in days if d < today]
+        return prior[-1] if prior else None
+    if hm >= CLOSE and today in days:
+        return today
+    return None
+
+def record_flows(day_str, sectors, flows, path=FLOW_PATH):
+    """ 替换该交易日 (flow_session) 各板块 (及全市场合计) 的行并补算滚动累计，返回当日的 {板块: 因子} """
+    sectors = [str(s) for s in sectors] + [MARKET_KEY]
+    flows = np.r_[np.asarray(flows, dtype=float), np.sum(flows)]
+    table = open_flows(path)
+    table.delete_where("session", day_str)
+
+    cols = table.columns
+    prior_days = np.unique(cols["session"][cols["session"] < day_str])[-(max(WINDOWS) - 1):]
+    recent = np.isin(cols["session"], prior_days)
+    row = np.searchsorted(prior_days, cols["session"][recent])
+    col = pd.Index(sectors).get_indexer(cols["sector"][recent])
+    hit = col >= 0
+    matrix = np.zeros((len(prior_days) + 1, len(sectors)))   # 缺失的板块日按 0 流入计
+    matrix[row[hit], col[hit]] = cols["flow"][recent][hit]
+    matrix[-1] = flows
+
+    rows = {"session": [day_str] * len(sectors), "sector": sectors, "flow": flows}
+    rows.update({f"flow_{w}d": matrix[-w:].sum(axis=0) for w in WINDOWS})
+    table.append(rows)
+    days = table.unique("session")
+    for stale in days[:-KEEP_DAYS] if len(days) > KEEP_DAYS else []:
+        table.delete_where("session", stale)
+    table.sort("session", "sector")
+    table.save()
+    return _factors(rows)
+
+def _factors(rows):
+    names = ["flow"] + [f"flow_{w}d" for w in WINDOWS]
+    return {str(sector): {name: round(float(rows[name][i]), 2) for name in names} for i, sector in enumerate(rows["sector"])}
+
+def latest_flows(path=FLOW_PATH):
+    """ 最近一个已收盘交易日的 (日期, {板块: {flow, flow_3d, flow_5d, flow_20d}})，无历史时返回 (None, {}) """
+    table = open_flows(path)
+    if not len(table):
+        return None, {}
+    day = table.unique("session")[-1]
+    return str(day), _factors(table.select("session", day))
+
+def market_trend(path=FLOW_PATH):
+    """ 全市场合计的滚动累计，附截至的交易日 """
+    day, factors = latest_flows(path)
+    market = factors.get(MARKET_KEY)
+    return {"as_of": day, **{k: market[k] for k in ("flow_3d", "flow_5d", "flow_20d")}} if market else {}
+
+def flow_leaders(n=5, key="flow_5d", path=FLOW_PATH):
+    """ 按滚动累计排序的流入 / 流出前 n 个板块 (不含全市场合计)，附截至的交易日 """
+    day, factors = latest_flows(path)
+    factors.pop(MARKET_KEY, None)
+    ranked = sorted(factors.items(), key=lambda item: item[1][key], reverse=True)
+    return {
+        "as_of": day,
+        "inflow": {sector: f[key] for sector, f in ranked[:n] if f[key] > 0},
+        "outflow": {sector: f[key] for sector, f in ranked[::-1][:n] if f[key] < 0},
+    }
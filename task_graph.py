@@ -0,0 +1,143 @@
+import time
+import queue
+import threading
+import concurrent.futures
+
+from utils import logger
+
+# ==========================================
+# 🟢 阶段依赖图执行器 (Task Graph)
+# 各阶段声明依赖后由线程池按就绪顺序并发执行：互不依赖的阶段 (RAG 构建 / 行情刷新 / 资金流)
+# 同时跑；阶段之间还可以通过 Stream 流式传递中间产出 (Phase 1 提案 -> Phase 2 风控分批审议)
+# ==========================================
+DEFAULT_MAX_WORKERS = 4
+
+class StreamAborted(Exception):
+    """ 上游阶段失败，流被中止 """
+
+_CLOSED = object()
+
+class Stream:
+    """ 单生产者 / 单消费者的阶段间数据流 """
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.error = None
+
+    def put(self, item):
+        self.queue.put(item)
+
+    def close(self, error=None):
+        """ 生产结束；error 不为空时消费端抛出 StreamAborted """
+        self.error = error
+        self.queue.put(_CLOSED)
+
+    def batches(self, size, max_wait=None, keep=None):
+        """
+        按批次消费: 攒满 size 个、或首个元素已等待 max_wait 秒、或流关闭时产出一批
+        keep 为过滤函数，不满足的元素直接丢弃
+        """
+        batch, first_at = [], None
+        while True:
+            timeout = None
+            if batch and max_wait is not None:
+                timeout = max(0, first_at + max_wait - time.monotonic())
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                yield batch
+                batch = []
+                continue
+            if item is _CLOSED:
+                if self.error is not None:
+                    raise StreamAborted(str(self.error))
+                if batch:
+                    yield batch
+                return
+            if keep is not None and not keep(item):
+                continue
+            if not batch:
+                first_at = time.monotonic()
+            batch.append(item)
+            if len(batch) >= size:
+                yield batch
+                batch = []
+
+class TaskGraph:
+    """
+    add(name, fn, deps) 注册节点，run() 执行全部节点：依赖全部完成的节点立即提交线程池
+    任一节点抛出异常后不再启动新节点，等待在途节点结束后将首个异常原样抛出
+    """
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS):
+        self.max_workers = max_workers
+        self.nodes = {}
+        self.timings = {}
+        self.lock = threading.Lock()
+
+    def add(self, name, fn, deps=()):
+        self.nodes[name] = (fn, tuple(deps))
+        return self
+
+    def _check(self):
+        for name, (_, deps) in self.nodes.items():
+            missing = [d for d in deps if d not in self.nodes]
+            if missing:
+                raise ValueError(f"节点 {name} 依赖未注册的节点: {missing}")
+        # Kahn 拓扑排序检测环
+        indegree = {name: len(deps) for name, (_, deps) in self.nodes.items()}
+        ready = [name for name, n in indegree.items() if n == 0]
+        visited = 0
+        while ready:
+            current = ready.pop()
+            visited += 1
+            for name, (_, deps) in self.nodes.items():
+                if current in deps:
+                    indegree[name] -= 1
+                    if indegree[name] == 0:
+                        ready.append(name)
+        if visited != len(self.nodes):
+            raise ValueError("阶段依赖图存在环")
+
+    def _timed(self, name, fn):
+        start = time.monotonic()
+        try:
+            return fn()
+        finally:
+            with self.lock:
+                self.timings[name] = (start, time.monotonic())
+
+    def run(self):
+        """ 返回 {节点名: 返回值} """
+        self._check()
+        results, pending, running = {}, dict(self.nodes), {}
+        error = None
+        started = time.monotonic()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                if error is None:
+                    for name in [n for n, (_, deps) in pending.items() if all(d in results for d in deps)]:
+                        fn, _ = pending.pop(name)
+                        running[executor.submit(self._timed, name, fn)] = name
+                if not running:
+                    break
+                done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                    except Exception as e:
+                        if error is None:
+                            error = e
+                            logger.error(f"❌ [TaskGraph] 阶段 {name} 失败，停止调度后续阶段: {e}")
+        self.log_timings(started)
+        if error is not None:
+            raise error
+        return results
+
+    def log_timings(self, started):
+        if not self.timings:
+            return
+        wall = time.monotonic() - started
+        serial = sum(end - start for start, end in self.timings.values())
+        spans = " | ".join(f"{name} +{start - started:.0f}s/{end - start:.0f}s"
+                           for name, (start, end) in sorted(self.timings.items(), key=lambda kv: kv[1][0]))
+        logger.info(f"⏱️ [TaskGraph] 总耗时 {wall:.0f}s (串行累计 {serial:.0f}s): {spans}")
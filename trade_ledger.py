@@ -0,0 +1,93 @@
+import os
+import time
+import uuid
+import numpy as np
+
+from columnar_store import ColumnarTable
+
+# ==========================================
+# 🟢 完整成交明细 (Trade Ledger)
+# portfolio.json 的 history 只保留最近 10 笔、成本只剩均价，无法还原已实现 / 未实现盈亏；
+# 这里按列存储全部成交 (每笔一行，tid 唯一)，由账本日志压缩时批量落盘，分析端与行情面板联表计算
+# ==========================================
+LEDGER_PATH = os.path.join("data_cache", "trade_ledger.npz")
+TRADE_SCHEMA = {
+    "tid": "U24",        # 成交唯一 id，日志重放 / 压缩重试时据此去重
+    "seq": np.int64,     # 同日内的成交顺序 (均价法下先后顺序影响已实现盈亏)
+    "date": "U10",
+    "code": "U12",
+    "name": "U32",
+    "side": "U1",        # B 买入 / S 卖出 / O 期初持仓 (由截断前的账本补齐)
+    "price": np.float64,
+    "shares": np.float64,  # 带符号: 买入为正，卖出为负
+    "amount": np.float64,  # 带符号成交额 = shares × price
+}
+
+def new_trade(date, code, name, side, price, shares):
+    return {
+        "tid": uuid.uuid4().hex[:16], "seq": time.time_ns(), "date": date, "code": str(code), "name": name,
+        "side": side, "price": float(price), "shares": float(shares), "amount": float(shares) * float(price),
+    }
+
+def open_ledger(path=LEDGER_PATH):
+    return ColumnarTable(path, TRADE_SCHEMA)
+
+def _rows_to_columns(rows):
+    return {name: [row[name] for row in rows] for name in TRADE_SCHEMA}
+
+def append_trades(table, rows):
+    """ 按 tid 幂等追加，返回实际新增条数 """
+    if not rows:
+        return 0
+    known = set(table["tid"].tolist())
+    fresh = [row for row in rows if row["tid"] not in known]
+    if fresh:
+        table.append(_rows_to_columns(fresh))
+        table.sort("date", "seq")
+    return len(fresh)
+
+def seed_rows(portfolio):
+    """
+    由旧版账本补齐期初成交: 保留的 history 逐笔转成成交行，份额以快照为准对齐:
+    history 截断导致份额不足 (中途累计为负，或期末少于快照) 时补一笔期初持仓 (O)，
+    按均价 (已清仓则取首笔价格) 计，日期取最早一笔保留记录；
+    成交额取整导致份数偏多时并入最后一笔卖出 (没有卖出则补一笔对账卖出)
+    """
+    rows = []
+    for code, pos in portfolio.items():
+        code_rows = []
+        for i, h in enumerate(pos.get('history', [])):
+            price = float(h.get('price') or 0)
+            if price <= 0: continue
+            shares = float(h.get('amt', 0)) / price
+            code_rows.append(dict(new_trade(h.get('date', ''), code, pos.get('name', ''), h.get('s', 'B'), price, shares),
+                                  tid=f"seed-{code}-{i}", seq=i))
+        shares = np.array([row['shares'] for row in code_rows] or [0.0])
+        cum = np.cumsum(shares)
+        opening = -min(float(cum.min()), 0.0)
+        excess = opening + float(cum[-1]) - float(pos.get('shares', 0))
+        sells = np.flatnonzero(shares < 0)
+        if excess > 1e-6 and len(sells):
+            last = code_rows[sells[-1]]
+            last['shares'] -= excess
+            last['amount'] = last['shares'] * last['price']
+        elif excess > 1e-6:
+            last = code_rows[-1]
+            code_rows.append(dict(new_trade(last['date'], code, last['name'], "S", last['price'], -excess),
+                                  tid=f"seed-{code}-adj", seq=len(code_rows)))
+        else:
+            opening -= excess
+        if opening > 1e-6:
+            first_date = min((row['date'] for row in code_rows), default="1970-01-01")
+            price = pos.get('cost') or (code_rows[0]['price'] if code_rows else 0.0)
+            code_rows.insert(0, dict(new_trade(first_date, code, pos.get('name', ''), "O", price, opening),
+                                     tid=f"seed-{code}-open", seq=-1))
+        rows.extend(code_rows)
+    return rows
+
+def load_trades(path=LEDGER_PATH, pending=None):
+    """ 已落盘成交 + 日志中尚未压缩的成交，返回按日期排序的列字典 """
+    table = open_ledger(path)
+    if pending:
+        append_trades(table, pending)
+    return dict(table.columns)
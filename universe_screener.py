@@ -0,0 +1,177 @@
+import os
+import re
+import time
+import numpy as np
+import pandas as pd
+
+from utils import logger
+from columnar_store import ColumnarTable
+
+# ==========================================
+# 🟢 全市场 ETF 海选 (Universe Screener)
+# batch_updater 抓取的全市场快照落盘为 etf_universe_snapshot.csv，并按日追加到列式行情面板
+# (etf_universe_panel.npz，每日每只一行)；这里对 1000+ 只 ETF 整列打分:
+#   流动性 (成交额) / 动量 (面板 N 日涨幅) / 换手率 / 估值分位 (面板区间内的价格位置，越低越好)
+# 各因子取横截面百分位排名后加权，选出 top-K 动态观察名单补进 config.yaml 的固定标的
+# 快照与面板不入 git，由 Actions 缓存在行情抓取与分析任务之间传递
+# ==========================================
+SNAPSHOT_PATH = os.path.join("data_cache", "etf_universe_snapshot.csv")
+PANEL_PATH = os.path.join("data_cache", "etf_universe_panel.npz")
+PANEL_SCHEMA = {"date": "U10", "code": "U12", "close": np.float64, "amount": np.float64}
+
+DEFAULT_SCREENER_CONFIG = {
+    "enabled": True,
+    "top_k": 8,                   # 动态观察名单容量 (不含持仓中的动态标的)
+    "min_amount": 5e7,            # 当日成交额下限 (元)，过滤僵尸 ETF
+    "max_snapshot_age_days": 3,   # 快照过旧时不做海选
+    "momentum_days": 20,
+    "valuation_days": 250,        # 估值分位窗口，同时是面板保留天数
+    "min_history_days": 20,       # 面板不足该天数的标的动量 / 估值因子按中性处理
+    "weights": {"liquidity": 0.3, "momentum": 0.3, "turnover": 0.15, "valuation": 0.25},
+    "exclude_keywords": ["货币", "债", "现金", "理财", "短融", "存单"],
+}
+
+def screener_config(config):
+    cfg = dict(DEFAULT_SCREENER_CONFIG)
+    cfg.update(config.get('screener') or {})
+    cfg["weights"] = {**DEFAULT_SCREENER_CONFIG["weights"], **(cfg.get("weights") or {})}
+    return cfg
+
+def _numeric(df, cols):
+    for col in cols:
+        df[col] = pd.to_numeric(df[col], errors='coerce') if col in df.columns else np.nan
+    return df
+
+def record_snapshot(df, day, snapshot_path=SNAPSHOT_PATH, panel_path=PANEL_PATH, keep_days=None):
+    """ batch_updater 调用: 全市场快照 (code 为索引) 落盘，并把当日收盘 / 成交额写入面板 (同日重复运行幂等覆盖) """
+    keep_days = keep_days or DEFAULT_SCREENER_CONFIG["valuation_days"]
+    snap = _numeric(df.copy(), ['close', 'amount', 'turnover_rate', 'pct_change'])
+    snap['snapshot_date'] = day
+    os.makedirs(os.path.dirname(snapshot_path) or ".", exist_ok=True)
+    tmp_path = f"{snapshot_path}.tmp"
+    snap.to_csv(tmp_path, index_label='code')
+    os.replace(tmp_path, snapshot_path)
+
+    valid = snap[snap['close'] > 0.001]
+    panel = ColumnarTable(panel_path, PANEL_SCHEMA)
+    panel.replace_where("date", day, {
+        "date": [day] * len(valid), "code": valid.index.astype(str).tolist(),
+        "close": valid['close'].to_numpy(), "amount": valid['amount'].fillna(0.0).to_numpy(),
+    })
+    dates = panel.unique("date")
+    for stale in dates[:-keep_days] if len(dates) > keep_days else []:
+        panel.delete_where("date", stale)
+    panel.sort("date", "code")
+    panel.save()
+    return len(valid)
+
+def load_snapshot(path=SNAPSHOT_PATH):
+    if not os.path.exists(path):
+        return None
+    df = pd.read_csv(path, dtype={'code': str})
+    df['code'] = df['code'].str.strip()
+    return _numeric(df.drop_duplicates('code').set_index('code'), ['close', 'amount', 'turnover_rate', 'pct_change'])
+
+def panel_factors(codes, panel, momentum_days, valuation_days, min_history):
+    """
+    面板 (长表) 摊成 日期 × 标的 收盘矩阵，整列计算 N 日动量与区间价格分位；
+    返回与 codes 对齐的 (momentum, valuation)，历史不足处为 NaN
+    """
+    n = len(codes)
+    momentum, valuation = np.full(n, np.nan), np.full(n, np.nan)
+    if len(panel) == 0 or n == 0:
+        return momentum, valuation
+    dates, row = np.unique(panel["date"], return_inverse=True)
+    col = pd.Index(codes).get_indexer(panel["code"])
+    hit = col >= 0
+    close = np.full((len(dates), n), np.nan)
+    close[row[hit], col[hit]] = panel["close"][hit]
+    close = close[-valuation_days:]
+
+    filled = pd.DataFrame(close).ffill().to_numpy()
+    last = filled[-1]
+    obs = np.sum(~np.isnan(close), axis=0)
+    if len(filled) > momentum_days:
+        base = filled[-momentum_days - 1]
+        momentum = np.divide(last, base, out=np.full(n, np.nan), where=base > 0) - 1.0
+    low, high = np.fmin.reduce(close, axis=0), np.fmax.reduce(close, axis=0)   # 忽略 NaN，全空列保持 NaN
+    with np.errstate(invalid='ignore'):
+        valuation = np.where(high > low, (last - low) / (high - low), 0.5)
+    short = obs < min_history
+    momentum[short] = np.nan
+    valuation[short] = np.nan
+    return momentum, valuation
+
+def _rank(values):
+    """ 横截面百分位排名，缺失按中性 0.5 """
+    return pd.Series(values).rank(pct=True).fillna(0.5).to_numpy()
+
+def sector_keyword(name):
+    """ 动态标的没有人工维护的关键词，取 ETF 名称中的主题部分 ("半导体ETF华夏" -> "半导体") """
+    theme = re.split(r'ETF|LOF', str(name), maxsplit=1, flags=re.I)[0].strip()
+    return theme or str(name)
+
+def screen_universe(config, configured_funds, held=None, snapshot_path=SNAPSHOT_PATH, panel_path=PANEL_PATH, today=None):
+    """
+    configured_funds: config.yaml 中的固定标的；held: {code: name} 账户持仓 (持仓中的动态标的始终保留跟踪)
+    返回动态观察名单 (fund dict 列表，格式同 config.yaml 的 funds，附 dynamic / screen 字段)
+    """
+    cfg = screener_config(config)
+    if not cfg["enabled"]:
+        return []
+    started = time.perf_counter()
+    snap = load_snapshot(snapshot_path)
+    if snap is None or snap.empty:
+        logger.info("ℹ️ [Screener] 未找到全市场快照 (batch_updater.py 生成)，跳过海选")
+        return []
+    snap_day = str(snap['snapshot_date'].iloc[0]) if 'snapshot_date' in snap.columns else None
+    if snap_day and today is not None:
+        age = (pd.Timestamp(today) - pd.Timestamp(snap_day)).days
+        if age > cfg["max_snapshot_age_days"]:
+            logger.info(f"ℹ️ [Screener] 全市场快照已过期 ({snap_day})，跳过海选")
+            return []
+
+    configured = {str(f['code']) for f in configured_funds}
+    held = {str(code): name for code, name in (held or {}).items() if str(code) not in configured}
+    codes = snap.index.to_numpy(dtype=str)
+    names = snap['name'].astype(str).to_numpy() if 'name' in snap.columns else codes
+
+    amount = snap['amount'].to_numpy(float)
+    momentum, valuation = panel_factors(codes, ColumnarTable(panel_path, PANEL_SCHEMA), cfg["momentum_days"],
+                                        cfg["valuation_days"], cfg["min_history_days"])
+    weights = cfg["weights"]
+    score = (weights["liquidity"] * _rank(np.log1p(np.nan_to_num(amount)))
+             + weights["momentum"] * _rank(momentum)
+             + weights["turnover"] * _rank(snap['turnover_rate'].to_numpy(float))
+             + weights["valuation"] * (1.0 - _rank(valuation)))
+    score = score / max(sum(weights.values()), 1e-9) * 100
+
+    excluded = pd.Series(names).str.contains("|".join(map(re.escape, cfg["exclude_keywords"])), regex=True).to_numpy() \
+        if cfg["exclude_keywords"] else np.zeros(len(codes), dtype=bool)
+    eligible = (np.nan_to_num(amount) >= cfg["min_amount"]) & (snap['close'].to_numpy(float) > 0.001) \
+        & ~excluded & ~np.isin(codes, list(configured))
+    is_held = np.isin(codes, list(held))
+    candidates = np.flatnonzero(eligible & ~is_held)
+    picked = candidates[np.argsort(-score[candidates], kind='stable')[:cfg["top_k"]]]
+    picked = np.r_[np.flatnonzero(is_held), picked].astype(int)
+
+    watchlist = []
+    for i in picked:
+        watchlist.append({
+            "name": str(names[i]), "code": str(codes[i]), "strategy_type": "satellite",
+            "sector_keyword": sector_keyword(names[i]), "dynamic": True,
+            "screen": {
+                "score": round(float(score[i]), 1), "held": bool(is_held[i]),
+                "amount_yi": round(float(np.nan_to_num(amount[i])) / 1e8, 2),
+                "momentum_pct": None if np.isnan(momentum[i]) else round(float(momentum[i]) * 100, 2),
+                "valuation_pct": None if np.isnan(valuation[i]) else round(float(valuation[i]) * 100, 1),
+            },
+        })
+    missing = set(held) - set(codes[picked])
+    watchlist += [{"name": held[code], "code": code, "strategy_type": "satellite", "sector_keyword": sector_keyword(held[code]),
+                   "dynamic": True, "screen": {"score": None, "held": True}} for code in sorted(missing)]
+
+    elapsed = (time.perf_counter() - started) * 1000
+    logger.info(f"🔭 [Screener] 全市场 {len(codes)} 只 ETF 海选 {elapsed:.0f}ms (快照 {snap_day})，"
+                f"动态观察 {len(watchlist)} 只: {', '.join(f['name'] for f in watchlist) or '无'}")
+    return watchlist
@@ -53,13 +53,14 @@ def retry(retries=3, delay=2):
         return wrapper
     return decorator
 
-def send_email(subject, html_content, attachment_path=None):
+def send_email(subject, html_content, attachment_path=None, receiver=None):
     """
     发送带附件的邮件 (修复 QQ 邮箱 550 Error)
+    receiver 未指定时发往 EMAIL_TO (多账户可各自指定收件人)
     """
     sender = os.getenv("EMAIL_USER")
     password = os.getenv("EMAIL_PASS")
-    receiver = os.getenv("EMAIL_TO")
+    receiver = receiver or os.getenv("EMAIL_TO")
     
     if not sender or not password or not receiver:
         logger.warning(f"🚫 邮箱配置缺失 (User={sender}), 跳过发送。")